@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自适应写入控制（AIMD）
+按数据表根据 batch_create 的延迟、请求体大小和限流/超时信号调整批大小、并发写入数和批次间隔：
+被限流（429）时并发数减半（已是 1 时间隔加倍），超时或延迟超过目标时批大小减半；
+持续正常时先恢复间隔，再每轮把批大小和并发数各加一档。
+调整决策计入指标，由 API 服务的 /metrics 输出
+"""
+
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from config import API_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 写入结果
+OUTCOME_OK = "ok"
+OUTCOME_THROTTLED = "throttled"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_ERROR = "error"
+
+# 飞书表示请求过于频繁的错误码
+THROTTLE_CODES = (99991400, 1254290)
+
+# 默认控制参数，可通过 API_CONFIG["adaptive_writes"] 覆盖
+DEFAULT_ADAPTIVE_CONFIG = {
+    # 关闭时固定使用 batch_size、单并发
+    "enabled": True,
+    "min_batch_size": 50,
+    "batch_step": 50,
+    "max_concurrency": 4,
+    # 单次写入延迟目标（秒），超过视为拥塞
+    "latency_target": 2.0,
+    # 乘性减小的系数
+    "decrease_factor": 0.5,
+    # 两次减小之间的最短间隔（秒），同一次拥塞中的多个失败只减一次
+    "cooldown_seconds": 5,
+    # 单个请求体的大小上限（字节）
+    "max_payload_bytes": 4 * 1024 * 1024,
+    # 被限流或超时的批次最多重试次数
+    "max_retries": 3,
+    # 单次写入请求的超时时间（秒）
+    "write_timeout": 30,
+    # 批次间隔上限（秒）
+    "max_delay": 10
+}
+
+
+class WriteController:
+    """单个数据表的批大小、并发数和批次间隔控制器（线程安全）"""
+
+    def __init__(self, name: str, max_batch_size: int = 500, min_batch_size: int = 50, batch_step: int = 50,
+                 max_concurrency: int = 4, latency_target: float = 2.0, decrease_factor: float = 0.5,
+                 cooldown_seconds: float = 5, max_payload_bytes: int = 4 * 1024 * 1024, max_retries: int = 3,
+                 write_timeout: float = 30, base_delay: float = 0.2, max_delay: float = 10):
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.min_batch_size = min(min_batch_size, max_batch_size)
+        self.batch_step = batch_step
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self.max_payload_bytes = max_payload_bytes
+        self.max_retries = max_retries
+        self.write_timeout = write_timeout
+        self.base_delay = base_delay
+        self.max_delay = max(max_delay, base_delay)
+
+        self._lock = threading.Lock()
+        self._batch_size = max_batch_size
+        self._concurrency = 1
+        self._delay = base_delay
+        self._successes = 0
+        self._last_decrease = 0.0
+        # 延迟和每条记录字节数的滑动平均
+        self.latency_ewma: Optional[float] = None
+        self.bytes_per_record: Optional[float] = None
+        self.outcomes = {outcome: 0 for outcome in (OUTCOME_OK, OUTCOME_THROTTLED, OUTCOME_TIMEOUT, OUTCOME_ERROR)}
+        self.records_written = 0
+        # 调整决策计数：(动作, 参数, 原因) -> 次数
+        self.decisions: Dict[tuple, int] = {}
+
+    def reconfigure(self, **settings):
+        """修改控制参数（运行时配置）
+
+        当前批大小、并发数不超过新上限，批次间隔不低于新下限；上限调高后按正常节奏逐档增加。
+        进行中的批次不受影响。
+        """
+        with self._lock:
+            for key, value in settings.items():
+                setattr(self, key, value)
+            self.min_batch_size = min(self.min_batch_size, self.max_batch_size)
+            self.max_delay = max(self.max_delay, self.base_delay)
+            self._batch_size = min(max(self._batch_size, self.min_batch_size), self.max_batch_size)
+            self._concurrency = min(self._concurrency, self.max_concurrency)
+            self._delay = min(max(self._delay, self.base_delay), self.max_delay)
+        logger.info(f"写入控制 {self.name}: 参数已更新，批大小上限 {self.max_batch_size}，并发上限 {self.max_concurrency}")
+
+    @property
+    def batch_size(self) -> int:
+        """当前批大小，同时不超过请求体大小上限"""
+        with self._lock:
+            size = self._batch_size
+            if self.bytes_per_record:
+                size = min(size, max(int(self.max_payload_bytes / self.bytes_per_record), 1))
+            return size
+
+    @property
+    def concurrency(self) -> int:
+        with self._lock:
+            return self._concurrency
+
+    @property
+    def delay(self) -> float:
+        """每个写入线程两批之间的间隔（秒）"""
+        with self._lock:
+            return self._delay
+
+    def retry_delay(self, attempt: int) -> float:
+        """被限流或超时的批次第 attempt 次重试前的等待时间"""
+        return min(max(self.delay, self.base_delay, 0.5) * 2 ** attempt, self.max_delay)
+
+    def _decide(self, action: str, knob: str, reason: str, old, new):
+        key = (action, knob, reason)
+        self.decisions[key] = self.decisions.get(key, 0) + 1
+        logger.info(f"写入控制 {self.name}: {reason}，{knob} {old} -> {new}")
+
+    def record(self, outcome: str, latency: float, records: int, payload_bytes: int):
+        """记录一次写入结果并调整参数"""
+        now = time.time()
+        with self._lock:
+            self.outcomes[outcome] += 1
+            if outcome == OUTCOME_OK:
+                self.records_written += records
+                self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+            if records:
+                per_record = payload_bytes / records
+                self.bytes_per_record = (per_record if self.bytes_per_record is None
+                                         else 0.8 * self.bytes_per_record + 0.2 * per_record)
+
+            slow = outcome == OUTCOME_OK and latency > self.latency_target
+            if outcome == OUTCOME_THROTTLED or outcome == OUTCOME_TIMEOUT or slow:
+                self._successes = 0
+                if now - self._last_decrease < self.cooldown_seconds:
+                    return
+                self._last_decrease = now
+                self._decrease(outcome if not slow else "slow")
+                return
+            if outcome != OUTCOME_OK:
+                # 其他错误与负载无关，不调整
+                return
+
+            # 每完成一轮（与并发数相同的成功批次）加一档
+            self._successes += 1
+            if self._successes < self._concurrency:
+                return
+            self._successes = 0
+            self._increase()
+
+    def _decrease(self, reason: str):
+        if reason == OUTCOME_THROTTLED:
+            # 限流：降低请求速率，先减并发，已是单并发时加大间隔
+            if self._concurrency > 1:
+                new = max(int(self._concurrency * self.decrease_factor), 1)
+                self._decide("decrease", "concurrency", reason, self._concurrency, new)
+                self._concurrency = new
+            elif self._delay < self.max_delay:
+                new = min(max(self._delay, 0.5) / self.decrease_factor, self.max_delay)
+                self._decide("decrease", "delay", reason, round(self._delay, 2), round(new, 2))
+                self._delay = new
+        elif self._batch_size > self.min_batch_size:
+            # 超时或延迟过高：减小请求体
+            new = max(int(self._batch_size * self.decrease_factor), self.min_batch_size)
+            self._decide("decrease", "batch_size", reason, self._batch_size, new)
+            self._batch_size = new
+
+    def _increase(self):
+        # 限流后加大的间隔先恢复；批大小（受延迟约束）和并发数（受限流约束）各自加一档
+        if self._delay > self.base_delay:
+            new = max(self._delay - max(self.base_delay, 0.5), self.base_delay)
+            self._decide("increase", "delay", "healthy", round(self._delay, 2), round(new, 2))
+            self._delay = new
+            return
+        if self._batch_size < self.max_batch_size:
+            new = min(self._batch_size + self.batch_step, self.max_batch_size)
+            self._decide("increase", "batch_size", "healthy", self._batch_size, new)
+            self._batch_size = new
+        if self._concurrency < self.max_concurrency:
+            self._decide("increase", "concurrency", "healthy", self._concurrency, self._concurrency + 1)
+            self._concurrency += 1
+
+    def snapshot(self) -> Dict:
+        batch_size = self.batch_size
+        with self._lock:
+            return {
+                "batch_size": batch_size,
+                "concurrency": self._concurrency,
+                "delay": round(self._delay, 3),
+                "latency_ewma": round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+                "bytes_per_record": round(self.bytes_per_record, 1) if self.bytes_per_record else None,
+                "records_written": self.records_written,
+                "outcomes": dict(self.outcomes),
+                "decisions": [
+                    {"action": action, "knob": knob, "reason": reason, "count": count}
+                    for (action, knob, reason), count in sorted(self.decisions.items())
+                ]
+            }
+
+
+# 进程内按数据表共享的控制器
+_controllers: Dict[str, WriteController] = {}
+_controllers_lock = threading.Lock()
+
+
+def adaptive_config() -> Dict:
+    config = dict(DEFAULT_ADAPTIVE_CONFIG)
+    config.update(API_CONFIG.get("adaptive_writes", {}))
+    return config
+
+
+def controller_settings() -> Dict:
+    """按当前配置计算写入控制器参数"""
+    config = adaptive_config()
+    batch_size = API_CONFIG["batch_size"]
+    base_delay = API_CONFIG.get("write_interval", 0.2)
+    if not config.pop("enabled"):
+        # 关闭时参数固定：batch_size、单并发、固定间隔
+        config.update(min_batch_size=batch_size, max_concurrency=1, max_delay=base_delay)
+    return dict(config, max_batch_size=batch_size, base_delay=base_delay)
+
+
+def get_write_controller(table_id: str) -> WriteController:
+    """获取数据表的写入控制器"""
+    with _controllers_lock:
+        controller = _controllers.get(table_id)
+        if controller is None:
+            controller = WriteController(table_id, **controller_settings())
+            _controllers[table_id] = controller
+        return controller
+
+
+def reconfigure_controllers():
+    """运行时配置变化后，已创建的控制器按新参数调整"""
+    settings = controller_settings()
+    with _controllers_lock:
+        controllers = list(_controllers.values())
+    for controller in controllers:
+        controller.reconfigure(**settings)
+
+
+def controllers_snapshot() -> Dict[str, Dict]:
+    """所有数据表控制器的当前状态"""
+    with _controllers_lock:
+        controllers = list(_controllers.values())
+    return {controller.name: controller.snapshot() for controller in controllers}
+
+
+def metrics_lines() -> List[str]:
+    """Prometheus 文本格式的写入控制指标"""
+    snapshot = controllers_snapshot()
+    lines = [
+        "# HELP feishu_write_batch_size Current batch_create batch size",
+        "# TYPE feishu_write_batch_size gauge",
+        "# HELP feishu_write_concurrency Current number of in-flight batch_create requests",
+        "# TYPE feishu_write_concurrency gauge",
+        "# HELP feishu_write_delay_seconds Current delay between batches per writer",
+        "# TYPE feishu_write_delay_seconds gauge",
+        "# HELP feishu_write_latency_seconds EWMA of successful batch_create latency",
+        "# TYPE feishu_write_latency_seconds gauge",
+        "# HELP feishu_write_records_total Records written",
+        "# TYPE feishu_write_records_total counter",
+        "# HELP feishu_write_requests_total batch_create requests by outcome",
+        "# TYPE feishu_write_requests_total counter",
+        "# HELP feishu_write_decisions_total Controller adjustments",
+        "# TYPE feishu_write_decisions_total counter",
+    ]
+    for table_id, state in snapshot.items():
+        label = f'table="{table_id}"'
+        lines.append(f"feishu_write_batch_size{{{label}}} {state['batch_size']}")
+        lines.append(f"feishu_write_concurrency{{{label}}} {state['concurrency']}")
+        lines.append(f"feishu_write_delay_seconds{{{label}}} {state['delay']}")
+        if state["latency_ewma"] is not None:
+            lines.append(f"feishu_write_latency_seconds{{{label}}} {state['latency_ewma']}")
+        lines.append(f"feishu_write_records_total{{{label}}} {state['records_written']}")
+        for outcome, count in state["outcomes"].items():
+            lines.append(f'feishu_write_requests_total{{{label},outcome="{outcome}"}} {count}')
+        for decision in state["decisions"]:
+            lines.append(
+                f'feishu_write_decisions_total{{{label},action="{decision["action"]}",'
+                f'knob="{decision["knob"]}",reason="{decision["reason"]}"}} {decision["count"]}'
+            )
+    return lines
@@ -4,37 +4,165 @@
 提供RESTful接口调用飞书群成员同步功能
 """
 
+import startup_timing
+
 import os
+import hmac
+import math
 import json
+import uuid
 import logging
 import asyncio
-from typing import Dict, Any
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List
 from datetime import datetime
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel, Field
-import uvicorn
-
-from feishu_group_members import FeishuAPI
-
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("api_server.log", encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+
+import fastjson
+from config import API_CONFIG
+from feishu_group_members import FeishuAPI, find_target_fields
+from sync_planner import plan_sync
+from sinks import SINK_TYPES, BitableSink, create_file_sink, run_member_pipeline
+from member_records import iter_member_payloads
+from sharding import SHARD_STRATEGIES, sync_sharded
+from table_cleanup import cleanup_table
+from preflight import run_preflight
+from outbox import Outbox, OutboxSink, OutboxWriter, outbox_config
+from adaptive import metrics_lines
+from sync_history import get_history, start_run
+from quarantine import get_quarantine
+from membership_index import MembershipIndex
+from log_setup import log_context, setup_logging
+from circuit_breaker import CircuitOpenError, breaker_snapshot, open_breakers
+from coordination import ChatLockedError, ChatLocks, CoordinationDB, RateBudget, TaskStore, create_rate_budget
+from runtime_config import get_runtime_config
+from prewarm import Prewarmer, create_prewarmer
+from job_scheduler import FairShareLimiter, JobScheduler, scheduler_config
+
+# 日志在服务启动时配置，导入本模块不产生文件I/O
 logger = logging.getLogger(__name__)
 
+startup_timing.mark("模块导入")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """服务启动与关闭"""
+    global task_status, chat_locks, scheduler, outbox, outbox_writer, membership_index, prewarmer
+    # 多 worker 时每个进程写自己的日志文件（api_server.<pid>.log），各自轮转
+    setup_logging("api_server.log", level="INFO", per_process=int(os.getenv("WEB_CONCURRENCY", 1)) > 1)
+    startup_timing.mark("日志初始化")
+    
+    # 调优参数：环境变量、覆盖文件（各 worker 定期检查）和管理接口
+    runtime_config = get_runtime_config()
+    runtime_config.start()
+    startup_timing.mark("运行时配置加载")
+    
+    # 多 worker 共享的任务状态、群同步锁和全局限流额度
+    coordination_db = CoordinationDB()
+    task_status = TaskStore(coordination_db)
+    
+    async def prune_tasks():
+        # 启动时及之后每小时删除超过保留期的任务状态，coordination.db 不会无限增长
+        while True:
+            try:
+                await asyncio.to_thread(task_status.prune, API_CONFIG.get("task_retention_days", 7) * 86400)
+            except Exception as e:
+                logger.warning(f"清理过期任务状态失败: {e}")
+            await asyncio.sleep(3600)
+    
+    prune_task = asyncio.create_task(prune_tasks())
+    chat_locks = ChatLocks(coordination_db)
+    config = scheduler_config()
+    lanes = config["lanes"]
+    rate_budget = create_rate_budget(coordination_db, API_CONFIG.get("global_rate_limit", 50))
+    # 全局额度按任务通道权重分配
+    FeishuAPI.rate_limiter = FairShareLimiter(rate_budget, lanes) if rate_budget else None
+    startup_timing.mark("协调状态初始化")
+    
+    # 每次同步完整获取的群成员写入反向索引，查询接口不再调用飞书
+    membership_index = MembershipIndex()
+    FeishuAPI.membership_index = membership_index
+    startup_timing.mark("成员索引加载")
+    
+    # 同步任务按通道优先级排队执行，排队位置写入任务状态
+    scheduler = JobScheduler(
+        workers=config["workers"],
+        lanes=config["lanes"],
+        aging_seconds=config["aging_seconds"],
+        default_job_seconds=config["default_job_seconds"],
+        on_queue_change=lambda snapshot: task_status.patch_many(snapshot, only_status="queued"),
+        queue_update_interval=config["queue_update_interval"]
+    )
+    scheduler.start()
+    
+    # 持久化写入队列：上次未写出的记录在对应应用登记客户端后继续写入
+    config = outbox_config()
+    outbox = Outbox(coordination_db, config["lease_seconds"], config["max_attempts"], config["dead_retention_days"])
+    outbox_writer = OutboxWriter(outbox, config["max_age_seconds"], config["poll_interval"])
+    if os.getenv("FEISHU_APP_ID") and os.getenv("FEISHU_APP_SECRET"):
+        outbox_writer.register(FeishuAPI(os.getenv("FEISHU_APP_ID"), os.getenv("FEISHU_APP_SECRET")))
+    outbox_writer.start()
+    
+    # 后台预热 token、连接和字段信息，完成前 /ready 返回 503
+    prewarmer = create_prewarmer()
+    if prewarmer:
+        prewarmer.start()
+    startup_timing.mark("预热启动")
+    
+    def on_config_change(changed: Dict):
+        # 运行时配置变化：更新全局限流额度和写入线程（进行中的请求使用新速率取下一次额度）
+        if "global_rate_limit" in changed:
+            rate = API_CONFIG["global_rate_limit"]
+            limiter = FeishuAPI.rate_limiter
+            if not rate:
+                FeishuAPI.rate_limiter = None
+            elif limiter is not None:
+                limiter.base.rate = limiter.base.burst = rate
+            else:
+                FeishuAPI.rate_limiter = FairShareLimiter(RateBudget(coordination_db, rate), lanes)
+        settings = outbox_config()
+        outbox_writer.max_age = settings["max_age_seconds"]
+        outbox_writer.poll_interval = settings["poll_interval"]
+        outbox_writer.batch_size = API_CONFIG["batch_size"]
+    
+    runtime_config.add_listener(on_config_change)
+    startup_timing.print_report()
+    yield
+    
+    prune_task.cancel()
+    runtime_config.stop()
+    outbox_writer.stop()
+    
+    # 未开始的任务随进程退出丢失，标记为失败以免一直显示排队中
+    pending = scheduler.shutdown()
+    if pending:
+        task_status.patch_many(
+            {task_id: {"status": "failed", "message": "服务重启，任务未执行，请重新提交"} for task_id in pending}
+        )
+
+class FastJSONResponse(JSONResponse):
+    """使用 fastjson 后端（orjson/ujson/json）序列化的 JSON 响应"""
+    
+    def render(self, content: Any) -> bytes:
+        return fastjson.dumps(content)
+
 app = FastAPI(
     title="飞书群成员同步API",
     description="提供飞书群成员信息同步到多维表格的HTTP接口",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
+# 超过该大小的响应（任务状态、导出文件等）使用 gzip 压缩
+GZIP_MINIMUM_SIZE = int(os.getenv("GZIP_MINIMUM_SIZE", 1024))
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE)
+
 # 添加CORS中间件
 app.add_middleware(
     CORSMiddleware,
@@ -46,10 +174,48 @@ app.add_middleware(
 
 # 请求模型
 class SyncRequest(BaseModel):
-    bitable_url: str = Field(..., description="飞书多维表格URL")
+    bitable_url: str = Field(None, description="飞书多维表格URL（输出到多维表格时必填）")
     chat_id: str = Field(..., description="飞书群ID")
     app_id: str = Field(None, description="飞书应用ID（可选，优先使用环境变量）")
     app_secret: str = Field(None, description="飞书应用密钥（可选，优先使用环境变量）")
+    dry_run: bool = Field(False, description="只计算同步计划，不写入多维表格")
+    sink: str = Field("bitable", description="输出目标：bitable、csv、jsonl、parquet")
+    shards: int = Field(0, description="分片数：大于 0 时成员记录分散写入多个分片表")
+    shard_by: str = Field("hash", description="分片方式：hash 按成员ID哈希，tenant 按租户")
+    profile: bool = Field(False, description="剖析本次同步，结果在任务状态的 profile 中（仅 /sync）")
+    profile_mode: str = Field("cprofile", description="剖析方式：cprofile 或 sample")
+    priority: str = Field("interactive", description="任务通道：interactive 优先执行，bulk 用于批量/定时同步（仅 /sync）")
+    outbox: bool = Field(None, description="记录先进入持久化写入队列，与其他群的记录攒满批次后写入（默认取配置 outbox.enabled，仅 /sync）")
+
+class BatchSyncRequest(BaseModel):
+    bitable_url: str = Field(None, description="飞书多维表格URL（输出到多维表格时必填）")
+    chat_ids: List[str] = Field(..., description="飞书群ID列表，每个群一个任务")
+    app_id: str = Field(None, description="飞书应用ID（可选，优先使用环境变量）")
+    app_secret: str = Field(None, description="飞书应用密钥（可选，优先使用环境变量）")
+    sink: str = Field("bitable", description="输出目标：bitable、csv、jsonl、parquet")
+    shards: int = Field(0, description="分片数：大于 0 时成员记录分散写入多个分片表")
+    shard_by: str = Field("hash", description="分片方式：hash 按成员ID哈希，tenant 按租户")
+    priority: str = Field("bulk", description="任务通道，批量同步默认 bulk")
+    outbox: bool = Field(None, description="记录先进入持久化写入队列（默认取配置 outbox.enabled）")
+
+class CleanupRequest(BaseModel):
+    bitable_url: str = Field(..., description="飞书多维表格URL")
+    chat_ids: List[str] = Field([], description="判断退群成员的群ID列表，为空时只删除重复记录")
+    app_id: str = Field(None, description="飞书应用ID（可选，优先使用环境变量）")
+    app_secret: str = Field(None, description="飞书应用密钥（可选，优先使用环境变量）")
+    dry_run: bool = Field(False, description="只统计待删除的记录，不删除")
+    priority: str = Field("bulk", description="任务通道，清理默认 bulk")
+
+class PreflightTarget(BaseModel):
+    app_id: str = Field(None, description="飞书应用ID（可选，优先使用环境变量）")
+    app_secret: str = Field(None, description="飞书应用密钥（可选，优先使用环境变量）")
+    bitable_url: str = Field(None, description="飞书多维表格URL（可选，检查解析和字段访问权限）")
+    chat_id: str = Field(None, description="飞书群ID（可选，检查群成员读取权限）")
+
+class PreflightRequest(BaseModel):
+    targets: List[PreflightTarget] = Field(..., description="检查目标列表，并发检查")
+    timeout: float = Field(5.0, description="单个请求超时时间（秒）")
+    deadline: float = Field(30.0, description="整次检查的总时限（秒）")
 
 class SyncResponse(BaseModel):
     success: bool
@@ -57,8 +223,31 @@ class SyncResponse(BaseModel):
     data: Dict[str, Any] = None
     task_id: str = None
 
-# 任务状态存储
-task_status = {}
+# 任务状态存储与群同步锁（服务启动时初始化，多 worker 之间通过 SQLite 共享）
+task_status: TaskStore = None
+chat_locks: ChatLocks = None
+
+# 本进程的同步任务调度器（服务启动时初始化）
+scheduler: JobScheduler = None
+
+# 持久化写入队列与本进程的写入线程（服务启动时初始化）
+outbox: Outbox = None
+outbox_writer: OutboxWriter = None
+
+# 群成员反向索引（服务启动时加载）
+membership_index: MembershipIndex = None
+
+# 启动预热（配置关闭时为 None）
+prewarmer: Prewarmer = None
+
+# 导出文件目录
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+
+# 剖析结果目录（与 profiling.PROFILE_DIR 一致，避免导入时加载 requests）
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# 剖析产物类型 -> 文件后缀
+PROFILE_ARTIFACTS = {"pstats": ".pstats", "speedscope": ".speedscope.json", "network": ".network.json"}
 
 def get_feishu_config(request: SyncRequest) -> tuple:
     """获取飞书配置"""
@@ -73,124 +262,199 @@ def get_feishu_config(request: SyncRequest) -> tuple:
     
     return app_id, app_secret
 
-async def sync_members_task(task_id: str, bitable_url: str, chat_id: str, app_id: str, app_secret: str):
-    """异步执行同步任务"""
+def validate_sink(request: SyncRequest):
+    """校验输出目标参数"""
+    if request.sink not in SINK_TYPES:
+        raise HTTPException(status_code=400, detail=f"不支持的输出类型: {request.sink}，可选: {', '.join(SINK_TYPES)}")
+    if request.sink == "bitable" and not request.bitable_url:
+        raise HTTPException(status_code=400, detail="输出到多维表格时必须提供 bitable_url")
+    if request.sink != "bitable" and request.dry_run:
+        raise HTTPException(status_code=400, detail="dry_run 仅支持输出到多维表格")
+    if request.shards < 0 or request.shard_by not in SHARD_STRATEGIES:
+        raise HTTPException(status_code=400, detail=f"分片参数无效，shards 不能为负数，shard_by 可选: {', '.join(SHARD_STRATEGIES)}")
+    if request.profile_mode not in ("cprofile", "sample"):
+        raise HTTPException(status_code=400, detail="profile_mode 可选: cprofile、sample")
+    if request.shards and (request.sink != "bitable" or request.dry_run):
+        raise HTTPException(status_code=400, detail="分片模式仅支持输出到多维表格，且不支持 dry_run")
+    if request.outbox and (request.sink != "bitable" or request.dry_run or request.shards):
+        raise HTTPException(status_code=400, detail="写入队列仅支持输出到多维表格，且不支持 dry_run 和分片模式")
+
+def use_outbox(request: SyncRequest) -> bool:
+    """是否通过写入队列写入（请求未指定时取配置）"""
+    if request.sink != "bitable" or request.dry_run or request.shards:
+        return False
+    return request.outbox if request.outbox is not None else outbox_config()["enabled"]
+
+def get_export_path(task_id: str, sink_type: str) -> str:
+    """导出文件路径"""
+    return os.path.join(EXPORT_DIR, f"{task_id}.{sink_type}")
+
+def sync_members_task(task_id: str, bitable_url: str, chat_id: str, app_id: str, app_secret: str,
+                      dry_run: bool = False, sink_type: str = "bitable", shards: int = 0, shard_by: str = "hash",
+                      profile: bool = False, profile_mode: str = "cprofile", queued: bool = False):
+    """后台执行同步任务（在线程池中运行，不阻塞事件循环）"""
+    args = (task_id, bitable_url, chat_id, app_id, app_secret, dry_run, sink_type, shards, shard_by, queued)
+    with log_context(task_id=task_id):
+        if not profile:
+            _sync_members(*args)
+            return
+        
+        from profiling import SyncProfiler
+        with SyncProfiler(task_id, profile_mode, PROFILE_DIR, all_threads=True) as profiler:
+            _sync_members(*args, profiler=profiler)
+        summary = profiler.summary()
+        summary["artifacts"] = {kind: f"/profile/{task_id}/{kind}" for kind in summary["artifacts"]}
+        task_status.patch(task_id, profile=summary)
+
+def _sync_members(task_id: str, bitable_url: str, chat_id: str, app_id: str, app_secret: str,
+                  dry_run: bool = False, sink_type: str = "bitable", shards: int = 0, shard_by: str = "hash",
+                  queued: bool = False, profiler=None):
+    """执行同步任务并更新任务状态"""
+    run = None
     try:
-        task_status[task_id] = {
-            "status": "running",
-            "message": "正在同步群成员信息...",
-            "start_time": datetime.now().isoformat(),
-            "progress": 0
-        }
-        
+        task_status.patch(
+            task_id,
+            status="running",
+            message="正在同步群成员信息...",
+            start_time=datetime.now().isoformat(),
+            progress=0,
+            queue_position=0,
+            eta_seconds=0
+        )
+    
         # 创建API实例
         api = FeishuAPI(app_id, app_secret)
-        
+        if profiler:
+            profiler.instrument(api)
+        if not dry_run:
+            # 记录本次同步的耗时、分页、批次等，写入同步历史
+            mode = sink_type if sink_type != "bitable" else "shards" if shards else "outbox" if queued else "bitable"
+            run = start_run(api, [chat_id], "api", mode, task_id)
+    
+        def on_page(sink):
+            task_status.patch(task_id, members_synced=sink.member_count)
+    
+        if sink_type != "bitable":
+            # 导出到服务端文件，完成后通过 /export/{task_id} 下载
+            export_path = get_export_path(task_id, sink_type)
+            task_status.patch(task_id, progress=20)
+            summary = run_member_pipeline(api, [chat_id], create_file_sink(sink_type, export_path), on_page)
+            run.finish(summary["members"])
+            task_status[task_id] = {
+                "status": "completed",
+                "message": f"成功导出 {summary['members']} 个群成员",
+                "start_time": task_status[task_id]["start_time"],
+                "end_time": datetime.now().isoformat(),
+                "progress": 100,
+                "data": {
+                    "chat_name": summary["chat_names"][0] if summary["chat_names"] else "",
+                    "member_count": summary["members"],
+                    "sink": sink_type,
+                    "download_url": f"/export/{task_id}"
+                }
+            }
+            return
+    
         # 解析多维表格URL
         app_token, table_id = api.parse_bitable_url(bitable_url)
-        task_status[task_id]["progress"] = 10
-        
+        task_status.patch(task_id, progress=10)
+    
         # 获取访问令牌
         api.get_tenant_access_token()
-        task_status[task_id]["progress"] = 20
-        
+        task_status.patch(task_id, progress=20)
+    
         # 获取表格字段
         fields = api.get_bitable_fields(app_token, table_id)
-        task_status[task_id]["progress"] = 30
-        
+        task_status.patch(task_id, progress=30)
+    
         # 查找目标字段
-        personnel_fields = [f for f in fields if f.get("type") == 11]
-        text_fields = [f for f in fields if f.get("type") == 1]
-        
-        target_fields = {}
-        
-        # 查找人员字段
-        if personnel_fields:
-            target_fields["member"] = personnel_fields[0]
-        elif text_fields:
-            target_fields["member"] = text_fields[0]
-        
-        # 查找群名称字段
-        chat_name_fields = [f for f in text_fields if "群" in f.get("field_name", "") or "名称" in f.get("field_name", "")]
-        if chat_name_fields:
-            target_fields["chat_name"] = chat_name_fields[0]
-        elif len(text_fields) > 1:
-            target_fields["chat_name"] = text_fields[1]
-        
-        # 查找租户字段
-        tenant_fields = [f for f in text_fields if "租户" in f.get("field_name", "") or "tenant" in f.get("field_name", "").lower()]
-        if tenant_fields:
-            target_fields["tenant"] = tenant_fields[0]
-        elif len(text_fields) > 2:
-            target_fields["tenant"] = text_fields[2]
-        
-        task_status[task_id]["progress"] = 40
-        
-        # 获取群聊信息
-        chat_info = api.get_chat_info(chat_id)
-        chat_name = chat_info.get("name", "未知群聊")
-        task_status[task_id]["progress"] = 50
-        
-        # 获取群成员
-        members = api.get_chat_members(chat_id)
-        task_status[task_id]["progress"] = 70
-        
-        if not members:
-            raise Exception("未获取到任何群成员")
-        
-        # 准备记录
-        records = []
-        for member in members:
-            member_id = member.get("member_id")
-            if not member_id:
-                continue
-                
-            member_tenant_key = member.get("tenant_key", "")
-            fields_data = {}
-            
-            # 成员字段
-            member_field = target_fields.get("member")
-            if member_field:
-                if member_field.get("type") == 11:
-                    fields_data[member_field.get("field_name")] = [{"id": member_id}]
-                else:
-                    fields_data[member_field.get("field_name")] = member_id
-            
-            # 群名称字段
-            chat_name_field = target_fields.get("chat_name")
-            if chat_name_field:
-                fields_data[chat_name_field.get("field_name")] = chat_name
-                
-            # 租户字段
-            tenant_field = target_fields.get("tenant")
-            if tenant_field and member_tenant_key:
-                fields_data[tenant_field.get("field_name")] = member_tenant_key
-            
-            records.append({"fields": fields_data})
-        
-        task_status[task_id]["progress"] = 80
-        
-        # 写入多维表格
-        success = api.add_bitable_records(app_token, table_id, records)
-        
-        if success:
+        target_fields = find_target_fields(fields)
+        if "member" not in target_fields:
+            api.invalidate_bitable_fields(app_token, table_id)
+            raise Exception("未找到合适的字段来存储成员信息")
+        task_status.patch(task_id, progress=40)
+    
+        if dry_run:
+            plan = plan_sync(api, app_token, table_id, chat_id, target_fields)
+            task_status[task_id] = {
+                "status": "completed",
+                "message": f"同步计划: 写入 {plan['write_records']} 条记录，{plan['batches']} 批，预计 {plan['estimated_seconds']} 秒",
+                "start_time": task_status[task_id]["start_time"],
+                "end_time": datetime.now().isoformat(),
+                "progress": 100,
+                "data": plan
+            }
+            return
+    
+        task_status.patch(task_id, progress=50)
+        if shards:
+            # 分片写入，只同步内容变化的分片
+            with chat_locks.hold(chat_id):
+                summary = sync_sharded(api, app_token, table_id, [chat_id], target_fields, shards, shard_by)
+            run.finish(summary["members"])
+            task_status[task_id] = {
+                "status": "completed",
+                "message": f"成功同步 {summary['members']} 个群成员到 {shards} 个分片表（同步 {summary['touched']} 个，未变化 {summary['skipped']} 个）",
+                "start_time": task_status[task_id]["start_time"],
+                "end_time": datetime.now().isoformat(),
+                "progress": 100,
+                "data": summary
+            }
+            return
+    
+        if queued:
+            # 记录放入写入队列，由后台写入线程与其他群的记录攒满批次后写入
+            outbox_writer.register(api)
+            sink = OutboxSink(outbox, app_id, app_token, table_id, target_fields, task_id)
+            with chat_locks.hold(chat_id):
+                summary = run_member_pipeline(api, [chat_id], sink, on_page)
+            if not summary["members"]:
+                raise Exception("未获取到任何群成员")
+            run.finish(summary["members"])
             task_status[task_id] = {
                 "status": "completed",
-                "message": f"成功同步 {len(records)} 个群成员到多维表格",
+                "message": f"已获取 {summary['members']} 个群成员，记录已加入写入队列",
                 "start_time": task_status[task_id]["start_time"],
                 "end_time": datetime.now().isoformat(),
                 "progress": 100,
                 "data": {
-                    "chat_name": chat_name,
-                    "member_count": len(records),
+                    "chat_name": summary["chat_names"][0],
+                    "member_count": summary["members"],
+                    "queued_records": summary["members"],
                     "fields_used": list(target_fields.keys())
                 }
             }
-        else:
-            raise Exception("写入多维表格失败")
-            
+            return
+        
+        # 逐页获取群成员并写入多维表格
+        sink = BitableSink(api, app_token, table_id, target_fields)
+        with chat_locks.hold(chat_id):
+            summary = run_member_pipeline(api, [chat_id], sink, on_page)
+    
+        if not summary["members"]:
+            raise Exception("未获取到任何群成员")
+        run.finish(summary["members"])
+    
+        task_status[task_id] = {
+            "status": "completed",
+            "message": f"成功同步 {summary['members']} 个群成员到多维表格",
+            "start_time": task_status[task_id]["start_time"],
+            "end_time": datetime.now().isoformat(),
+            "progress": 100,
+            "data": {
+                "chat_name": summary["chat_names"][0],
+                "member_count": summary["members"],
+                "fields_used": list(target_fields.keys()),
+                # 写入时隔离的无效记录、按已知无效成员ID跳过的记录（GET /quarantine 查看）
+                "quarantined_records": api.quarantined_records,
+                "skipped_records": api.skipped_records
+            }
+        }
+        
     except Exception as e:
         logger.error(f"同步任务失败: {e}")
+        if run is not None:
+            run.finish(error=str(e))
         task_status[task_id] = {
             "status": "failed",
             "message": f"同步失败: {str(e)}",
@@ -199,6 +463,58 @@ async def sync_members_task(task_id: str, bitable_url: str, chat_id: str, app_id
             "progress": 0
         }
 
+def cleanup_task(task_id: str, bitable_url: str, chat_ids: List[str], app_id: str, app_secret: str,
+                 dry_run: bool = False):
+    """后台清理多维表格中的重复记录和已退群成员的记录"""
+    with log_context(task_id=task_id):
+        try:
+            task_status.patch(
+                task_id,
+                status="running",
+                message="正在扫描多维表格记录...",
+                start_time=datetime.now().isoformat(),
+                queue_position=0,
+                eta_seconds=0
+            )
+            api = FeishuAPI(app_id, app_secret)
+            app_token, table_id = api.parse_bitable_url(bitable_url)
+            target_fields = find_target_fields(api.get_bitable_fields(app_token, table_id))
+            if "member" not in target_fields:
+                api.invalidate_bitable_fields(app_token, table_id)
+                raise Exception("未找到成员字段")
+            
+            def on_progress(progress: Dict):
+                # 扫描阶段无法预知总行数，进度只在删除阶段按批次计算
+                if progress["phase"] == "delete":
+                    done = progress["deleted"] + progress["failed"]
+                    task_status.patch(task_id, message="正在删除记录...", cleanup=progress,
+                                      progress=50 + 50 * done // max(progress["total"], 1))
+                else:
+                    task_status.patch(task_id, cleanup=progress, progress=10)
+            
+            summary = cleanup_table(api, app_token, table_id, target_fields, chat_ids, dry_run, on_progress=on_progress)
+            if dry_run:
+                message = f"待删除 {summary['stale']} 条记录（重复 {summary['duplicates']}，退群 {summary['departed']}）"
+            else:
+                message = f"已删除 {summary['deleted']} 条记录（重复 {summary['duplicates']}，退群 {summary['departed']}）"
+            task_status[task_id] = {
+                "status": "failed" if summary["failed"] else "completed",
+                "message": message + (f"，{summary['failed']} 条删除失败" if summary["failed"] else ""),
+                "start_time": task_status[task_id]["start_time"],
+                "end_time": datetime.now().isoformat(),
+                "progress": 100,
+                "data": summary
+            }
+        except Exception as e:
+            logger.error(f"清理任务失败: {e}")
+            task_status[task_id] = {
+                "status": "failed",
+                "message": f"清理失败: {str(e)}",
+                "start_time": task_status[task_id].get("start_time"),
+                "end_time": datetime.now().isoformat(),
+                "progress": 0
+            }
+
 @app.get("/")
 async def root():
     """根路径，返回API信息"""
@@ -207,55 +523,157 @@ async def root():
         "version": "1.0.0",
         "description": "提供飞书群成员信息同步到多维表格的HTTP接口",
         "endpoints": {
-            "POST /sync": "同步群成员信息（异步）",
+            "POST /sync": "同步群成员信息（异步，排队执行）",
+            "POST /sync/batch": "批量同步多个群（默认 bulk 通道）",
             "POST /sync/immediate": "同步群成员信息（同步）",
+            "POST /cleanup": "清理多维表格中的重复记录和已退群成员的记录（异步）",
+            "POST /preflight": "并发检查多组应用凭证、多维表格和群聊权限",
+            "GET /outbox": "写入队列状态",
+            "POST /outbox/flush": "立即写出写入队列中不满一批的记录",
             "GET /task/{task_id}": "查询任务状态",
-            "GET /health": "健康检查"
+            "GET /export/{task_id}": "下载导出文件",
+            "GET /profile/{task_id}/{kind}": "下载剖析结果（pstats、speedscope、network）",
+            "GET /health": "健康检查",
+            "GET /ready": "就绪检查（启动预热完成前返回 503）",
+            "GET /metrics": "写入控制指标（Prometheus 文本格式）",
+            "GET /admin/config": "运行时调优参数的生效值和来源（需要 ADMIN_TOKEN）",
+            "PATCH /admin/config": "修改运行时调优参数，所有 worker 生效（需要 ADMIN_TOKEN）"
         }
     }
 
 @app.get("/health")
 async def health_check():
     """健康检查"""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    breakers = breaker_snapshot()
+    status = "degraded" if open_breakers() else "healthy"
+    return {
+        "status": status,
+        "timestamp": datetime.now().isoformat(),
+        "circuit_breakers": breakers,
+        "queue": scheduler.stats() if scheduler else {}
+    }
+
+@app.get("/ready")
+async def readiness_check():
+    """就绪检查：服务初始化和启动预热（token、连接、字段信息）完成前返回 503"""
+    if scheduler is None:
+        return FastJSONResponse({"ready": False, "status": "starting"}, status_code=503)
+    state = prewarmer.snapshot() if prewarmer else {"ready": True, "status": "disabled"}
+    return FastJSONResponse(state, status_code=200 if state["ready"] else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """本进程各数据表的自适应写入参数、请求结果和调整决策（Prometheus 文本格式）"""
+    return PlainTextResponse("\n".join(metrics_lines()) + "\n", media_type="text/plain; version=0.0.4")
+
+def ensure_breakers_closed():
+    """飞书接口熔断时直接拒绝新的同步请求，提示调用方稍后重试"""
+    opened = open_breakers()
+    if opened:
+        retry_after = max(breaker.snapshot().get("retry_after", 0) for breaker in opened)
+        raise HTTPException(
+            status_code=503,
+            detail=f"飞书接口熔断中: {', '.join(breaker.family for breaker in opened)}",
+            headers={"Retry-After": str(max(math.ceil(retry_after), 1))}
+        )
+
+def submit_sync(request: SyncRequest) -> tuple:
+    """校验参数并把同步任务提交到调度器，返回 (任务ID, 排队信息)"""
+    app_id, app_secret = get_feishu_config(request)
+    validate_sink(request)
+    if request.priority not in scheduler.lanes:
+        raise HTTPException(status_code=400, detail=f"不支持的任务通道: {request.priority}，可选: {', '.join(scheduler.lanes)}")
+    
+    # 生成任务ID
+    task_id = f"sync_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    task_status[task_id] = {
+        "status": "queued",
+        "message": "排队中",
+        "submit_time": datetime.now().isoformat(),
+        "progress": 0,
+        "lane": request.priority
+    }
+    
+    queue_info = scheduler.submit(
+        task_id,
+        request.priority,
+        sync_members_task,
+        task_id,
+        request.bitable_url,
+        request.chat_id,
+        app_id,
+        app_secret,
+        request.dry_run,
+        request.sink,
+        request.shards,
+        request.shard_by,
+        request.profile,
+        request.profile_mode,
+        use_outbox(request)
+    )
+    return task_id, queue_info
 
 @app.post("/sync", response_model=SyncResponse)
-async def sync_members_async(request: SyncRequest, background_tasks: BackgroundTasks):
+def sync_members_async(request: SyncRequest):
     """异步同步群成员信息到多维表格"""
+    ensure_breakers_closed()
+    
     try:
-        app_id, app_secret = get_feishu_config(request)
-        
-        # 生成任务ID
-        task_id = f"sync_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{hash(request.chat_id) % 10000}"
-        
-        # 启动后台任务
-        background_tasks.add_task(
-            sync_members_task, 
-            task_id, 
-            request.bitable_url, 
-            request.chat_id, 
-            app_id, 
-            app_secret
-        )
-        
+        task_id, queue_info = submit_sync(request)
         return SyncResponse(
             success=True,
-            message="同步任务已启动",
+            message="同步任务已加入队列",
+            data=queue_info,
             task_id=task_id
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"启动同步任务失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/sync/batch", response_model=SyncResponse)
+def sync_members_batch(request: BatchSyncRequest):
+    """批量同步多个群，每个群一个任务（默认进入 bulk 通道）"""
+    ensure_breakers_closed()
+    if not request.chat_ids:
+        raise HTTPException(status_code=400, detail="chat_ids 不能为空")
+    
+    try:
+        task_ids = []
+        fields = request.model_dump(exclude={"chat_ids"}, exclude_none=True)
+        for chat_id in request.chat_ids:
+            task_id, _ = submit_sync(SyncRequest(chat_id=chat_id, **fields))
+            task_ids.append(task_id)
+        return SyncResponse(
+            success=True,
+            message=f"已加入 {len(task_ids)} 个同步任务",
+            data={"task_ids": task_ids, "lane": request.priority}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"启动批量同步任务失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/sync/immediate", response_model=SyncResponse)
-async def sync_members_immediate(request: SyncRequest):
+def sync_members_immediate(request: SyncRequest):
     """同步同步群成员信息到多维表格"""
+    ensure_breakers_closed()
+    
+    run = None
     try:
         app_id, app_secret = get_feishu_config(request)
+        validate_sink(request)
+        if request.sink != "bitable":
+            raise HTTPException(status_code=400, detail="立即同步仅支持输出到多维表格，导出文件请使用 /sync")
         
         # 创建API实例
         api = FeishuAPI(app_id, app_secret)
+        if not request.dry_run:
+            run = start_run(api, [request.chat_id], "api_immediate", "shards" if request.shards else "bitable")
         
         # 解析多维表格URL
         app_token, table_id = api.parse_bitable_url(request.bitable_url)
@@ -266,6 +684,33 @@ async def sync_members_immediate(request: SyncRequest):
         # 获取表格字段
         fields = api.get_bitable_fields(app_token, table_id)
         
+        if request.dry_run:
+            target_fields = find_target_fields(fields)
+            if "member" not in target_fields:
+                api.invalidate_bitable_fields(app_token, table_id)
+                raise HTTPException(status_code=400, detail="未找到合适的字段来存储成员信息")
+            plan = plan_sync(api, app_token, table_id, request.chat_id, target_fields)
+            return SyncResponse(
+                success=True,
+                message=f"同步计划: 写入 {plan['write_records']} 条记录，{plan['batches']} 批，预计 {plan['estimated_seconds']} 秒",
+                data=plan
+            )
+        
+        if request.shards:
+            target_fields = find_target_fields(fields)
+            if "member" not in target_fields:
+                api.invalidate_bitable_fields(app_token, table_id)
+                raise HTTPException(status_code=400, detail="未找到合适的字段来存储成员信息")
+            with chat_locks.hold(request.chat_id):
+                summary = sync_sharded(api, app_token, table_id, [request.chat_id], target_fields,
+                                       request.shards, request.shard_by)
+            run.finish(summary["members"])
+            return SyncResponse(
+                success=True,
+                message=f"成功同步 {summary['members']} 个群成员到 {request.shards} 个分片表",
+                data=summary
+            )
+        
         # 查找目标字段（简化版本）
         personnel_fields = [f for f in fields if f.get("type") == 11]
         text_fields = [f for f in fields if f.get("type") == 1]
@@ -275,63 +720,229 @@ async def sync_members_immediate(request: SyncRequest):
             target_fields["member"] = personnel_fields[0]
         elif text_fields:
             target_fields["member"] = text_fields[0]
-        
-        # 获取群聊信息
-        chat_info = api.get_chat_info(request.chat_id)
-        chat_name = chat_info.get("name", "未知群聊")
-        
-        # 获取群成员
-        members = api.get_chat_members(request.chat_id)
-        
-        if not members:
-            raise HTTPException(status_code=404, detail="未获取到任何群成员")
-        
-        # 准备记录（简化版本）
-        records = []
-        for member in members:
-            member_id = member.get("member_id")
-            if not member_id:
-                continue
-                
-            fields_data = {}
-            member_field = target_fields.get("member")
-            if member_field:
-                if member_field.get("type") == 11:
-                    fields_data[member_field.get("field_name")] = [{"id": member_id}]
-                else:
-                    fields_data[member_field.get("field_name")] = member_id
-            
-            records.append({"fields": fields_data})
-        
-        # 写入多维表格
-        success = api.add_bitable_records(app_token, table_id, records)
-        
-        if success:
-            return SyncResponse(
-                success=True,
-                message=f"成功同步 {len(records)} 个群成员到多维表格",
-                data={
-                    "chat_name": chat_name,
-                    "member_count": len(records)
-                }
-            )
         else:
-            raise HTTPException(status_code=500, detail="写入多维表格失败")
+            api.invalidate_bitable_fields(app_token, table_id)
+            raise HTTPException(status_code=400, detail="未找到合适的字段来存储成员信息")
+        
+        # 同一个群同一时间只允许一个同步（跨 worker）
+        with chat_locks.hold(request.chat_id):
+            # 获取群聊信息
+            chat_info = api.get_chat_info(request.chat_id)
+            chat_name = chat_info.get("name", "未知群聊")
+        
+            # 获取群成员
+            members = api.get_chat_members(request.chat_id)
+        
+            if not members:
+                raise HTTPException(status_code=404, detail="未获取到任何群成员")
+        
+            # 写入多维表格（记录按批生成）
+            records = iter_member_payloads(members, target_fields, chat_name)
+            success = api.add_bitable_records(app_token, table_id, records)
+        
+            if success:
+                run.finish(len(members))
+                return SyncResponse(
+                    success=True,
+                    message=f"成功同步 {len(members)} 个群成员到多维表格",
+                    data={
+                        "chat_name": chat_name,
+                        "member_count": len(members),
+                        "quarantined_records": api.quarantined_records,
+                        "skipped_records": api.skipped_records
+                    }
+                )
+            else:
+                raise HTTPException(status_code=500, detail="写入多维表格失败")
             
-    except HTTPException:
+    except HTTPException as e:
+        if run is not None:
+            run.finish(error=str(e.detail))
         raise
+    except ChatLockedError as e:
+        if run is not None:
+            run.finish(error=str(e))
+        raise HTTPException(status_code=409, detail=str(e))
+    except CircuitOpenError as e:
+        logger.warning(f"同步失败: {e}")
+        if run is not None:
+            run.finish(error=str(e))
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
     except Exception as e:
         logger.error(f"同步失败: {e}")
+        if run is not None:
+            run.finish(error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/cleanup", response_model=SyncResponse)
+def cleanup_records(request: CleanupRequest):
+    """清理多维表格中的重复记录和已退群成员的记录（排队执行）"""
+    ensure_breakers_closed()
+    app_id, app_secret = get_feishu_config(request)
+    if request.priority not in scheduler.lanes:
+        raise HTTPException(status_code=400, detail=f"不支持的任务通道: {request.priority}，可选: {', '.join(scheduler.lanes)}")
+    
+    task_id = f"cleanup_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+    task_status[task_id] = {
+        "status": "queued",
+        "message": "排队中",
+        "submit_time": datetime.now().isoformat(),
+        "progress": 0,
+        "lane": request.priority
+    }
+    queue_info = scheduler.submit(
+        task_id, request.priority, cleanup_task,
+        task_id, request.bitable_url, request.chat_ids, app_id, app_secret, request.dry_run
+    )
+    return SyncResponse(success=True, message="清理任务已加入队列", data=queue_info, task_id=task_id)
+
+@app.post("/preflight", response_model=SyncResponse)
+def preflight(request: PreflightRequest):
+    """部署前配置检查，返回每个目标每项检查的结果和耗时"""
+    if not request.targets:
+        raise HTTPException(status_code=400, detail="targets 不能为空")
+    if request.timeout <= 0 or request.deadline <= 0:
+        raise HTTPException(status_code=400, detail="timeout 和 deadline 必须大于 0")
+    
+    targets = []
+    for target in request.targets:
+        app_id, app_secret = get_feishu_config(target)
+        targets.append({**target.model_dump(), "app_id": app_id, "app_secret": app_secret})
+    
+    report = run_preflight(targets, timeout=request.timeout, deadline=request.deadline)
+    failed = sum(1 for target in report["targets"] if not target["ok"])
+    return SyncResponse(
+        success=report["ok"],
+        message="所有配置检查通过" if report["ok"] else f"{failed} 个目标存在配置问题",
+        data=report
+    )
+
+@app.get("/outbox")
+async def outbox_status():
+    """写入队列中各目标的待写入、失败记录数，以及本进程写入线程的统计"""
+    return {
+        "targets": outbox.stats(),
+        "writer": {
+            "write_calls": outbox_writer.write_calls,
+            "records_written": outbox_writer.records_written,
+            "registered_apps": len(outbox_writer.clients)
+        }
+    }
+
+@app.post("/outbox/flush")
+async def flush_outbox():
+    """不等攒满批次，立即写出写入队列中的记录"""
+    outbox_writer.flush_now()
+    return {"success": True, "message": "写入线程将写出所有待写入的记录"}
+
+@app.get("/members/{member_id}/chats")
+async def member_chats(member_id: str):
+    """成员所在的群（来自本地成员索引，只包含同步过的群）"""
+    chats = membership_index.chats_of(member_id)
+    return {"member_id": member_id, "count": len(chats), "chats": chats}
+
+@app.get("/chats/{chat_id}/members")
+async def chat_members(chat_id: str, offset: int = 0, limit: int = 1000):
+    """群成员ID（来自本地成员索引，按页返回）"""
+    result = membership_index.members_of(chat_id, max(offset, 0), max(min(limit, 10000), 0))
+    if result is None:
+        raise HTTPException(status_code=404, detail="群未同步过，成员索引中没有记录")
+    return {**result, "offset": offset, "limit": limit}
+
+@app.get("/quarantine")
+async def quarantine_entries(table_id: str = None, limit: int = 100):
+    """写入时被拒绝并隔离的无效记录（新的在前），以及已知无效、写入前跳过的成员ID数"""
+    quarantine = get_quarantine()
+    if quarantine is None:
+        raise HTTPException(status_code=404, detail="无效记录隔离未开启")
+    return {**quarantine.stats(), "entries": quarantine.entries(table_id, max(min(limit, 1000), 0))}
+
+@app.get("/stats")
+async def sync_stats(chat_id: str = None, days: float = 7):
+    """同步历史统计：各群最近 days 天的耗时分位数、与上一时间段相比的趋势，以及耗时超过基线的同步"""
+    history = get_history()
+    if history is None:
+        raise HTTPException(status_code=404, detail="同步历史未开启")
+    return history.stats(chat_id, days)
+
+def require_admin(authorization: str):
+    """管理接口鉴权：Authorization: Bearer <ADMIN_TOKEN>；未设置 ADMIN_TOKEN 时管理接口关闭"""
+    token = os.getenv("ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(status_code=403, detail="未设置 ADMIN_TOKEN，管理接口已关闭")
+    scheme, _, credentials = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(credentials.encode(), token.encode()):
+        raise HTTPException(status_code=401, detail="管理接口鉴权失败", headers={"WWW-Authenticate": "Bearer"})
+
+@app.get("/admin/config")
+async def get_admin_config(authorization: str = Header(None)):
+    """运行时调优参数的生效值、来源（config、env、file、admin）和取值范围"""
+    require_admin(authorization)
+    return get_runtime_config().snapshot()
+
+@app.patch("/admin/config")
+def update_admin_config(overrides: Dict[str, Any], authorization: str = Header(None)):
+    """修改运行时调优参数（如 {"batch_size": 200, "adaptive_writes": {"max_concurrency": 2}}，值为 null 时恢复默认）
+
+    设置 RUNTIME_CONFIG_FILE 时写入覆盖文件，其他 worker 在下一次检查文件时生效；否则只修改本进程。
+    """
+    require_admin(authorization)
+    runtime_config = get_runtime_config()
+    try:
+        changed = runtime_config.update(overrides)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"管理接口修改运行时配置: {', '.join(changed) or '无变化'}")
+    return {
+        "success": True,
+        "changed": {name: {"old": old, "new": new} for name, (old, new) in changed.items()},
+        "scope": "all_workers" if runtime_config.path else "this_worker",
+        "config": runtime_config.snapshot()
+    }
+
 @app.get("/task/{task_id}")
 async def get_task_status(task_id: str):
     """查询任务状态"""
-    if task_id not in task_status:
+    task = task_status.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="任务不存在")
     
-    return task_status[task_id]
+    # 在本进程排队的任务返回实时的排队位置和预计等待时间
+    if task.get("status") == "queued":
+        task.update(scheduler.queue_info(task_id) or {})
+    return task
+
+@app.get("/export/{task_id}")
+async def download_export(task_id: str):
+    """下载导出任务生成的文件"""
+    task = task_status.get(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if task.get("status") != "completed" or "download_url" not in task.get("data", {}):
+        raise HTTPException(status_code=404, detail="导出文件不存在或任务未完成")
+    
+    sink_type = task["data"]["sink"]
+    return FileResponse(get_export_path(task_id, sink_type), filename=f"{task_id}.{sink_type}")
+
+@app.get("/profile/{task_id}/{kind}")
+async def download_profile(task_id: str, kind: str):
+    """下载剖析结果：pstats、speedscope JSON 或网络耗时 JSON"""
+    task = task_status.get(task_id)
+    if not task or "profile" not in task:
+        raise HTTPException(status_code=404, detail="任务不存在或未开启剖析")
+    if kind not in task["profile"].get("artifacts", {}):
+        raise HTTPException(status_code=404, detail=f"剖析结果不存在: {kind}")
+    
+    filename = f"{task_id}{PROFILE_ARTIFACTS[kind]}"
+    return FileResponse(os.path.join(PROFILE_DIR, filename), filename=filename)
 
 if __name__ == "__main__":
+    import uvicorn
+    
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    # WEB_CONCURRENCY > 1 时启动多个 worker 进程，共享 COORDINATION_DB 中的状态
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
+    if workers > 1:
+        uvicorn.run("api_server:app", host="0.0.0.0", port=port, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
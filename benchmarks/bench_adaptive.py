@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自适应写入压测
+对比固定参数（batch_size 500、单并发）与自适应控制写入 N 条记录的吞吐、限流次数和最终参数。
+需要先启动带限流和按记录数延迟的模拟服务：
+
+    MOCK_LATENCY_MS=20 MOCK_WRITE_RATE=8 MOCK_LATENCY_PER_RECORD_MS=1 \\
+        uvicorn mock_feishu_server:app --app-dir benchmarks --port 9000
+    python benchmarks/bench_adaptive.py --base-url http://127.0.0.1:9000/open-apis --records 20000
+"""
+
+import os
+import sys
+import time
+import json
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def run(mode: str, records: int) -> dict:
+    import adaptive
+    from config import API_CONFIG
+    from feishu_group_members import FeishuAPI
+
+    API_CONFIG["adaptive_writes"] = {**API_CONFIG.get("adaptive_writes", {}), "enabled": mode == "adaptive"}
+    api = FeishuAPI("cli_bench", "secret")
+    table_id = f"tbl_{mode}_{int(time.time())}"
+    payloads = ({"fields": {"人员": [{"id": f"ou_{i:032x}"}], "群名称": "压测群"}} for i in range(records))
+
+    start = time.perf_counter()
+    ok = api.add_bitable_records("app_bench", table_id, payloads)
+    elapsed = time.perf_counter() - start
+    state = adaptive.get_write_controller(table_id).snapshot()
+    return {
+        "mode": mode,
+        "ok": ok,
+        "seconds": round(elapsed, 1),
+        "records_per_second": round(state["records_written"] / elapsed),
+        "requests": sum(state["outcomes"].values()),
+        "throttled": state["outcomes"]["throttled"],
+        "final_batch_size": state["batch_size"],
+        "final_concurrency": state["concurrency"],
+        "decisions": sum(decision["count"] for decision in state["decisions"])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="自适应写入压测")
+    parser.add_argument("--base-url", required=True, help="模拟服务地址，如 http://127.0.0.1:9000/open-apis")
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--modes", nargs="+", default=["fixed", "adaptive"])
+    args = parser.parse_args()
+
+    os.environ["FEISHU_BASE_URL"] = args.base_url
+    import logging
+    logging.disable(logging.WARNING)
+    for mode in args.modes:
+        print(json.dumps(run(mode, args.records), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
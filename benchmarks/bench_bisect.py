@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+无效记录二分隔离压测
+写入 N 条记录，其中 k 条的人员字段为无效成员ID（模拟服务对 ou_bad 开头的ID返回 1254066，整批被拒绝）。
+第一次写入二分定位并隔离无效记录，输出写入的记录数、请求数和相对无效记录时的额外请求数
+（上限约 2k·log2(批大小)）；第二次写入同样的记录，已知无效的成员ID写入前跳过，不再产生额外请求。
+需要先启动模拟服务：
+
+    MOCK_LATENCY_MS=5 uvicorn mock_feishu_server:app --app-dir benchmarks --port 9000
+    python benchmarks/bench_bisect.py --base-url http://127.0.0.1:9000/open-apis --records 20000 --bad 1 10 50
+"""
+
+import os
+import sys
+import math
+import time
+import random
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def run(records: int, bad: int, seed: int = 0) -> list:
+    from config import API_CONFIG
+    from feishu_group_members import FeishuAPI
+
+    bad_rows = set(random.Random(seed).sample(range(records), bad))
+    table_id = f"tbl_bisect_{bad}_{int(time.time())}"
+    api = FeishuAPI(f"cli_bench_{bad}", "secret")
+    api.get_tenant_access_token()
+
+    def payloads():
+        for i in range(records):
+            member_id = f"ou_bad{i:029x}" if i in bad_rows else f"ou_{i:032x}"
+            yield {"fields": {"人员": [{"id": member_id}], "群名称": "压测群"}}
+
+    results = []
+    for attempt in ("首次写入", "再次写入"):
+        requests_before = api.request_count
+        quarantined, skipped = api.quarantined_records, api.skipped_records
+        start = time.perf_counter()
+        ok = api.add_bitable_records("app_bench", table_id, payloads())
+        elapsed = time.perf_counter() - start
+        ideal = math.ceil((records - bad) / API_CONFIG["batch_size"])
+        requests = api.request_count - requests_before
+        results.append({
+            "attempt": attempt,
+            "ok": ok,
+            "seconds": round(elapsed, 2),
+            "written": records - (api.quarantined_records - quarantined) - (api.skipped_records - skipped),
+            "quarantined": api.quarantined_records - quarantined,
+            "skipped": api.skipped_records - skipped,
+            "requests": requests,
+            "extra_requests": requests - ideal,
+            "bound": round(2 * bad * math.log2(API_CONFIG["batch_size"])) if attempt == "首次写入" else 0
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无效记录二分隔离压测")
+    parser.add_argument("--base-url", required=True, help="模拟服务地址，如 http://127.0.0.1:9000/open-apis")
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--bad", type=int, nargs="+", default=[1, 10, 50], help="无效记录数")
+    args = parser.parse_args()
+
+    os.environ["FEISHU_BASE_URL"] = args.base_url
+    # 隔离表使用临时文件；固定批大小，便于与无效记录时的请求数比较
+    os.environ["QUARANTINE_DB"] = os.path.join(tempfile.mkdtemp(), "quarantine.db")
+    from config import API_CONFIG
+    API_CONFIG["adaptive_writes"] = {**API_CONFIG.get("adaptive_writes", {}), "enabled": False}
+    API_CONFIG["write_interval"] = 0
+    import logging
+    logging.disable(logging.WARNING)
+
+    print(f"{'无效':>5} {'写入':<8} {'耗时(s)':>8} {'写入条数':>8} {'隔离':>5} {'跳过':>5} {'请求':>6} {'额外请求':>8} {'上限':>6}")
+    for bad in args.bad:
+        for row in run(args.records, bad):
+            print(f"{bad:>5} {row['attempt']:<8} {row['seconds']:>8} {row['written']:>8} {row['quarantined']:>5} "
+                  f"{row['skipped']:>5} {row['requests']:>6} {row['extra_requests']:>8} {row['bound']:>6}"
+                  f"{'' if row['ok'] else '  ❌ 写入失败'}")
+
+
+if __name__ == "__main__":
+    main()
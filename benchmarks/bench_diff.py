@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+对账引擎压测
+N 个群成员与约 N 行现有记录（约 5% 已退群、2% 重复、3% 租户变化）按页流式对账，对比：
+  read-only      只生成分页（对照）
+  dict           原 plan_sync 的字符串字典
+  engine-python  diff_engine 整数哈希 + 字典（未安装 NumPy 时的路径）
+  engine-numpy   diff_engine 整数哈希 + NumPy 排序数组
+  engine-numpy-4 同上，4 个进程分区并行
+分别统计耗时（生成分页 + 编码 + 对账）和 tracemalloc 峰值内存（字典方式保留的成员ID字符串计入内存）
+
+用法:
+    python benchmarks/bench_diff.py --rows 10000 100000 1000000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CHAT_NAME = "压测群"
+PAGE_SIZE = 500
+
+
+def member_id(i: int) -> str:
+    return f"ou_{(i * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF:016x}{i:016x}"
+
+
+def member_pages(rows: int):
+    """群成员分页（与接口一样每页都是新的字符串）"""
+    for start in range(0, rows, PAGE_SIZE):
+        yield [(member_id(i), f"tenant_{i % 20}") for i in range(start, min(start + PAGE_SIZE, rows))]
+
+
+def record_pages(rows: int, seed: int = 0):
+    """现有记录分页：约 5% 成员已退群（换成表中多出的成员）、3% 租户变化、2% 重复"""
+    rng = random.Random(seed)
+    page = []
+    for i in range(rows):
+        roll = rng.random()
+        tenant = "tenant_changed" if roll < 0.03 else f"tenant_{i % 20}"
+        record = (member_id(i + rows if roll > 0.95 else i), CHAT_NAME, tenant)
+        page.append(record)
+        if rng.random() < 0.02:
+            page.append(record)
+        if len(page) >= PAGE_SIZE:
+            yield page
+            page = []
+    if page:
+        yield page
+
+
+def read_only(rows: int) -> dict:
+    # 只生成分页，作为对照
+    count = sum(len(page) for page in member_pages(rows)) + sum(len(page) for page in record_pages(rows))
+    return {"rows": count}
+
+
+def diff_dict(rows: int) -> dict:
+    desired = {}
+    for page in member_pages(rows):
+        for member, tenant in page:
+            desired[member] = sys.intern(tenant)
+    seen = {}
+    update = delete = unchanged = 0
+    for member, chat_name, tenant in (record for page in record_pages(rows) for record in page):
+        if chat_name != CHAT_NAME:
+            continue
+        if member in seen or member not in desired:
+            delete += 1
+            continue
+        seen[member] = tenant
+        if desired[member] and tenant != desired[member]:
+            update += 1
+        else:
+            unchanged += 1
+    return {"add": len(desired) - len(seen), "delete": delete, "update": update, "unchanged": unchanged}
+
+
+def diff_engine(rows: int, backend: str, workers: int = 1) -> dict:
+    from diff_engine import KeyColumns, reconcile
+    desired, current = KeyColumns(), KeyColumns()
+    for page in member_pages(rows):
+        for member, tenant in page:
+            desired.add((member, CHAT_NAME), tenant)
+    for page in record_pages(rows):
+        for member, chat_name, tenant in page:
+            current.add((member, chat_name), tenant)
+    result = reconcile(desired, current, workers=workers, backend=backend)
+    return {"add": len(result["add"]), "delete": len(result["delete"]), "update": len(result["update"]),
+            "unchanged": result["unchanged"]}
+
+
+METHODS = {
+    "read-only": read_only,
+    "dict": diff_dict,
+    "engine-python": lambda rows: diff_engine(rows, "python"),
+    "engine-numpy": lambda rows: diff_engine(rows, "numpy"),
+    "engine-numpy-4": lambda rows: diff_engine(rows, "numpy", workers=4),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对账引擎压测")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--methods", nargs="+", default=list(METHODS), choices=list(METHODS))
+    args = parser.parse_args()
+
+    print(f"{'行数':>9} {'方法':<16} {'耗时(s)':>8} {'峰值内存(MB)':>12}  结果")
+    for rows in args.rows:
+        expected = None
+        for name in args.methods:
+            method = METHODS[name]
+            start = time.perf_counter()
+            result = method(rows)
+            seconds = time.perf_counter() - start
+
+            # 内存单独测量（tracemalloc 会拖慢纯 Python 代码）
+            tracemalloc.start()
+            method(rows)
+            peak = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+
+            if name != "read-only":
+                expected = expected or result
+            mark = "" if result == expected or name == "read-only" else "  ❌ 结果不一致"
+            print(f"{rows:>9} {name:<16} {seconds:>8.2f} {peak:>12.1f}  {result}{mark}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP/2 传输压测
+N 个群并发同步（获取群信息、逐页获取成员、写入多维表格），对比：
+  http1        requests 连接池（pool_maxsize 与并发数相同），线程并发
+  http2        http_transport.Http2Session，线程并发
+  http2-async  http_transport.AsyncHttp2Session，asyncio 并发
+统计耗时和模拟服务看到的连接数。模拟服务需要用支持 h2c 的 hypercorn 启动：
+
+    cd benchmarks && MOCK_MEMBERS=1000 MOCK_LATENCY_MS=30 hypercorn mock_feishu_server:app --bind 127.0.0.1:9000
+    python benchmarks/bench_http2.py --base-url http://127.0.0.1:9000/open-apis --chats 50
+"""
+
+import os
+import sys
+import time
+import json
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TARGET_FIELDS = {
+    "member": {"field_name": "人员", "type": 11},
+    "chat_name": {"field_name": "群名称", "type": 1},
+    "tenant": {"field_name": "租户ID", "type": 1}
+}
+
+
+def mock_connections(base_url: str, reset: bool = False) -> dict:
+    import requests
+    root = base_url.rsplit("/open-apis", 1)[0]
+    if reset:
+        requests.post(f"{root}/_mock/reset")
+        return {}
+    return requests.get(f"{root}/_mock/connections").json()
+
+
+def run_threads(mode: str, base_url: str, chats: int, connections: int, streams: int) -> float:
+    import requests
+    from requests.adapters import HTTPAdapter
+    from feishu_group_members import FeishuAPI
+    from http_transport import Http2Session
+    from sinks import BitableSink, run_member_pipeline
+
+    api = FeishuAPI("cli_bench", "secret")
+    if mode == "http1":
+        api.session = requests.Session()
+        api.session.mount("http://", HTTPAdapter(pool_maxsize=chats))
+        api.session.mount("https://", HTTPAdapter(pool_maxsize=chats))
+    else:
+        api.session = Http2Session(connections, streams, h2c=base_url.startswith("http://"))
+    api.get_tenant_access_token()
+
+    def sync(i: int):
+        table_id = f"tbl_{mode}_{i}"
+        return run_member_pipeline(api, [f"oc_{i}"], BitableSink(api, "app_bench", table_id, TARGET_FIELDS))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=chats) as executor:
+        list(executor.map(sync, range(chats)))
+    return time.perf_counter() - start
+
+
+async def _sync_async(session, base_url: str, headers: dict, i: int):
+    import fastjson
+    info = await session.request_json("GET", f"{base_url}/im/v1/chats/oc_{i}", headers=headers)
+    chat_name = info["data"].get("name", "")
+    url = f"{base_url}/im/v1/chats/oc_{i}/members"
+    page_token = None
+    records = []
+    while True:
+        params = {"page_size": 100, **({"page_token": page_token} if page_token else {})}
+        data = (await session.request_json("GET", url, headers=headers, params=params))["data"]
+        records.extend({"fields": {"人员": [{"id": m["member_id"]}], "群名称": chat_name}} for m in data["items"])
+        page_token = data.get("page_token")
+        if not page_token:
+            break
+    write_url = f"{base_url}/bitable/v1/apps/app_bench/tables/tbl_async_{i}/records/batch_create"
+    for start in range(0, len(records), 500):
+        body = fastjson.dumps({"records": records[start:start + 500]})
+        await session.request_json("POST", write_url, data=body,
+                                   headers={**headers, "Content-Type": "application/json; charset=utf-8"})
+
+
+async def run_async(base_url: str, chats: int, connections: int, streams: int) -> float:
+    from http_transport import AsyncHttp2Session
+    session = AsyncHttp2Session(connections, streams, h2c=base_url.startswith("http://"))
+    token = (await session.request_json(
+        "POST", f"{base_url}/auth/v3/tenant_access_token/internal/",
+        data=b'{"app_id": "cli_bench", "app_secret": "secret"}', headers={"Content-Type": "application/json"}
+    ))["tenant_access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    start = time.perf_counter()
+    await asyncio.gather(*(_sync_async(session, base_url, headers, i) for i in range(chats)))
+    elapsed = time.perf_counter() - start
+    await session.aclose()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/2 传输压测")
+    parser.add_argument("--base-url", required=True, help="模拟服务地址，如 http://127.0.0.1:9000/open-apis")
+    parser.add_argument("--chats", type=int, default=50, help="并发同步的群数")
+    parser.add_argument("--connections", type=int, default=2, help="HTTP/2 连接数")
+    parser.add_argument("--streams", type=int, default=50, help="每个 HTTP/2 连接的并发流数")
+    parser.add_argument("--modes", nargs="+", default=["http1", "http2", "http2-async"])
+    args = parser.parse_args()
+
+    os.environ["FEISHU_BASE_URL"] = args.base_url
+    import logging
+    logging.disable(logging.WARNING)
+
+    for mode in args.modes:
+        mock_connections(args.base_url, reset=True)
+        if mode == "http2-async":
+            seconds = asyncio.run(run_async(args.base_url, args.chats, args.connections, args.streams))
+        else:
+            seconds = run_threads(mode, args.base_url, args.chats, args.connections, args.streams)
+        print(json.dumps({"mode": mode, "chats": args.chats, "seconds": round(seconds, 2),
+                          **mock_connections(args.base_url)}, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
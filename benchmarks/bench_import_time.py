@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+冷启动耗时基准
+用 python -X importtime 测量各入口模块的导入耗时，与基线比较防止启动变慢
+
+用法:
+    python benchmarks/bench_import_time.py                  # 测量并与基线比较
+    python benchmarks/bench_import_time.py --update-baseline
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_time_baseline.json")
+
+# 需要测量的入口模块
+MODULES = ["feishu_group_members", "api_server", "trigger_github_action", "test_config"]
+
+
+def measure_import(module: str) -> dict:
+    """在新进程中导入模块，返回该模块的累计导入耗时和耗时最多的依赖（微秒）"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr}")
+
+    total = 0
+    imports = []
+    children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((int(cumulative_us), name.strip()))
+        elif depth == 0:
+            # importtime 先输出子模块再输出父模块，遇到顶层模块时 children 即为其直接依赖
+            if name.strip() == module:
+                total = int(cumulative_us)
+                imports = children
+            children = []
+    imports.sort(reverse=True)
+    return {"total_us": total, "top": imports[:5]}
+
+
+def run(repeat: int) -> dict:
+    """每个模块测量多次取中位数"""
+    results = {}
+    for module in MODULES:
+        samples = [measure_import(module) for _ in range(repeat)]
+        totals = [sample["total_us"] for sample in samples]
+        results[module] = {
+            "median_ms": round(statistics.median(totals) / 1000, 1),
+            "min_ms": round(min(totals) / 1000, 1),
+            "top": samples[0]["top"]
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动耗时基准")
+    parser.add_argument("--repeat", type=int, default=5, help="每个模块测量次数")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="允许超过基线的倍数")
+    parser.add_argument("--update-baseline", action="store_true", help="用本次结果更新基线")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    baseline = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    regressions = []
+    for module, result in results.items():
+        line = f"{module:<24} 中位数 {result['median_ms']:7.1f} ms  最小 {result['min_ms']:7.1f} ms"
+        if module in baseline:
+            limit = baseline[module] * args.tolerance
+            line += f"  基线 {baseline[module]:7.1f} ms"
+            if result["median_ms"] > limit:
+                line += "  ❌ 超出基线"
+                regressions.append(module)
+        print(line)
+        for cumulative_us, name in result["top"]:
+            print(f"    {cumulative_us / 1000:7.1f} ms  {name}")
+
+    if args.update_baseline:
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump({module: result["median_ms"] for module, result in results.items()}, f, indent=2)
+            f.write("\n")
+        print(f"已更新基线: {BASELINE_FILE}")
+    elif regressions:
+        print(f"启动耗时回退: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
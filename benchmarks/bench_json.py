@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON 编解码微基准
+对比各 JSON 后端编码 500 条记录的 batch_create 请求体、解码 500 条记录的 records 响应的耗时，
+标准库 json 默认参数（ensure_ascii=True，即 requests 的 json= 编码方式）作为基线
+
+用法:
+    python benchmarks/bench_json.py --batch-size 500 --repeat 200
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fastjson
+
+
+def make_batch(size: int) -> dict:
+    """batch_create 请求体：人员字段为嵌套字典"""
+    return {
+        "records": [
+            {
+                "fields": {
+                    "人员": [{"id": f"ou_{i:032x}"}],
+                    "群名称": "全员群-产品技术中心",
+                    "租户ID": f"tenant_{i % 3}"
+                }
+            }
+            for i in range(size)
+        ]
+    }
+
+
+def make_response(size: int) -> bytes:
+    """records 列表响应"""
+    items = [
+        {
+            "record_id": f"rec{i:010d}",
+            "fields": {
+                "人员": [{"id": f"ou_{i:032x}", "name": f"成员{i}", "en_name": f"member{i}", "email": ""}],
+                "群名称": [{"type": "text", "text": "全员群-产品技术中心"}],
+                "租户ID": [{"type": "text", "text": f"tenant_{i % 3}"}]
+            }
+        }
+        for i in range(size)
+    ]
+    return json.dumps({"code": 0, "data": {"items": items, "has_more": True, "page_token": "x"}},
+                      ensure_ascii=False).encode("utf-8")
+
+
+def backends() -> dict:
+    """可用的后端：名称 -> (dumps, loads)"""
+    available = {"json(requests)": (lambda obj: json.dumps(obj).encode("utf-8"), json.loads)}
+    for name, factory in fastjson.BACKENDS.items():
+        try:
+            available[name] = factory()
+        except ImportError:
+            pass
+    return available
+
+
+def bench(func, arg, repeat: int) -> float:
+    """多次运行取中位数（微秒）"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON 编解码微基准")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    batch = make_batch(args.batch_size)
+    response = make_response(args.batch_size)
+    print(f"当前 fastjson 后端: {fastjson.BACKEND}，每批 {args.batch_size} 条，重复 {args.repeat} 次取中位数")
+    print(f"{'后端':<16} {'编码(µs)':>10} {'请求体(KB)':>11} {'解码(µs)':>10} {'编码加速':>9} {'解码加速':>9}")
+
+    baseline = None
+    for name, (dumps, loads) in backends().items():
+        encode_us = bench(dumps, batch, args.repeat)
+        decode_us = bench(loads, response, args.repeat)
+        size_kb = len(dumps(batch)) / 1024
+        if baseline is None:
+            baseline = (encode_us, decode_us)
+        print(f"{name:<16} {encode_us:>10.0f} {size_kb:>11.1f} {decode_us:>10.0f} "
+              f"{baseline[0] / encode_us:>8.1f}x {baseline[1] / decode_us:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+群成员内存占用压测
+对比两种同步路径的峰值 RSS：
+  raw      保留接口返回的原始字典，再一次性构造全部写入记录（原 get_chat_members + 记录列表）
+  compact  MemberRecord 紧凑表示，写入记录按批生成
+每个测量在独立子进程中进行，输出每 1 万成员的峰值 RSS 增量
+
+用法:
+    python benchmarks/bench_member_memory.py --members 10000 50000 100000
+"""
+
+import os
+import sys
+import json
+import argparse
+import itertools
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TARGET_FIELDS = {
+    "member": {"field_name": "人员", "type": 11},
+    "chat_name": {"field_name": "群名称", "type": 1},
+    "tenant": {"field_name": "租户ID", "type": 1}
+}
+CHAT_NAME = "全员群"
+PAGE_SIZE = 100
+BATCH_SIZE = 500
+
+
+def peak_rss_mb() -> float:
+    """当前进程的峰值 RSS（MB）"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def iter_pages(total: int):
+    """模拟群成员接口的分页响应（每页重新解析 JSON，字符串不共享）"""
+    for start in range(0, total, PAGE_SIZE):
+        items = [
+            {
+                "member_id": f"ou_{i:032x}",
+                "member_id_type": "open_id",
+                "name": f"成员{i}",
+                "tenant_key": f"tenant_{i % 3}"
+            }
+            for i in range(start, min(start + PAGE_SIZE, total))
+        ]
+        yield json.loads(json.dumps({"items": items}, ensure_ascii=False))["items"]
+
+
+def send(batch):
+    """模拟发送一批记录（序列化请求体）"""
+    json.dumps({"records": batch}, ensure_ascii=False)
+
+
+def run_raw(total: int) -> int:
+    from sinks import build_member_fields
+    members = []
+    for page in iter_pages(total):
+        members.extend(page)
+    records = [
+        {"fields": build_member_fields(TARGET_FIELDS, m["member_id"], CHAT_NAME, m.get("tenant_key", ""))}
+        for m in members if m.get("member_id")
+    ]
+    for i in range(0, len(records), BATCH_SIZE):
+        send(records[i:i + BATCH_SIZE])
+    return len(records)
+
+
+def run_compact(total: int) -> int:
+    from member_records import MemberRecord, iter_member_payloads
+    members = []
+    for page in iter_pages(total):
+        for item in page:
+            record = MemberRecord.from_item(item)
+            if record:
+                members.append(record)
+    payloads = iter_member_payloads(members, TARGET_FIELDS, CHAT_NAME)
+    while True:
+        batch = list(itertools.islice(payloads, BATCH_SIZE))
+        if not batch:
+            break
+        send(batch)
+    return len(members)
+
+
+def child(mode: str, total: int):
+    # 先导入依赖，基线不计入模块本身的内存
+    import sinks
+    import member_records
+    baseline = peak_rss_mb()
+    count = {"raw": run_raw, "compact": run_compact}[mode](total)
+    print(json.dumps({"mode": mode, "members": count, "peak_mb": peak_rss_mb() - baseline}))
+
+
+def measure(mode: str, total: int) -> dict:
+    output = subprocess.check_output([sys.executable, __file__, "--child", mode, str(total)])
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="群成员内存占用压测")
+    parser.add_argument("--members", type=int, nargs="+", default=[10000, 50000, 100000])
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "MEMBERS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child[0], int(args.child[1]))
+        return
+
+    print(f"{'成员数':>8} {'raw(MB)':>9} {'compact(MB)':>12} {'raw/1万':>9} {'compact/1万':>12} {'节省':>6}")
+    for total in args.members:
+        raw = measure("raw", total)["peak_mb"]
+        compact = measure("compact", total)["peak_mb"]
+        per_10k = 10000 / total
+        saving = 1 - compact / raw if raw else 0
+        print(f"{total:>8} {raw:>9.1f} {compact:>12.1f} {raw * per_10k:>9.2f} {compact * per_10k:>12.2f} {saving:>6.0%}")
+
+
+if __name__ == "__main__":
+    main()
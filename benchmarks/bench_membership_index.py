@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+成员反向索引压测
+构建 N 个群、每群 M 人（成员在群之间部分重叠）的索引，统计构建耗时、索引文件大小、
+新进程加载耗时，以及 成员 → 群、群 → 成员 两种查询的延迟分位数
+
+用法:
+    python benchmarks/bench_membership_index.py --chats 500 --members 2000 --population 200000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return {f"p{p}": round(samples[min(int(len(samples) * p / 100), len(samples) - 1)] * 1000, 3)
+            for p in (50, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="成员反向索引压测")
+    parser.add_argument("--chats", type=int, default=500)
+    parser.add_argument("--members", type=int, default=2000, help="每个群的人数")
+    parser.add_argument("--population", type=int, default=200000, help="成员总数")
+    parser.add_argument("--lookups", type=int, default=5000)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+    from membership_index import MembershipIndex
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "membership.db")
+        index = MembershipIndex(path)
+        start = time.perf_counter()
+        for chat in range(args.chats):
+            members = [f"ou_{rng.randrange(args.population):032x}" for _ in range(args.members)]
+            index.update_chat(f"oc_{chat}", members, f"群 {chat}")
+        build_seconds = time.perf_counter() - start
+        size_mb = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)) / 1e6
+
+        # 其他 worker 启动时从文件加载
+        start = time.perf_counter()
+        loaded = MembershipIndex(path)
+        load_seconds = time.perf_counter() - start
+
+        member_ids = list(loaded._member_index)
+        member_latency, chat_latency = [], []
+        for _ in range(args.lookups):
+            member_id = rng.choice(member_ids)
+            start = time.perf_counter()
+            loaded.chats_of(member_id)
+            member_latency.append(time.perf_counter() - start)
+
+            chat_id = f"oc_{rng.randrange(args.chats)}"
+            start = time.perf_counter()
+            loaded.members_of(chat_id, 0, 1000)
+            chat_latency.append(time.perf_counter() - start)
+
+        stats = loaded.stats()
+        print(f"{stats['chats']} 个群，{stats['members']} 个成员，{stats['memberships']} 条成员关系")
+        print(f"构建 {build_seconds:.1f}s，文件 {size_mb:.1f} MB，新进程加载 {load_seconds:.2f}s")
+        print(f"成员 → 群 延迟(ms): {percentiles(member_latency)}")
+        print(f"群 → 成员 延迟(ms，每页 1000): {percentiles(chat_latency)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+写入队列批次压测
+多个小群同步到同一张表：对比每个群各自写入（/sync 默认路径）与经过 outbox 攒批写入的 batch_create 调用次数
+
+用法:
+    python benchmarks/bench_outbox.py --chats 200 --members 12
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TARGET_FIELDS = {
+    "member": {"field_name": "人员", "type": 11},
+    "chat_name": {"field_name": "群名称", "type": 1},
+    "tenant": {"field_name": "租户ID", "type": 1}
+}
+
+
+class FakeAPI:
+    """只实现同步用到的接口，统计写入调用次数"""
+
+    app_id = "cli_bench"
+
+    def __init__(self, members: int):
+        self.members = members
+        self.write_calls = 0
+        self.records = 0
+
+    def get_chat_info(self, chat_id):
+        return {"name": f"群 {chat_id}"}
+
+    def iter_chat_members(self, chat_id):
+        yield [{"member_id": f"ou_{chat_id}_{i}", "tenant_key": "tenant"} for i in range(self.members)]
+
+    def add_bitable_records(self, app_token, table_id, records, on_written=None):
+        records = list(records)
+        self.write_calls += 1
+        self.records += len(records)
+        if on_written is not None:
+            on_written(records)
+        return True
+
+
+def run_direct(chats: int, members: int) -> FakeAPI:
+    from sinks import BitableSink, run_member_pipeline
+    api = FakeAPI(members)
+    for i in range(chats):
+        run_member_pipeline(api, [f"oc_{i}"], BitableSink(api, "app", "tbl", TARGET_FIELDS))
+    return api
+
+
+def run_outbox(chats: int, members: int, path: str) -> FakeAPI:
+    from coordination import CoordinationDB
+    from outbox import Outbox, OutboxSink, OutboxWriter
+    from sinks import run_member_pipeline
+    api = FakeAPI(members)
+    outbox = Outbox(CoordinationDB(path))
+    writer = OutboxWriter(outbox)
+    writer.register(api)
+    for i in range(chats):
+        run_member_pipeline(api, [f"oc_{i}"], OutboxSink(outbox, api.app_id, "app", "tbl", TARGET_FIELDS))
+        # 同步过程中写入线程只写出满批
+        while writer.write_once():
+            pass
+    # 扫描结束后排队超时，写出最后不满一批的记录
+    writer.drain()
+    return api
+
+
+def main():
+    parser = argparse.ArgumentParser(description="写入队列批次压测")
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--members", type=int, default=12)
+    args = parser.parse_args()
+
+    import logging
+    logging.disable(logging.INFO)
+
+    start = time.perf_counter()
+    direct = run_direct(args.chats, args.members)
+    direct_seconds = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        queued = run_outbox(args.chats, args.members, os.path.join(directory, "outbox.db"))
+        outbox_seconds = time.perf_counter() - start
+
+    print(f"{args.chats} 个群 × {args.members} 人，共 {direct.records} 条记录")
+    print(f"{'路径':<8} {'写入调用':>8} {'平均每批':>8} {'本地耗时(s)':>12}")
+    for name, api, seconds in (("direct", direct, direct_seconds), ("outbox", queued, outbox_seconds)):
+        print(f"{name:<8} {api.write_calls:>8} {api.records / api.write_calls:>8.0f} {seconds:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
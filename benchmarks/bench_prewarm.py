@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动预热压测
+启动模拟飞书服务，分别在关闭预热（PREWARM_ENABLED=0）和开启预热（等待 /ready）时启动 API 服务，
+依次调用 N 次 /sync/immediate，比较第 1 次、第 2..N 次中位数和第 N 次同步的耗时
+
+用法:
+    python benchmarks/bench_prewarm.py --syncs 100 --members 50 --latency-ms 50
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+from bench_workers import BITABLE_URL, start_api_server, start_mock
+
+
+def wait_ready(server_url: str, timeout: float = 60) -> float:
+    """等待 /ready 返回 200，返回等待时间"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if requests.get(f"{server_url}/ready", timeout=1).status_code == 200:
+            return time.perf_counter() - start
+        time.sleep(0.05)
+    raise RuntimeError(f"服务未就绪: {server_url}")
+
+
+def run(base_url: str, workdir: str, syncs: int, prewarm: bool) -> dict:
+    extra_env = {"PREWARM_ENABLED": "1" if prewarm else "0", "PREWARM_BITABLE_URLS": BITABLE_URL}
+    server, server_url = start_api_server(1, base_url, workdir, extra_env)
+    try:
+        ready_seconds = wait_ready(server_url)
+        session = requests.Session()
+        latencies = []
+        for i in range(syncs):
+            start = time.perf_counter()
+            response = session.post(
+                f"{server_url}/sync/immediate",
+                json={"bitable_url": BITABLE_URL, "chat_id": f"oc_{'warm' if prewarm else 'cold'}_{i:06d}"},
+                timeout=600
+            )
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "ready": ready_seconds,
+        "first": latencies[0],
+        "median": statistics.median(latencies[1:]) if syncs > 1 else latencies[0],
+        "last": latencies[-1]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="启动预热压测")
+    parser.add_argument("--syncs", type=int, default=100, help="每轮依次调用的同步次数")
+    parser.add_argument("--members", type=int, default=50, help="每个群的成员数")
+    parser.add_argument("--latency-ms", type=float, default=50, help="模拟飞书接口延迟")
+    args = parser.parse_args()
+
+    mock, base_url = start_mock(args.members, args.latency_ms)
+    workdir = tempfile.mkdtemp(prefix="bench_prewarm_")
+    print(f"每群 {args.members} 人，依次同步 {args.syncs} 次，模拟延迟 {args.latency_ms} ms")
+    print(f"{'预热':<6} {'就绪(s)':>8} {'第1次(s)':>9} {'中位数(s)':>10} {f'第{args.syncs}次(s)':>10}")
+    try:
+        for prewarm in (False, True):
+            result = run(base_url, workdir, args.syncs, prewarm)
+            print(f"{'开启' if prewarm else '关闭':<6} {result['ready']:>8.2f} {result['first']:>9.3f} "
+                  f"{result['median']:>10.3f} {result['last']:>10.3f}")
+    finally:
+        mock.terminate()
+        mock.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+回放录制的飞书流量压测
+输出磁带中各接口的请求数、耗时分位数和分页大小，然后用当前代码离线回放同一次同步（不访问网络），
+对比录制时与回放时的总耗时。先在线上（或模拟服务）录制：
+
+    echo oc_xxx | python feishu_group_members.py <多维表格URL> --record slow_sync.jsonl.gz
+    python benchmarks/bench_replay.py slow_sync.jsonl.gz <多维表格URL> [--speed 0.5] [-- --union]
+
+群ID从磁带中的请求路径读取；-- 之后的参数原样传给命令行（如 --union、--shards 4）
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="回放录制的飞书流量压测")
+    parser.add_argument("cassette", help="磁带文件（--record 录制）")
+    parser.add_argument("bitable_url", help="录制时使用的多维表格URL")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放耗时倍数（0 不等待，只测本地开销）")
+    parser.add_argument("cli_args", nargs="*", help="传给命令行的其他参数（写在 -- 之后）")
+    args = parser.parse_args()
+
+    import cassette
+    import feishu_group_members
+
+    _, entries = cassette.load_cassette(args.cassette)
+    print(f"{'接口':<72} {'请求':>5} {'p50(ms)':>8} {'p95(ms)':>8} {'合计(s)':>8} {'平均条目':>8}")
+    for row in cassette.summarize(entries):
+        avg_items = "" if row["avg_items"] is None else row["avg_items"]
+        print(f"{row['endpoint']:<72} {row['requests']:>5} {row['p50_ms']:>8} {row['p95_ms']:>8} "
+              f"{row['total_seconds']:>8} {avg_items:>8}")
+    recorded = max((entry["at"] + entry["t"] for entry in entries), default=0)
+
+    # 按录制时的顺序输入群ID
+    chat_ids = []
+    for entry in entries:
+        parts = entry["p"].split("/")
+        if "chats" in parts and parts.index("chats") + 1 < len(parts):
+            chat_id = parts[parts.index("chats") + 1]
+            if chat_id not in chat_ids:
+                chat_ids.append(chat_id)
+    sys.stdin = io.StringIO(",".join(chat_ids) + "\n")
+
+    # 指向不存在的地址，确保回放期间不访问网络
+    os.environ["FEISHU_BASE_URL"] = "http://127.0.0.1:9/open-apis"
+    start = time.perf_counter()
+    feishu_group_members.main([args.bitable_url, "--replay", args.cassette, "--replay-speed", str(args.speed),
+                               *args.cli_args])
+    replayed = time.perf_counter() - start
+
+    stats = cassette.get_replay(args.cassette).stats()
+    # 命令行读取群ID的提示没有换行
+    print()
+    print(f"录制耗时 {recorded:.2f}s，回放耗时 {replayed:.2f}s（耗时倍数 {args.speed}）")
+    print(f"回放请求 {stats['served']}，重复使用 {stats['repeated']}，磁带中没有 {stats['missing']}，"
+          f"未使用 {stats['unused']}")
+
+
+if __name__ == "__main__":
+    main()
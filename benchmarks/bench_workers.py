@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多 worker 吞吐压测
+启动模拟飞书服务，分别以不同 worker 数启动 API 服务，并发调用 /sync/immediate，
+比较每秒完成的同步数和延迟
+
+用法:
+    python benchmarks/bench_workers.py --workers 1 2 4 --syncs 200 --concurrency 64
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import statistics
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+BITABLE_URL = "https://mock.feishu.cn/base/app_mock?table=tbl_mock"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(url: str, timeout: float = 30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code < 500:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"服务未就绪: {url}")
+
+
+def start_mock(members: int, latency_ms: float) -> (subprocess.Popen, str):
+    """启动模拟飞书服务（4 个 worker，避免模拟服务自身成为瓶颈）"""
+    port = free_port()
+    env = dict(os.environ, MOCK_MEMBERS=str(members), MOCK_LATENCY_MS=str(latency_ms))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "mock_feishu_server:app", "--app-dir", BENCH_DIR,
+         "--port", str(port), "--workers", "4", "--log-level", "warning"],
+        env=env
+    )
+    base_url = f"http://127.0.0.1:{port}/open-apis"
+    wait_ready(f"{base_url}/im/v1/chats")
+    return process, base_url
+
+
+def start_api_server(workers: int, base_url: str, workdir: str, extra_env: dict = None) -> (subprocess.Popen, str):
+    """以指定 worker 数启动 API 服务"""
+    port = free_port()
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        WEB_CONCURRENCY=str(workers),
+        FEISHU_BASE_URL=base_url,
+        FEISHU_APP_ID="cli_mock",
+        FEISHU_APP_SECRET="mock_secret",
+        FEISHU_GLOBAL_RATE_LIMIT="0",
+        COORDINATION_DB=os.path.join(workdir, f"coordination_{workers}.db"),
+        **(extra_env or {})
+    )
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "api_server.py")],
+        env=env, cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    server_url = f"http://127.0.0.1:{port}"
+    wait_ready(f"{server_url}/health")
+    return process, server_url
+
+
+def run_load(server_url: str, syncs: int, concurrency: int, tag: str) -> dict:
+    """并发发起同步请求，返回吞吐和延迟统计"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+    session.mount("http://", adapter)
+
+    def one(i):
+        start = time.perf_counter()
+        response = session.post(
+            f"{server_url}/sync/immediate",
+            json={"bitable_url": BITABLE_URL, "chat_id": f"oc_{tag}_{i:06d}"},
+            timeout=600
+        )
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(syncs)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, status in results if status != 200)
+    return {
+        "elapsed": elapsed,
+        "throughput": syncs / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "errors": errors
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多 worker 吞吐压测")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--syncs", type=int, default=200, help="每轮同步请求数")
+    parser.add_argument("--concurrency", type=int, default=64, help="并发客户端数")
+    parser.add_argument("--members", type=int, default=2000, help="每个群的成员数")
+    parser.add_argument("--latency-ms", type=float, default=20, help="模拟飞书接口延迟")
+    args = parser.parse_args()
+
+    mock, base_url = start_mock(args.members, args.latency_ms)
+    workdir = tempfile.mkdtemp(prefix="bench_workers_")
+    print(f"每群 {args.members} 人，{args.syncs} 次同步，并发 {args.concurrency}，模拟延迟 {args.latency_ms} ms")
+    print(f"{'workers':>8} {'耗时(s)':>9} {'同步/秒':>9} {'p50(s)':>8} {'p95(s)':>8} {'失败':>5}")
+    try:
+        for workers in args.workers:
+            server, server_url = start_api_server(workers, base_url, workdir)
+            try:
+                result = run_load(server_url, args.syncs, args.concurrency, f"w{workers}")
+            finally:
+                server.terminate()
+                server.wait()
+            print(f"{workers:>8} {result['elapsed']:>9.1f} {result['throughput']:>9.2f} "
+                  f"{result['p50']:>8.2f} {result['p95']:>8.2f} {result['errors']:>5}")
+    finally:
+        mock.terminate()
+        mock.wait()
+
+
+if __name__ == "__main__":
+    main()
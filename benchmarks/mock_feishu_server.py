@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模拟飞书开放平台
+实现同步用到的 auth、im、bitable 接口，按配置的延迟返回，用于本地压测
+
+用法:
+    MOCK_MEMBERS=2000 MOCK_LATENCY_MS=30 uvicorn mock_feishu_server:app --app-dir benchmarks --port 9000
+    FEISHU_BASE_URL=http://127.0.0.1:9000/open-apis python api_server.py
+
+HTTP/2（h2c）压测需要在 benchmarks 目录下用 hypercorn 启动：
+    hypercorn mock_feishu_server:app --bind 127.0.0.1:9000
+"""
+
+import os
+import time
+import asyncio
+import itertools
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# 每个群的成员数
+MOCK_MEMBERS = int(os.getenv("MOCK_MEMBERS", 500))
+# 每个请求的模拟延迟（毫秒）
+MOCK_LATENCY_MS = float(os.getenv("MOCK_LATENCY_MS", 30))
+# 每个群成员中跨租户成员的比例（每 N 个成员一个外部成员）
+MOCK_EXTERNAL_EVERY = int(os.getenv("MOCK_EXTERNAL_EVERY", 0))
+# 每 N 个成员一个写入人员字段时被拒绝的成员ID（ou_bad 开头，batch_create 返回 1254066）
+MOCK_BAD_EVERY = int(os.getenv("MOCK_BAD_EVERY", 0))
+# batch_create 每秒最多处理的请求数，超过返回 429，0 表示不限制
+MOCK_WRITE_RATE = float(os.getenv("MOCK_WRITE_RATE", 0))
+# batch_create 每条记录额外的处理延迟（毫秒）
+MOCK_LATENCY_PER_RECORD_MS = float(os.getenv("MOCK_LATENCY_PER_RECORD_MS", 0))
+
+app = FastAPI(title="Mock Feishu Open API")
+
+_record_ids = itertools.count(1)
+# 已写入的记录：(app_token, table_id) -> {record_id: fields}
+_tables = {}
+# 新建的数据表：(app_token, table_id) -> 表名
+_table_names = {}
+
+FIELDS = [
+    {"field_id": "fld_member", "field_name": "人员", "type": 11},
+    {"field_id": "fld_chat", "field_name": "群名称", "type": 1},
+    {"field_id": "fld_tenant", "field_name": "租户ID", "type": 1},
+]
+
+
+# 客户端连接（地址, 端口）及其 HTTP 版本，用于统计压测中建立的连接数
+_connections = {}
+
+
+@app.middleware("http")
+async def _track_connection(request: Request, call_next):
+    if request.client and not request.url.path.startswith("/_mock"):
+        _connections[(request.client.host, request.client.port)] = request.scope.get("http_version")
+    return await call_next(request)
+
+
+@app.get("/_mock/connections")
+async def connections():
+    versions = {}
+    for version in _connections.values():
+        versions[version] = versions.get(version, 0) + 1
+    return {"connections": len(_connections), "http_versions": versions}
+
+
+@app.post("/_mock/reset")
+async def reset():
+    _connections.clear()
+    return {"ok": True}
+
+
+# batch_create 限流令牌桶：[可用令牌, 上次更新时间]
+_write_bucket = [MOCK_WRITE_RATE, time.monotonic()]
+
+
+def _write_throttled() -> bool:
+    if not MOCK_WRITE_RATE:
+        return False
+    now = time.monotonic()
+    _write_bucket[0] = min(MOCK_WRITE_RATE, _write_bucket[0] + (now - _write_bucket[1]) * MOCK_WRITE_RATE)
+    _write_bucket[1] = now
+    if _write_bucket[0] < 1:
+        return True
+    _write_bucket[0] -= 1
+    return False
+
+
+async def _latency():
+    if MOCK_LATENCY_MS:
+        await asyncio.sleep(MOCK_LATENCY_MS / 1000)
+
+
+def _ok(data=None):
+    return {"code": 0, "msg": "success", "data": data or {}}
+
+
+@app.post("/open-apis/auth/v3/tenant_access_token/internal/")
+async def tenant_access_token():
+    await _latency()
+    return {"code": 0, "msg": "ok", "tenant_access_token": "t-mock-token", "expire": 7200}
+
+
+@app.get("/open-apis/im/v1/chats")
+async def list_chats(page_size: int = 20):
+    await _latency()
+    items = [{"chat_id": f"oc_mock_{i}", "name": f"模拟群{i}"} for i in range(page_size)]
+    return _ok({"items": items, "has_more": False})
+
+
+@app.get("/open-apis/im/v1/chats/{chat_id}")
+async def chat_info(chat_id: str):
+    await _latency()
+    return _ok({"name": f"模拟群 {chat_id}", "tenant_key": "mock_tenant"})
+
+
+@app.get("/open-apis/im/v1/chats/{chat_id}/members")
+async def chat_members(chat_id: str, page_size: int = 100, page_token: str = None):
+    await _latency()
+    start = int(page_token or 0)
+    end = min(start + page_size, MOCK_MEMBERS)
+    items = []
+    for i in range(start, end):
+        external = MOCK_EXTERNAL_EVERY and i % MOCK_EXTERNAL_EVERY == 0
+        bad = MOCK_BAD_EVERY and i % MOCK_BAD_EVERY == 0
+        items.append({
+            "member_id": f"ou_{'bad' if bad else ''}{chat_id[-6:]}{i:08d}",
+            "member_id_type": "open_id",
+            "name": f"成员{i}",
+            "tenant_key": "external_tenant" if external else "mock_tenant"
+        })
+    data = {"items": items, "has_more": end < MOCK_MEMBERS, "member_total": MOCK_MEMBERS}
+    if end < MOCK_MEMBERS:
+        data["page_token"] = str(end)
+    return _ok(data)
+
+
+@app.get("/open-apis/bitable/v1/apps/{app_token}/tables")
+async def list_tables(app_token: str):
+    await _latency()
+    items = [{"table_id": table_id, "name": name} for (token, table_id), name in _table_names.items() if token == app_token]
+    return _ok({"items": items, "has_more": False, "total": len(items)})
+
+
+@app.post("/open-apis/bitable/v1/apps/{app_token}/tables")
+async def create_table(app_token: str, request: Request):
+    await _latency()
+    body = await request.json()
+    table_id = f"tbl{next(_record_ids):010d}"
+    _table_names[(app_token, table_id)] = body.get("table", {}).get("name", table_id)
+    return _ok({"table_id": table_id, "default_view_id": "vew_mock", "field_id_list": []})
+
+
+@app.get("/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/fields")
+async def bitable_fields(app_token: str, table_id: str):
+    await _latency()
+    return _ok({"items": FIELDS, "has_more": False, "total": len(FIELDS)})
+
+
+@app.get("/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records")
+async def list_records(app_token: str, table_id: str, page_size: int = 500, page_token: str = None):
+    await _latency()
+    records = list(_tables.get((app_token, table_id), {}).items())
+    start = int(page_token or 0)
+    end = min(start + page_size, len(records))
+    items = [{"record_id": record_id, "fields": fields} for record_id, fields in records[start:end]]
+    data = {"items": items, "has_more": end < len(records), "total": len(records)}
+    if end < len(records):
+        data["page_token"] = str(end)
+    return _ok(data)
+
+
+@app.post("/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records/batch_create")
+async def batch_create(app_token: str, table_id: str, request: Request):
+    if _write_throttled():
+        return JSONResponse({"code": 99991400, "msg": "request trigger frequency limit"}, status_code=429)
+    await _latency()
+    body = await request.json()
+    records = body.get("records", [])
+    if MOCK_LATENCY_PER_RECORD_MS:
+        await asyncio.sleep(len(records) * MOCK_LATENCY_PER_RECORD_MS / 1000)
+    if len(records) > 500:
+        return {"code": 1254104, "msg": "records count exceeds limit"}
+    for record in records:
+        member = record.get("fields", {}).get("人员")
+        if isinstance(member, list) and any(m.get("id", "").startswith("ou_bad") for m in member):
+            return {"code": 1254066, "msg": "UserFieldConvFail"}
+    table = _tables.setdefault((app_token, table_id), {})
+    created = []
+    for record in records:
+        record_id = f"rec{next(_record_ids):010d}"
+        table[record_id] = record.get("fields", {})
+        created.append({"record_id": record_id, "fields": record.get("fields", {})})
+    return _ok({"records": created})
+
+
+@app.post("/open-apis/bitable/v1/apps/{app_token}/tables/{table_id}/records/batch_delete")
+async def batch_delete(app_token: str, table_id: str, request: Request):
+    await _latency()
+    body = await request.json()
+    table = _tables.get((app_token, table_id), {})
+    deleted = []
+    for record_id in body.get("records", []):
+        deleted.append({"record_id": record_id, "deleted": table.pop(record_id, None) is not None})
+    return _ok({"records": deleted})
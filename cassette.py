@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+飞书接口流量录制与回放
+录制：FeishuAPI 的每个请求/响应及耗时写入 gzip 压缩的 JSONL 磁带文件（cassette）。
+token、app_secret 直接替换为 <redacted>，成员ID、姓名、租户、群名称和多维表格记录内容替换为
+等长的化名（同一磁带内同一个值的化名相同，分页、写入、去重之间的关联不变）。
+回放：按 (方法, 路径, 查询参数) 依次返回录制的响应，按录制耗时（可缩放）等待，不访问网络，
+用于离线重现线上慢同步并对比优化前后的耗时
+"""
+
+import os
+import gzip
+import time
+import atexit
+import hashlib
+import logging
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+import fastjson
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_VERSION = 1
+
+# 环境变量：录制到的文件、回放的文件、回放耗时倍数（0 表示不等待）
+RECORD_PATH = os.getenv("FEISHU_RECORD")
+REPLAY_PATH = os.getenv("FEISHU_REPLAY")
+REPLAY_SPEED = float(os.getenv("FEISHU_REPLAY_SPEED", 1.0))
+
+REDACTED = "<redacted>"
+# 直接替换的凭证
+SECRET_KEYS = {"app_secret", "tenant_access_token", "app_access_token", "user_access_token"}
+# 替换为化名的个人信息
+PII_KEYS = {"member_id", "open_id", "union_id", "user_id", "tenant_key", "id", "en_name", "email", "mobile",
+            "avatar", "owner_id", "description"}
+# 群聊接口中的名称（群名称、成员姓名）也是个人信息；多维表格中的表名保留，分片模式按表名查找分片表
+IM_PII_KEYS = PII_KEYS | {"name"}
+# 每次请求随机生成、不参与回放匹配的查询参数（写入的幂等 token）
+VOLATILE_PARAMS = {"client_token"}
+# 化名保留的 ID 前缀
+ID_PREFIXES = ("ou_", "on_", "oc_", "om_", "cli_")
+
+
+def configure(record: Optional[str] = None, replay: Optional[str] = None, speed: Optional[float] = None):
+    """设置录制或回放（命令行参数使用，优先于环境变量）"""
+    global RECORD_PATH, REPLAY_PATH, REPLAY_SPEED
+    if record:
+        RECORD_PATH = record
+    if replay:
+        REPLAY_PATH = replay
+    if speed is not None:
+        REPLAY_SPEED = speed
+
+
+def request_key(method: str, url: str, params: Optional[Dict] = None) -> Tuple[str, str, str]:
+    """请求的匹配键：(方法, /open-apis 起的路径, 排序后的查询参数，不含 client_token)"""
+    parts = urlsplit(url)
+    path = parts.path
+    index = path.find("/open-apis")
+    if index >= 0:
+        path = path[index:]
+    query = parse_qsl(parts.query) + [(str(k), str(v)) for k, v in (params or {}).items() if v is not None]
+    query = [(k, v) for k, v in query if k not in VOLATILE_PARAMS]
+    return method.upper(), path, "&".join(f"{k}={v}" for k, v in sorted(query))
+
+
+class Redactor:
+    """凭证替换与一致的等长化名"""
+
+    def __init__(self):
+        # 每个磁带随机的密钥，化名无法反推原值
+        self._salt = os.urandom(16)
+        self._aliases: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def alias(self, value: str) -> str:
+        with self._lock:
+            alias = self._aliases.get(value)
+            if alias is None:
+                prefix = next((p for p in ID_PREFIXES if value.startswith(p)), "")
+                digest = hashlib.blake2b(value.encode("utf-8"), key=self._salt, digest_size=32).hexdigest()
+                length = max(len(value) - len(prefix), 1)
+                alias = prefix + (digest * (length // len(digest) + 1))[:length]
+                self._aliases[value] = alias
+            return alias
+
+    def redact(self, value, pii_keys=PII_KEYS, in_fields: bool = False):
+        """递归替换 JSON 中的凭证和个人信息（记录的 fields 中所有字符串都视为个人信息）"""
+        if isinstance(value, dict):
+            result = {}
+            for key, item in value.items():
+                if key in SECRET_KEYS and isinstance(item, str):
+                    result[key] = REDACTED
+                elif isinstance(item, str) and (in_fields or key in pii_keys):
+                    result[key] = self.alias(item)
+                else:
+                    result[key] = self.redact(item, pii_keys, in_fields or key == "fields")
+            return result
+        if isinstance(value, list):
+            return [self.redact(item, pii_keys, in_fields) for item in value]
+        if isinstance(value, str) and in_fields:
+            return self.alias(value)
+        return value
+
+
+class CassetteWriter:
+    """磁带文件写入（线程安全，逐条追加，进程退出时关闭）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.redactor = Redactor()
+        self.count = 0
+        self._lock = threading.Lock()
+        self._start = time.time()
+        self._file = gzip.open(path, "wb")
+        self._write({"version": CASSETTE_VERSION, "created": self._start})
+        atexit.register(self.close)
+
+    def _write(self, entry: Dict):
+        self._file.write(fastjson.dumps(entry) + b"\n")
+
+    @staticmethod
+    def _parse(body):
+        if body is None:
+            return None
+        try:
+            return fastjson.loads(body)
+        except Exception:
+            return None
+
+    def record(self, method: str, url: str, kwargs: Dict, status: int, content: bytes,
+               started: float, seconds: float):
+        _, path, _ = key = request_key(method, url, kwargs.get("params"))
+        pii_keys = IM_PII_KEYS if "/im/" in path else PII_KEYS
+        body = kwargs.get("data")
+        if body is None and kwargs.get("json") is not None:
+            body = fastjson.dumps(kwargs["json"])
+        entry = {
+            "m": key[0],
+            "p": key[1],
+            "q": key[2],
+            "b": self.redactor.redact(self._parse(body), pii_keys),
+            "s": status,
+            "r": self.redactor.redact(self._parse(content), pii_keys),
+            "at": round(started - self._start, 4),
+            "t": round(seconds, 4)
+        }
+        with self._lock:
+            if self._file.closed:
+                return
+            self._write(entry)
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+                logger.info(f"流量录制完成: {self.count} 个请求 -> {self.path}")
+
+
+# 同一进程中所有客户端录制到同一个磁带
+_writers: Dict[str, CassetteWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(path: str) -> CassetteWriter:
+    with _writers_lock:
+        if path not in _writers:
+            _writers[path] = CassetteWriter(path)
+        return _writers[path]
+
+
+class RecordingSession:
+    """包装 HTTP 会话（requests.Session 或 Http2Session），录制每个请求"""
+
+    def __init__(self, session, writer: CassetteWriter):
+        self._session = session
+        self.writer = writer
+
+    def request(self, method: str, url: str, **kwargs):
+        started = time.time()
+        start = time.perf_counter()
+        response = self._session.request(method, url, **kwargs)
+        self.writer.record(method, url, kwargs, response.status_code, response.content,
+                           started, time.perf_counter() - start)
+        return response
+
+    def __getattr__(self, name):
+        # mount()、close() 等交给被包装的会话
+        return getattr(self._session, name)
+
+
+def load_cassette(path: str) -> Tuple[Dict, List[Dict]]:
+    """读取磁带文件，返回 (文件头, 请求列表)；录制进程异常退出导致的截断部分忽略"""
+    header, entries = {}, []
+    with gzip.open(path, "rb") as f:
+        try:
+            for line in f:
+                entry = fastjson.loads(line)
+                if "version" in entry:
+                    header = entry
+                else:
+                    entries.append(entry)
+        except (EOFError, OSError, ValueError):
+            logger.warning(f"磁带文件不完整，已读取 {len(entries)} 个请求: {path}")
+    return header, entries
+
+
+class ReplaySession:
+    """回放磁带的 HTTP 会话，接口与 requests.Session.request 一致，不访问网络
+
+    相同 (方法, 路径, 查询参数) 的请求按录制顺序依次返回；录制的次数用完后重复返回最后一次
+    （例如优化后写入批次数变化）。磁带中没有的请求返回 404。speed 为耗时倍数，0 表示不等待。
+    """
+
+    def __init__(self, path: str, speed: float = 1.0):
+        self.path = path
+        self.speed = speed
+        self.header, entries = load_cassette(path)
+        self._queues: Dict[Tuple[str, str, str], deque] = {}
+        self._last: Dict[Tuple[str, str, str], Dict] = {}
+        for entry in entries:
+            self._queues.setdefault((entry["m"], entry["p"], entry["q"]), deque()).append(entry)
+        self._lock = threading.Lock()
+        self.served = 0
+        self.repeated = 0
+        self.missing = 0
+        logger.info(f"回放流量: {len(entries)} 个请求 <- {path}（耗时倍数 {speed}）")
+
+    def _next(self, key) -> Optional[Dict]:
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue:
+                entry = queue.popleft()
+                self._last[key] = entry
+                self.served += 1
+                return entry
+            entry = self._last.get(key)
+            if entry is not None:
+                self.repeated += 1
+            else:
+                self.missing += 1
+            return entry
+
+    def request(self, method: str, url: str, **kwargs):
+        import requests
+
+        entry = self._next(request_key(method, url, kwargs.get("params")))
+        response = requests.Response()
+        response.url = url
+        response.headers["Content-Type"] = "application/json; charset=utf-8"
+        if entry is None:
+            logger.warning(f"磁带中没有该请求: {method} {url}")
+            response.status_code = 404
+            response._content = fastjson.dumps({"code": 404, "msg": "not recorded"})
+            return response
+        if self.speed and entry["t"]:
+            time.sleep(entry["t"] * self.speed)
+        response.status_code = entry["s"]
+        response._content = fastjson.dumps(entry["r"]) if entry["r"] is not None else b""
+        return response
+
+    def mount(self, prefix, adapter):
+        # 剖析挂载的计时适配器在回放时不生效
+        pass
+
+    def close(self):
+        pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "served": self.served,
+                "repeated": self.repeated,
+                "missing": self.missing,
+                "unused": sum(len(queue) for queue in self._queues.values())
+            }
+
+
+# 同一进程中所有客户端共用回放队列（与录制时共用一个磁带对应）
+_replays: Dict[str, ReplaySession] = {}
+
+
+def get_replay(path: str, speed: float = 1.0) -> ReplaySession:
+    with _writers_lock:
+        if path not in _replays:
+            _replays[path] = ReplaySession(path, speed)
+        return _replays[path]
+
+
+def summarize(entries: List[Dict]) -> List[Dict]:
+    """按接口统计请求数、状态码、耗时分位数和响应中的条目数（分页大小）"""
+    groups: Dict[Tuple[str, str], List[Dict]] = {}
+    for entry in entries:
+        # 路径中的群ID、多维表格和数据表ID归为同一接口
+        parts = entry["p"].split("/")
+        path = "/".join(
+            "{id}" if i and parts[i - 1] in ("chats", "apps", "tables") else part
+            for i, part in enumerate(parts)
+        )
+        groups.setdefault((entry["m"], path), []).append(entry)
+
+    summary = []
+    for (method, path), group in sorted(groups.items()):
+        latencies = sorted(entry["t"] for entry in group)
+        data = [(entry["r"] or {}).get("data") for entry in group]
+        items = [len(page["items"] or []) for page in data if isinstance(page, dict) and "items" in page]
+        summary.append({
+            "endpoint": f"{method} {path}",
+            "requests": len(group),
+            "errors": sum(1 for entry in group if entry["s"] >= 400 or (entry["r"] or {}).get("code")),
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+            "p95_ms": round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)] * 1000, 1),
+            "total_seconds": round(sum(latencies), 2),
+            "avg_items": round(sum(items) / len(items), 1) if items else None
+        })
+    return summary
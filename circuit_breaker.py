@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+飞书API熔断器
+按接口族（auth、im、bitable）统计错误率，飞书接口故障时快速失败
+"""
+
+import math
+import time
+import threading
+from collections import deque
+from typing import Dict, List
+
+from config import API_CONFIG
+
+# 熔断器状态
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# 飞书接口族
+ENDPOINT_FAMILIES = ("auth", "im", "bitable")
+
+# 默认熔断参数，可通过 API_CONFIG["circuit_breaker"] 覆盖
+DEFAULT_BREAKER_CONFIG = {
+    # 触发熔断的错误率
+    "error_rate_threshold": 0.5,
+    # 统计窗口内至少多少次请求才计算错误率
+    "min_requests": 5,
+    # 错误率统计窗口（秒）
+    "window_seconds": 60,
+    # 熔断打开后多久进入半开状态（秒）
+    "open_seconds": 30,
+    # 半开状态允许的探测请求数
+    "half_open_max_calls": 1
+}
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求被直接拒绝"""
+
+    def __init__(self, family: str, retry_after: float):
+        self.family = family
+        self.retry_after = retry_after
+        super().__init__(f"飞书 {family} 接口熔断中，{math.ceil(retry_after)} 秒后重试")
+
+
+class CircuitBreaker:
+    """单个接口族的熔断器"""
+
+    def __init__(self, family: str, error_rate_threshold: float = 0.5, min_requests: int = 5,
+                 window_seconds: float = 60, open_seconds: float = 30, half_open_max_calls: int = 1):
+        self.family = family
+        self.error_rate_threshold = error_rate_threshold
+        self.min_requests = min_requests
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = STATE_CLOSED
+        self._results = deque()  # (时间戳, 是否成功)
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._open_count = 0
+
+    def _trim(self, now: float):
+        while self._results and now - self._results[0][0] > self.window_seconds:
+            self._results.popleft()
+
+    def _error_rate(self) -> float:
+        if not self._results:
+            return 0.0
+        failures = sum(1 for _, ok in self._results if not ok)
+        return failures / len(self._results)
+
+    def _open(self, now: float):
+        self._state = STATE_OPEN
+        self._opened_at = now
+        self._half_open_calls = 0
+        self._open_count += 1
+
+    def before_call(self):
+        """请求前检查熔断状态，熔断打开时抛出 CircuitOpenError"""
+        with self._lock:
+            now = time.time()
+            if self._state == STATE_OPEN:
+                remaining = self._opened_at + self.open_seconds - now
+                if remaining > 0:
+                    raise CircuitOpenError(self.family, remaining)
+                self._state = STATE_HALF_OPEN
+                self._half_open_calls = 0
+
+            if self._state == STATE_HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    raise CircuitOpenError(self.family, self.open_seconds)
+                self._half_open_calls += 1
+
+    def record_success(self):
+        """记录一次成功请求"""
+        with self._lock:
+            now = time.time()
+            if self._state == STATE_HALF_OPEN:
+                # 探测成功，恢复正常
+                self._state = STATE_CLOSED
+                self._results.clear()
+            self._results.append((now, True))
+            self._trim(now)
+
+    def record_failure(self):
+        """记录一次失败请求"""
+        with self._lock:
+            now = time.time()
+            if self._state == STATE_HALF_OPEN:
+                # 探测失败，重新打开
+                self._open(now)
+                return
+            self._results.append((now, False))
+            self._trim(now)
+            if (self._state == STATE_CLOSED and len(self._results) >= self.min_requests
+                    and self._error_rate() >= self.error_rate_threshold):
+                self._open(now)
+
+    def release(self):
+        """本次调用不计入统计（请求未发出或被限流），只释放半开状态的探测名额"""
+        with self._lock:
+            if self._state == STATE_HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == STATE_OPEN and time.time() >= self._opened_at + self.open_seconds:
+                return STATE_HALF_OPEN
+            return self._state
+
+    def snapshot(self) -> Dict:
+        """返回熔断器当前状态，用于健康检查"""
+        state = self.state
+        with self._lock:
+            self._trim(time.time())
+            snapshot = {
+                "state": state,
+                "error_rate": round(self._error_rate(), 3),
+                "requests_in_window": len(self._results),
+                "open_count": self._open_count
+            }
+            if state == STATE_OPEN:
+                snapshot["retry_after"] = round(self._opened_at + self.open_seconds - time.time(), 1)
+            return snapshot
+
+
+# 进程内共享的熔断器，同一接口族的所有客户端实例共用
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(family: str) -> CircuitBreaker:
+    """获取指定接口族的熔断器"""
+    with _breakers_lock:
+        breaker = _breakers.get(family)
+        if breaker is None:
+            config = dict(DEFAULT_BREAKER_CONFIG)
+            config.update(API_CONFIG.get("circuit_breaker", {}))
+            breaker = CircuitBreaker(family, **config)
+            _breakers[family] = breaker
+        return breaker
+
+
+def breaker_snapshot() -> Dict[str, Dict]:
+    """返回所有接口族的熔断器状态"""
+    for family in ENDPOINT_FAMILIES:
+        get_breaker(family)
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.family: breaker.snapshot() for breaker in breakers}
+
+
+def open_breakers() -> List[CircuitBreaker]:
+    """返回当前处于打开状态的熔断器"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [breaker for breaker in breakers if breaker.state == STATE_OPEN]
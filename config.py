@@ -28,8 +28,133 @@ API_CONFIG = {
     # 批量处理大小
     "batch_size": 500,
     
+    # 批量写入间隔时间（秒）
+    "write_interval": 0.2,
+    
+    # 单次请求平均耗时估算（秒），用于 --plan 预计耗时
+    "estimated_latency": 0.3,
+    
     # token提前刷新时间（秒）
-    "token_refresh_advance": 300
+    "token_refresh_advance": 300,
+    
+    # 多维表格字段信息的进程内缓存时间（秒），0 表示每次同步重新获取
+    "schema_cache_ttl": 300,
+    
+    # 分片模式并行写入的分片数
+    "shard_workers": 4,
+    
+    # 清理记录时并行删除的线程数（每个线程一次删除一批）
+    "cleanup_workers": 4,
+    
+    # 同步计划对账的进程数（需要 NumPy），对账成为瓶颈的超大表可调大
+    "diff_workers": 1,
+    
+    # API服务所有 worker 合计的飞书请求速率上限（次/秒），0 表示不限制
+    "global_rate_limit": 50,
+    
+    # API服务任务状态保留天数，过期的任务定期从 COORDINATION_DB 中删除
+    "task_retention_days": 7,
+    
+    # API服务任务调度：执行线程数、老化时间（秒）、各通道优先级与限流额度权重
+    "scheduler": {
+        "workers": 4,
+        # bulk 任务排队超过该时间后与新的 interactive 任务同级
+        "aging_seconds": 60,
+        # 没有历史数据时估算的单个任务耗时（秒）
+        "default_job_seconds": 30,
+        # 排队位置写入任务状态的最小间隔（秒），/task 查询时实时计算不受影响
+        "queue_update_interval": 1,
+        "lanes": {
+            "interactive": {"priority": 0, "weight": 4},
+            "bulk": {"priority": 1, "weight": 1}
+        }
+    },
+    
+    # 自适应写入：按延迟和限流信号调整每批记录数（上限为 batch_size）、并发写入数和批次间隔
+    "adaptive_writes": {
+        # 关闭时固定使用 batch_size、单并发、write_interval 间隔
+        "enabled": True,
+        "min_batch_size": 50,
+        "batch_step": 50,
+        "max_concurrency": 4,
+        # 单次写入延迟目标（秒），超过时减小批大小
+        "latency_target": 2.0,
+        # 单次写入请求超时时间（秒）
+        "write_timeout": 30
+    },
+    
+    # 持久化写入队列：多个群写入同一张表时攒满批次再写入，重启后继续写入未写出的记录
+    "outbox": {
+        # /sync 未指定 outbox 时是否使用写入队列
+        "enabled": False,
+        # 不满一批的记录最长排队时间（秒）
+        "max_age_seconds": 5,
+        # 写入线程检查队列的间隔（秒）
+        "poll_interval": 0.5,
+        # 取出的批次的租约时间（秒），写入进程异常退出后到期重新写入
+        "lease_seconds": 120,
+        # 单条记录最多尝试写入次数，超过后标记为 dead
+        "max_attempts": 5,
+        # dead 记录保留天数（按入队时间），之后自动删除
+        "dead_retention_days": 7
+    },
+    
+    # 同步历史：每次同步的耗时、分页、批次等写入 SYNC_HISTORY_DB，耗时超过基线时标记为变慢
+    "sync_history": {
+        "enabled": True,
+        # 基线取最近多少次成功同步的耗时中位数
+        "baseline_runs": 20,
+        # 耗时超过基线多少倍标记为变慢
+        "regression_threshold": 1.5,
+        # 历史记录保留天数
+        "retention_days": 90
+    },
+    
+    # 无效记录隔离：批量写入因个别记录无效被拒绝时二分定位，无效记录写入 QUARANTINE_DB，其余照常写入
+    "quarantine": {
+        "enabled": True,
+        # 已知无效的成员ID写入前跳过，多少天后重新尝试
+        "recheck_days": 7,
+        # 隔离记录保留天数
+        "retention_days": 30
+    },
+    
+    # HTTP/2 传输（需要 pip install "httpx[http2]"）：并发请求在少量连接上多路复用
+    "http_transport": {
+        # 关闭时使用 requests 的 HTTP/1.1 连接池；环境变量 FEISHU_HTTP2=1 也可开启
+        "http2": False,
+        # 连接数
+        "connections": 2,
+        # 每个连接同时在途的请求数
+        "streams_per_connection": 50,
+        # HTTP/1.1 时每个主机保留的连接数
+        "pool_maxsize": 32
+    },
+    
+    # API服务启动预热：获取 token、建立连接、加载多维表格字段信息，完成前 /ready 返回 503
+    "prewarm": {
+        "enabled": True,
+        # 预先建立的连接数
+        "connections": 4,
+        # 预热超时（秒），超时后不再阻塞就绪
+        "timeout": 30,
+        # 需要预热字段信息的多维表格URL（环境变量 PREWARM_BITABLE_URLS 以逗号分隔追加）
+        "bitable_urls": []
+    },
+    
+    # 熔断配置（按 auth、im、bitable 接口族分别统计）
+    "circuit_breaker": {
+        # 触发熔断的错误率
+        "error_rate_threshold": 0.5,
+        # 统计窗口内的最少请求数
+        "min_requests": 5,
+        # 错误率统计窗口（秒）
+        "window_seconds": 60,
+        # 熔断持续时间（秒），之后进入半开状态放行探测请求
+        "open_seconds": 30,
+        # 半开状态允许的探测请求数
+        "half_open_max_calls": 1
+    }
 }
 
 # 日志配置
@@ -40,6 +165,21 @@ LOG_CONFIG = {
     # 日志文件名
     "filename": "feishu_sync.log",
     
-    # 日志格式
-    "format": "%(asctime)s - %(levelname)s - %(message)s"
+    # 日志格式（控制台输出）
+    "format": "%(asctime)s - %(levelname)s - %(message)s",
+    
+    # 日志文件是否输出为 JSON（每行一条，附带 task_id/sync_id）
+    "json": True,
+    
+    # 单个日志文件最大字节数，超过后轮转
+    "max_bytes": 10 * 1024 * 1024,
+    
+    # 保留的轮转日志文件数
+    "backup_count": 5,
+    
+    # 相似警告限流：每个时间窗口（秒）内最多输出 burst 条
+    "rate_limit": {
+        "interval": 60,
+        "burst": 5
+    }
 }
\ No newline at end of file
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多进程共享协调状态
+基于本地 SQLite（WAL 模式），供多个 API 服务 worker 共享任务状态、群同步锁和全局限流额度
+"""
+
+import os
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import fastjson
+from config import API_CONFIG
+
+# 协调数据库路径，多个 worker 必须指向同一个文件
+COORDINATION_DB = os.getenv("COORDINATION_DB", "coordination.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chat_locks (
+    chat_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rate_budget (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+class ChatLockedError(Exception):
+    """群正在被其他任务同步"""
+
+    def __init__(self, chat_id: str):
+        self.chat_id = chat_id
+        super().__init__(f"群 {chat_id} 正在同步中，请稍后再试")
+
+
+class CoordinationDB:
+    """SQLite 连接管理，每个线程一个连接（WAL 模式、自动提交）
+
+    同步历史、隔离表、成员索引等本地存储也用它管理各自的数据库文件，传入各自的建表语句
+    """
+
+    def __init__(self, path: str = COORDINATION_DB, schema: str = _SCHEMA, row_factory=None):
+        self.path = path
+        self.row_factory = row_factory
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # executescript 会自行提交，不放在 transaction() 中
+        self.connection().executescript(schema)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if self.row_factory is not None:
+                conn.row_factory = self.row_factory
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """写事务，BEGIN IMMEDIATE 保证跨进程互斥"""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+class TaskStore:
+    """任务状态存储，接口与原来的 task_status 字典保持一致"""
+
+    def __init__(self, db: CoordinationDB):
+        self.db = db
+
+    def __contains__(self, task_id: str) -> bool:
+        row = self.db.connection().execute("SELECT 1 FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return row is not None
+
+    def get(self, task_id: str, default=None) -> Optional[Dict]:
+        row = self.db.connection().execute("SELECT data FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return fastjson.loads(row[0]) if row else default
+
+    def __getitem__(self, task_id: str) -> Dict:
+        task = self.get(task_id)
+        if task is None:
+            raise KeyError(task_id)
+        return task
+
+    def __setitem__(self, task_id: str, data: Dict):
+        with self.db.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO tasks (task_id, data, updated_at) VALUES (?, ?, ?)",
+                (task_id, fastjson.dumps(data).decode("utf-8"), time.time())
+            )
+
+    def patch(self, task_id: str, **fields):
+        """更新任务的部分字段"""
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT data FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            data = fastjson.loads(row[0]) if row else {}
+            data.update(fields)
+            conn.execute(
+                "INSERT OR REPLACE INTO tasks (task_id, data, updated_at) VALUES (?, ?, ?)",
+                (task_id, fastjson.dumps(data).decode("utf-8"), time.time())
+            )
+
+    def patch_many(self, updates: Dict[str, Dict], only_status: Optional[str] = None):
+        """在一个事务中更新多个任务；指定 only_status 时只更新处于该状态的任务"""
+        with self.db.transaction() as conn:
+            for task_id, fields in updates.items():
+                row = conn.execute("SELECT data FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+                data = fastjson.loads(row[0]) if row else {}
+                if only_status and data.get("status") != only_status:
+                    continue
+                data.update(fields)
+                conn.execute(
+                    "INSERT OR REPLACE INTO tasks (task_id, data, updated_at) VALUES (?, ?, ?)",
+                    (task_id, fastjson.dumps(data).decode("utf-8"), time.time())
+                )
+
+    def prune(self, max_age: float = 7 * 24 * 3600):
+        """删除超过保留期的任务"""
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM tasks WHERE updated_at < ?", (time.time() - max_age,))
+
+
+class ChatLocks:
+    """群同步锁，保证同一个群同一时间只有一个 worker 在同步"""
+
+    def __init__(self, db: CoordinationDB, ttl: float = 3600):
+        self.db = db
+        # 锁超时时间，防止进程崩溃后锁无法释放
+        self.ttl = ttl
+
+    def acquire(self, chat_id: str) -> Optional[str]:
+        """尝试加锁，成功返回锁持有者标识，已被占用返回 None"""
+        owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        now = time.time()
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT expires_at FROM chat_locks WHERE chat_id = ?", (chat_id,)).fetchone()
+            if row and row[0] > now:
+                return None
+            conn.execute(
+                "INSERT OR REPLACE INTO chat_locks (chat_id, owner, expires_at) VALUES (?, ?, ?)",
+                (chat_id, owner, now + self.ttl)
+            )
+        return owner
+
+    def release(self, chat_id: str, owner: str):
+        """释放自己持有的锁"""
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM chat_locks WHERE chat_id = ? AND owner = ?", (chat_id, owner))
+
+    @contextmanager
+    def hold(self, chat_id: str):
+        """持有群同步锁，已被占用时抛出 ChatLockedError"""
+        owner = self.acquire(chat_id)
+        if owner is None:
+            raise ChatLockedError(chat_id)
+        try:
+            yield
+        finally:
+            self.release(chat_id, owner)
+
+
+class RateBudget:
+    """跨进程共享的令牌桶，所有 worker 对飞书的请求总速率不超过 rate"""
+
+    def __init__(self, db: CoordinationDB, rate: float, burst: Optional[float] = None, name: str = "feishu"):
+        self.db = db
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.name = name
+
+    def acquire(self, tokens: float = 1.0):
+        """取得请求额度，额度不足时等待"""
+        while True:
+            now = time.time()
+            with self.db.transaction() as conn:
+                row = conn.execute("SELECT tokens, updated_at FROM rate_budget WHERE name = ?", (self.name,)).fetchone()
+                available = self.burst if row is None else min(self.burst, row[0] + (now - row[1]) * self.rate)
+                if available >= tokens:
+                    available -= tokens
+                    wait = 0.0
+                else:
+                    wait = (tokens - available) / self.rate
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_budget (name, tokens, updated_at) VALUES (?, ?, ?)",
+                    (self.name, available, now)
+                )
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+def create_rate_budget(db: CoordinationDB, rate: Optional[float] = None) -> Optional[RateBudget]:
+    """按配置创建全局限流额度，未配置速率时不限流"""
+    if rate is None:
+        rate = float(os.getenv("FEISHU_GLOBAL_RATE_LIMIT", API_CONFIG.get("global_rate_limit", 50)))
+    if not rate:
+        return None
+    return RateBudget(db, rate)
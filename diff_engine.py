@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大表对账引擎
+期望状态（群成员）和现有状态（多维表格记录）的键（如 成员ID + 群名称）和值（如租户）编码为 64 位整数哈希，
+按列存放在紧凑的 uint64 数组中。已安装 NumPy 时用排序数组运算（unique / searchsorted）
+计算新增、删除（已退群和重复记录）、更新，未安装时退回整数字典；workers > 1 时按键哈希分区，
+在进程池中并行计算。二十万行以上的表对账不再受字符串字典的 CPU 和内存限制
+"""
+
+import hashlib
+import logging
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def key_hash(*parts: str) -> int:
+    """记录键的 64 位哈希，索引只保存整数，不保存原始字符串"""
+    digest = hashlib.blake2b("\t".join(parts).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+_MASK = (1 << 64) - 1
+
+
+def value_hash(value: str) -> int:
+    """值的 64 位哈希，空值为 0（对账时不比较）；只在同一进程内比较，使用内置 hash"""
+    return ((hash(value) & _MASK) or 1) if value else 0
+
+
+def _numpy():
+    """已安装时返回 numpy 模块"""
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+
+class KeyColumns:
+    """一侧（期望或现有）记录的键、值哈希列，下标即记录的序号"""
+
+    def __init__(self):
+        self.keys = array("Q")
+        self.values = array("Q")
+
+    def append(self, key: int, value: int = 0):
+        self.keys.append(key)
+        self.values.append(value)
+
+    def add(self, key_parts: tuple, value: str = ""):
+        """按原始字符串添加一条记录
+
+        对账在同一进程内编码和比较（并行时子进程只接收整数数组），用内置的 64 位 hash 代替 key_hash，
+        编码开销约为 blake2b 的十分之一。
+        """
+        self.keys.append(hash(key_parts) & _MASK)
+        self.values.append(((hash(value) & _MASK) or 1) if value else 0)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+def _as_array(values) -> array:
+    """结果统一为 int64 数组（array('q')）"""
+    result = array("q")
+    if hasattr(values, "tobytes"):
+        result.frombytes(values.astype("int64").tobytes())
+    else:
+        result.extend(values)
+    return result
+
+
+def _reconcile_numpy(dk, dv, ek, ev):
+    """排序数组对账，返回 (新增, 删除, 更新的现有下标, 更新对应的期望下标, 未变化数)"""
+    import numpy as np
+
+    # 每个键第一次出现的位置；期望中重复的键只算一次，现有记录中重复的键只保留第一条
+    d_keys, d_first = np.unique(dk, return_index=True)
+    e_keys, e_first = np.unique(ek, return_index=True)
+    duplicate = np.ones(len(ek), dtype=bool)
+    duplicate[e_first] = False
+
+    # 现有键在期望键中的位置（二分查找），位置上的键相同即为保留
+    position = np.searchsorted(d_keys, e_keys)
+    if len(d_keys):
+        position[position == len(d_keys)] = 0
+        kept = d_keys[position] == e_keys
+    else:
+        kept = np.zeros(len(e_keys), dtype=bool)
+    matched = np.zeros(len(d_keys), dtype=bool)
+    matched[position[kept]] = True
+    delete = np.sort(np.concatenate([np.flatnonzero(duplicate), e_first[~kept]]))
+    add = np.sort(d_first[~matched])
+
+    # 保留的现有记录按下标排序，与对应的期望下标配对
+    e_index = e_first[kept]
+    d_index = d_first[position[kept]]
+    order = np.argsort(e_index)
+    e_index, d_index = e_index[order], d_index[order]
+    desired_values = dv[d_index]
+    changed = (desired_values != 0) & (desired_values != ev[e_index])
+    return add, delete, e_index[changed], d_index[changed], int(len(e_index) - changed.sum())
+
+
+def _reconcile_python(dk, dv, ek, ev):
+    """整数字典对账（未安装 NumPy 时使用），结果与 _reconcile_numpy 相同"""
+    desired: Dict[int, int] = {}
+    for i, key in enumerate(dk):
+        desired.setdefault(key, i)
+    seen = set()
+    delete: List[int] = []
+    update_existing: List[int] = []
+    update_desired: List[int] = []
+    unchanged = 0
+    for i, key in enumerate(ek):
+        j = desired.get(key)
+        if j is None or key in seen:
+            delete.append(i)
+            continue
+        seen.add(key)
+        if dv[j] and dv[j] != ev[i]:
+            update_existing.append(i)
+            update_desired.append(j)
+        else:
+            unchanged += 1
+    add = sorted(j for key, j in desired.items() if key not in seen)
+    return add, delete, update_existing, update_desired, unchanged
+
+
+def _reconcile_partition(dk, dv, ek, ev):
+    # 进程池中执行的单个分区
+    return _reconcile_numpy(dk, dv, ek, ev)
+
+
+def _reconcile_parallel(np, dk, dv, ek, ev, workers: int):
+    """按键哈希分区，各分区在进程池中独立对账后合并（同一个键只会落在一个分区）"""
+    d_part, e_part = dk % workers, ek % workers
+    selections = [(np.flatnonzero(d_part == p), np.flatnonzero(e_part == p)) for p in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_reconcile_partition, dk[d_sel], dv[d_sel], ek[e_sel], ev[e_sel])
+            for d_sel, e_sel in selections
+        ]
+        parts = [future.result() for future in futures]
+
+    add, delete, update_existing, update_desired = [], [], [], []
+    unchanged = 0
+    for (d_sel, e_sel), (p_add, p_delete, p_update_e, p_update_d, p_unchanged) in zip(selections, parts):
+        add.append(d_sel[p_add])
+        delete.append(e_sel[p_delete])
+        update_existing.append(e_sel[p_update_e])
+        update_desired.append(d_sel[p_update_d])
+        unchanged += p_unchanged
+    # 更新按现有记录下标排序，期望下标随之调整
+    update_existing, update_desired = np.concatenate(update_existing), np.concatenate(update_desired)
+    order = np.argsort(update_existing)
+    return (np.sort(np.concatenate(add)), np.sort(np.concatenate(delete)),
+            update_existing[order], update_desired[order], unchanged)
+
+
+def reconcile(desired: KeyColumns, existing: KeyColumns, workers: int = 1,
+              backend: Optional[str] = None) -> Dict:
+    """对比期望状态与现有记录
+
+    - add: 现有记录中没有的期望下标（期望中重复的键取第一次出现）
+    - delete: 需要删除的现有下标：键不在期望中（如已退群），或与前面的记录重复
+    - update / update_source: 值与期望不同的现有下标及对应的期望下标（期望值为 0 时不比较）
+    - unchanged: 保留且无需更新的记录数
+    backend 为 "numpy" 或 "python"，默认已安装 NumPy 时使用 numpy；workers > 1 时 numpy 后端在进程池中分区并行。
+    """
+    np = _numpy() if backend != "python" else None
+    if backend == "numpy" and np is None:
+        raise ImportError("对账引擎的 numpy 后端需要安装 numpy（pip install numpy）")
+
+    if np is None:
+        if workers > 1:
+            logger.info("未安装 NumPy，对账在单进程中执行")
+        result = _reconcile_python(desired.keys, desired.values, existing.keys, existing.values)
+        backend = "python"
+    else:
+        dk, dv = np.frombuffer(desired.keys, dtype=np.uint64), np.frombuffer(desired.values, dtype=np.uint64)
+        ek, ev = np.frombuffer(existing.keys, dtype=np.uint64), np.frombuffer(existing.values, dtype=np.uint64)
+        if workers > 1 and len(dk) + len(ek):
+            result = _reconcile_parallel(np, dk, dv, ek, ev, workers)
+        else:
+            result = _reconcile_numpy(dk, dv, ek, ev)
+        backend = "numpy"
+
+    add, delete, update_existing, update_desired, unchanged = result
+    return {
+        "add": _as_array(add),
+        "delete": _as_array(delete),
+        "update": _as_array(update_existing),
+        "update_source": _as_array(update_desired),
+        "unchanged": unchanged,
+        "backend": backend
+    }
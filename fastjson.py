@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON 编解码后端
+按 orjson → ujson → 标准库 json 的顺序选择已安装的实现，
+用于飞书接口的请求/响应体和 API 服务的响应；环境变量 FEISHU_JSON_BACKEND 可指定后端
+"""
+
+import os
+import json
+from typing import Any, Callable, Dict, Tuple, Union
+
+
+def _orjson() -> Tuple[Callable[[Any], bytes], Callable]:
+    import orjson
+    return orjson.dumps, orjson.loads
+
+
+def _ujson() -> Tuple[Callable[[Any], bytes], Callable]:
+    import ujson
+
+    def dumps(obj: Any) -> bytes:
+        return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False).encode("utf-8")
+
+    return dumps, ujson.loads
+
+
+def _stdlib() -> Tuple[Callable[[Any], bytes], Callable]:
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(obj: Any) -> bytes:
+        return encoder.encode(obj).encode("utf-8")
+
+    return dumps, json.loads
+
+
+BACKENDS: Dict[str, Callable] = {
+    "orjson": _orjson,
+    "ujson": _ujson,
+    "json": _stdlib
+}
+
+
+def _select_backend() -> Tuple[str, Callable[[Any], bytes], Callable]:
+    preferred = os.getenv("FEISHU_JSON_BACKEND", "").lower()
+    names = [preferred] if preferred in BACKENDS else list(BACKENDS)
+    for name in names:
+        try:
+            dumps, loads = BACKENDS[name]()
+        except ImportError:
+            continue
+        return name, dumps, loads
+    return ("json",) + _stdlib()
+
+
+# 当前使用的后端名称
+BACKEND, _dumps, _loads = _select_backend()
+
+
+def dumps(obj: Any) -> bytes:
+    """序列化为 UTF-8 JSON 字节串（紧凑格式，不转义中文）"""
+    return _dumps(obj)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """解析 JSON 字节串或字符串"""
+    return _loads(data)
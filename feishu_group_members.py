@@ -5,43 +5,155 @@
 支持自动获取群成员信息并写入到指定的多维表格中
 """
 
-import sys
+import startup_timing
+
 import os
-import requests
+import re
+import argparse
 import json
 import time
+import uuid
+import itertools
 import logging
-from typing import List, Dict, Optional
+import threading
+import contextvars
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List, Dict, Optional, Set
 from urllib.parse import urlparse, parse_qs
 from config import FEISHU_CONFIG, API_CONFIG, LOG_CONFIG
+import fastjson
+from circuit_breaker import CircuitOpenError, get_breaker
+from log_setup import log_context, setup_logging
+from sinks import SINK_TYPES, BitableSink, create_file_sink, run_member_pipeline
+
+if TYPE_CHECKING:
+    import requests
+    from member_records import MemberRecord
 
-# 配置日志
-logging.basicConfig(
-    level=getattr(logging, LOG_CONFIG["level"]),
-    format=LOG_CONFIG["format"],
-    handlers=[
-        logging.FileHandler(LOG_CONFIG["filename"], encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+# 日志在 main() 中配置，导入本模块不产生文件I/O
 logger = logging.getLogger(__name__)
 
+startup_timing.mark("模块导入")
+
 class FeishuAPI:
     """飞书API客户端"""
     
+    # 全局限流额度（多 worker 部署时由 API 服务设置为跨进程共享的令牌桶）
+    rate_limiter = None
+    
+    # 群成员反向索引（membership_index.MembershipIndex），完整获取一个群的成员后更新
+    membership_index = None
+    
+    # 进程内共享的 tenant_access_token（按应用）、HTTP 会话和多维表格字段信息，
+    # API 服务启动时预热（prewarm），之后每个任务新建的客户端直接复用
+    _shared_tokens: Dict[tuple, tuple] = {}
+    _shared_session = None
+    _schema_cache: Dict[tuple, tuple] = {}
+    _shared_lock = threading.Lock()
+    
     def __init__(self, app_id: str, app_secret: str):
         self.app_id = app_id
         self.app_secret = app_secret
-        self.base_url = API_CONFIG["base_url"]
+        # 环境变量 FEISHU_BASE_URL 可指向测试用的模拟服务
+        self.base_url = os.getenv("FEISHU_BASE_URL", API_CONFIG["base_url"])
         self.tenant_access_token = None
         self.token_expire_time = 0
+        # 请求统计：次数与累计耗时（秒）
+        self.request_count = 0
+        self.request_seconds = 0.0
+        # HTTP 会话（复用连接），首次请求时按 http_transport 配置创建（HTTP/2 或 requests 连接池）；
+        # 剖析时会挂载计时适配器
+        self.session: Optional["requests.Session"] = None
+        # 单个请求的超时时间（秒），None 表示不限制
+        self.timeout: Optional[float] = None
+        # 本次同步的请求计量（sync_history.RunMetrics），同步期间由 sync_history 挂载
+        self.metrics = None
+        # 写入时隔离的无效记录数、按已知无效成员ID跳过的记录数
+        self.quarantined_records = 0
+        self.skipped_records = 0
+    
+    def _request(self, family: str, method: str, url: str, **kwargs) -> "requests.Response":
+        """发送请求，并按接口族记录熔断器状态"""
+        # requests 导入较慢，只在真正发请求时加载
+        import requests
+        
+        if "json" in kwargs:
+            # 请求体用快速 JSON 后端序列化，不经过 requests 内置的标准库 json
+            kwargs["data"] = fastjson.dumps(kwargs.pop("json"))
+            kwargs["headers"] = {"Content-Type": "application/json; charset=utf-8", **(kwargs.get("headers") or {})}
+        
+        # 未单独设置时使用运行时可调的 request_timeout（0 表示不限制）
+        timeout = self.timeout if self.timeout is not None else API_CONFIG.get("request_timeout") or None
+        if timeout is not None:
+            kwargs.setdefault("timeout", timeout)
+        
+        breaker = get_breaker(family)
+        breaker.before_call()
+        # 无论结果如何都要告知熔断器（半开状态的探测名额在记录结果时释放）：
+        # True/False 计入错误率，None 表示请求未发出或被限流，只释放名额
+        ok = None
+        sent = False
+        try:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            start_time = time.time()
+            if self.session is None:
+                self.session = self.shared_session()
+            sent = True
+            response = self.session.request(method, url, **kwargs)
+            response.raise_for_status()
+            ok = True
+        except requests.HTTPError as e:
+            # 服务端错误计入熔断；429 由调用方（自适应写入）退避重试，不计入；其余 4xx 属于调用方问题
+            status_code = e.response.status_code if e.response is not None else 0
+            if status_code != 429:
+                ok = status_code < 500
+            raise
+        except Exception:
+            # 网络异常（包括 http_transport 原样抛出的 httpx 异常）计入熔断
+            if sent:
+                ok = False
+            raise
+        finally:
+            if ok is None:
+                breaker.release()
+            elif ok:
+                breaker.record_success()
+            else:
+                breaker.record_failure()
         
-    def get_tenant_access_token(self) -> str:
-        """获取tenant_access_token"""
+        elapsed = time.time() - start_time
+        self.request_count += 1
+        self.request_seconds += elapsed
+        if self.metrics is not None:
+            self.metrics.record_request(url, elapsed, len(kwargs.get("data") or b""), len(response.content))
+        return response
+        
+    def _request_json(self, family: str, method: str, url: str, **kwargs) -> Dict:
+        """发送请求并解析 JSON 响应体"""
+        return fastjson.loads(self._request(family, method, url, **kwargs).content)
+    
+    @classmethod
+    def shared_session(cls) -> "requests.Session":
+        """进程内共享的 HTTP 会话，连接池在各客户端、各任务之间复用"""
+        with cls._shared_lock:
+            if cls._shared_session is None:
+                from http_transport import create_session
+                cls._shared_session = create_session()
+            return cls._shared_session
+    
+    def get_tenant_access_token(self, use_cache: bool = True) -> str:
+        """获取tenant_access_token（use_cache=False 时不使用缓存的token，总是向飞书获取，用于验证凭证）"""
         current_time = time.time()
         
         # 如果token还未过期，直接返回
-        if self.tenant_access_token and current_time < self.token_expire_time:
+        if use_cache and self.tenant_access_token and current_time < self.token_expire_time:
+            return self.tenant_access_token
+        
+        # 同一应用的其他客户端（如启动预热）已获取且未过期的token；键包含 app_secret，密钥错误时不会命中
+        token_key = (self.base_url, self.app_id, self.app_secret)
+        shared = FeishuAPI._shared_tokens.get(token_key)
+        if use_cache and shared and current_time < shared[1]:
+            self.tenant_access_token, self.token_expire_time = shared
             return self.tenant_access_token
             
         url = f"{self.base_url}/auth/v3/tenant_access_token/internal/"
@@ -51,14 +163,13 @@ class FeishuAPI:
         }
         
         try:
-            response = requests.post(url, json=payload)
-            response.raise_for_status()
-            data = response.json()
+            data = self._request_json("auth", "POST", url, json=payload)
             
             if data.get("code") == 0:
                 self.tenant_access_token = data["tenant_access_token"]
                 # 设置过期时间（提前5分钟刷新）
                 self.token_expire_time = current_time + data.get("expire", 7200) - API_CONFIG["token_refresh_advance"]
+                FeishuAPI._shared_tokens[token_key] = (self.tenant_access_token, self.token_expire_time)
                 logger.info("成功获取tenant_access_token")
                 return self.tenant_access_token
             else:
@@ -82,50 +193,82 @@ class FeishuAPI:
         headers = self.get_headers()
         
         try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
+            data = self._request_json("im", "GET", url, headers=headers)
             
             if data.get("code") == 0:
-                return data.get("data", {})
+                info = data.get("data", {})
+                if self.membership_index is not None and info.get("name"):
+                    self.membership_index.note_chat_name(chat_id, info["name"])
+                return info
             else:
                 logger.warning(f"获取群聊信息失败: {data.get('msg', '未知错误')}")
                 return {}
                 
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.warning(f"获取群聊信息异常: {e}")
             return {}
 
-    def get_chat_members(self, chat_id: str) -> List[Dict]:
-        """获取群成员列表"""
+    def list_chats(self, page_size: int = 20) -> List[Dict]:
+        """获取机器人所在的群列表（第一页）"""
+        url = f"{self.base_url}/im/v1/chats"
+        data = self._request_json("im", "GET", url, headers=self.get_headers(), params={"page_size": page_size})
+        
+        if data.get("code") != 0:
+            raise Exception(f"获取群列表失败: {data.get('msg', '未知错误')}")
+        return data.get("data", {}).get("items") or []
+
+    def iter_chat_members(self, chat_id: str) -> Iterator[List[Dict]]:
+        """逐页获取群成员列表"""
         url = f"{self.base_url}/im/v1/chats/{chat_id}/members"
         headers = self.get_headers()
-        all_members = []
         page_token = None
+        # 完整获取后写入成员反向索引（调用方中途停止时不更新）
+        member_ids = [] if self.membership_index is not None else None
         
-        try:
-            while True:
-                params = {"page_size": 100}
-                if page_token:
-                    params["page_token"] = page_token
-                
-                response = requests.get(url, headers=headers, params=params)
-                response.raise_for_status()
-                data = response.json()
-                
-                if data.get("code") != 0:
-                    raise Exception(f"获取群成员失败: {data.get('msg', '未知错误')}")
-                
-                members = data.get("data", {}).get("items", [])
-                all_members.extend(members)
+        while True:
+            params = {"page_size": 100}
+            if page_token:
+                params["page_token"] = page_token
+            
+            data = self._request_json("im", "GET", url, headers=headers, params=params)
+            
+            if data.get("code") != 0:
+                raise Exception(f"获取群成员失败: {data.get('msg', '未知错误')}")
+            
+            items = data.get("data", {}).get("items", [])
+            if member_ids is not None:
+                member_ids.extend(item["member_id"] for item in items if item.get("member_id"))
+            yield items
+            
+            # 检查是否还有下一页
+            page_token = data.get("data", {}).get("page_token")
+            if not page_token:
+                break
                 
-                # 检查是否还有下一页
-                page_token = data.get("data", {}).get("page_token")
-                if not page_token:
-                    break
-                    
+            time.sleep(API_CONFIG["request_interval"])  # 避免请求过快
+        
+        if member_ids is not None:
+            try:
+                self.membership_index.update_chat(chat_id, member_ids)
+            except Exception as e:
+                # 索引只用于查询，更新失败不影响同步
+                logger.warning(f"更新成员索引失败: {e}")
+
+    def get_chat_members(self, chat_id: str) -> List["MemberRecord"]:
+        """获取群成员列表（紧凑表示，不保留接口返回的原始字典）"""
+        from member_records import MemberRecord
+        
+        all_members = []
+        
+        try:
+            for members in self.iter_chat_members(chat_id):
+                for item in members:
+                    record = MemberRecord.from_item(item)
+                    if record:
+                        all_members.append(record)
                 logger.info(f"已获取 {len(all_members)} 个群成员")
-                time.sleep(API_CONFIG["request_interval"])  # 避免请求过快
             
             logger.info(f"总共获取到 {len(all_members)} 个群成员")
             return all_members
@@ -163,19 +306,30 @@ class FeishuAPI:
             logger.error(f"解析多维表格URL失败: {e}")
             raise
     
-    def get_bitable_fields(self, app_token: str, table_id: str) -> List[Dict]:
-        """获取多维表格字段信息"""
+    def get_bitable_fields(self, app_token: str, table_id: str, use_cache: bool = True) -> List[Dict]:
+        """获取多维表格字段信息
+
+        进程内缓存 schema_cache_ttl 秒（0 表示不缓存）；use_cache=False 时总是向飞书获取并刷新缓存，
+        用于需要确认当前状态的调用方（如配置检查）。
+        """
         url = f"{self.base_url}/bitable/v1/apps/{app_token}/tables/{table_id}/fields"
         headers = self.get_headers()
         
+        # 先取token再查缓存：不同应用的权限不同，缓存按应用区分
+        ttl = API_CONFIG.get("schema_cache_ttl", 300)
+        cache_key = (self.base_url, self.app_id, app_token, table_id)
+        cached = FeishuAPI._schema_cache.get(cache_key)
+        if use_cache and ttl and cached and time.time() - cached[0] < ttl:
+            return list(cached[1])
+        
         try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            data = response.json()
+            data = self._request_json("bitable", "GET", url, headers=headers)
             
             if data.get("code") == 0:
                 fields = data.get("data", {}).get("items", [])
                 logger.info(f"获取到 {len(fields)} 个字段")
+                if ttl:
+                    FeishuAPI._schema_cache[cache_key] = (time.time(), list(fields))
                 return fields
             else:
                 raise Exception(f"获取字段信息失败: {data.get('msg', '未知错误')}")
@@ -184,49 +338,478 @@ class FeishuAPI:
             logger.error(f"获取字段信息失败: {e}")
             raise
     
-    def add_bitable_records(self, app_token: str, table_id: str, records: List[Dict]) -> bool:
-        """批量添加多维表格记录"""
+    def invalidate_bitable_fields(self, app_token: str, table_id: str):
+        """丢弃缓存的字段信息（如未找到成员字段时，用户添加字段后重试能立即看到）"""
+        FeishuAPI._schema_cache.pop((self.base_url, self.app_id, app_token, table_id), None)
+    
+    def iter_bitable_records(self, app_token: str, table_id: str,
+                             field_names: Optional[List[str]] = None) -> Iterator[List[Dict]]:
+        """逐页获取多维表格记录，可只返回指定字段"""
+        url = f"{self.base_url}/bitable/v1/apps/{app_token}/tables/{table_id}/records"
+        headers = self.get_headers()
+        page_token = None
+        
+        while True:
+            params = {"page_size": API_CONFIG["batch_size"]}
+            if page_token:
+                params["page_token"] = page_token
+            if field_names:
+                params["field_names"] = json.dumps(field_names, ensure_ascii=False)
+            
+            data = self._request_json("bitable", "GET", url, headers=headers, params=params)
+            
+            if data.get("code") != 0:
+                raise Exception(f"获取多维表格记录失败: {data.get('msg', '未知错误')}")
+            
+            yield data.get("data", {}).get("items") or []
+            
+            if not data.get("data", {}).get("has_more"):
+                break
+            page_token = data.get("data", {}).get("page_token")
+            time.sleep(API_CONFIG["request_interval"])  # 避免请求过快
+    
+    def add_bitable_records(self, app_token: str, table_id: str, records: Iterable[Dict],
+                            on_written: Optional[Callable[[List[Dict]], None]] = None) -> bool:
+        """批量添加多维表格记录
+
+        records 可以是生成器，每次只取出一批构造请求。批大小、并发写入数和批次间隔由该表的
+        自适应控制器按延迟和限流信号调整；被限流或超时的批次退避后重试，client_token 保证重试不会重复写入。
+        因个别记录无效被拒绝的批次二分定位无效记录并隔离，其余记录照常写入；已知无效的成员ID写入前跳过。
+        每写入（或隔离）一批记录调用一次 on_written(batch_records)（在写入线程中），返回 False 时
+        调用方据此区分已写入的记录，只重新写入其余记录。
+        """
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+        from adaptive import get_write_controller
+        from quarantine import get_quarantine
+        
         url = f"{self.base_url}/bitable/v1/apps/{app_token}/tables/{table_id}/records/batch_create"
+        controller = get_write_controller(table_id)
+        
+        total_records = 0
+        batch_count = 0
+        failed = False
+        quarantined, skipped = self.quarantined_records, self.skipped_records
+        records = iter(records)
+        quarantine = get_quarantine()
+        if quarantine is not None:
+            known_bad = quarantine.known_bad(self.app_id)
+            if known_bad:
+                records = self._skip_known_bad(records, known_bad, quarantine)
+        
+        try:
+            with ThreadPoolExecutor(max_workers=controller.max_concurrency) as executor:
+                pending = set()
+                while True:
+                    # 在途批次数不超过控制器当前的并发数
+                    while pending and len(pending) >= controller.concurrency:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        failed = not all([future.result() for future in done]) or failed
+                    if failed:
+                        break
+                    batch_records = list(itertools.islice(records, controller.batch_size))
+                    if not batch_records:
+                        break
+                    batch_count += 1
+                    total_records += len(batch_records)
+                    # 写入线程沿用当前上下文（日志的 task_id、调度通道等）
+                    pending.add(executor.submit(
+                        contextvars.copy_context().run,
+                        self._write_batch, url, batch_records, batch_count, controller, on_written
+                    ))
+                if pending:
+                    done, _ = wait(pending)
+                    failed = not all([future.result() for future in done]) or failed
+            
+            quarantined, skipped = self.quarantined_records - quarantined, self.skipped_records - skipped
+            if quarantined or skipped:
+                logger.warning(f"无效记录: 本次隔离 {quarantined} 条，按已知无效成员ID跳过 {skipped} 条"
+                               f"（GET /quarantine 查看）")
+            if failed:
+                return False
+            logger.info(f"所有记录添加完成，总计 {total_records - quarantined} 条")
+            return True
+            
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"添加记录失败: {e}")
+            return False
+    
+    def _skip_known_bad(self, records: Iterator[Dict], known_bad: Set[str], quarantine) -> Iterator[Dict]:
+        """跳过人员字段中含已知无效成员ID的记录"""
+        from quarantine import person_ids
+        
+        for record in records:
+            bad = [member_id for member_id in person_ids(record.get("fields", {})) if member_id in known_bad]
+            if not bad:
+                yield record
+                continue
+            self.skipped_records += 1
+            quarantine.note_skipped(self.app_id, bad)
+    
+    def _write_batch(self, url: str, batch_records: List[Dict], number: int,
+                     controller, on_written: Optional[Callable[[List[Dict]], None]] = None) -> bool:
+        """写入一批记录，结果反馈给自适应控制器；被限流或超时时退避重试，因个别记录无效被拒绝时二分隔离
+
+        每次请求都重新取请求头：长时间的流式写入中 token 可能过期，get_headers 会在过期前刷新
+        """
+        import requests
+        from adaptive import OUTCOME_ERROR, OUTCOME_OK, OUTCOME_THROTTLED, OUTCOME_TIMEOUT, THROTTLE_CODES
+        from quarantine import RECORD_ERROR_CODES
+        
+        body = fastjson.dumps({"records": batch_records})
+        params = {"client_token": str(uuid.uuid4())}
+        for attempt in range(controller.max_retries + 1):
+            start_time = time.time()
+            message = ""
+            code = None
+            try:
+                data = self._request_json("bitable", "POST", url, headers=self.get_headers(), data=body, params=params,
+                                         timeout=controller.write_timeout)
+                code = data.get("code")
+                outcome = OUTCOME_OK if code == 0 else OUTCOME_THROTTLED if code in THROTTLE_CODES else OUTCOME_ERROR
+                message = data.get("msg", "未知错误")
+            except requests.Timeout as e:
+                outcome, message = OUTCOME_TIMEOUT, str(e)
+            except requests.HTTPError as e:
+                status_code = e.response.status_code if e.response is not None else 0
+                outcome, message = (OUTCOME_THROTTLED if status_code == 429 else OUTCOME_ERROR), str(e)
+            controller.record(outcome, time.time() - start_time, len(batch_records), len(body))
+            
+            if outcome == OUTCOME_OK:
+                logger.info(f"成功添加第 {number} 批记录 ({len(batch_records)} 条)")
+                if on_written is not None:
+                    on_written(batch_records)
+                time.sleep(controller.delay)  # 避免请求过快
+                return True
+            if outcome == OUTCOME_ERROR and code in RECORD_ERROR_CODES:
+                return self._isolate_bad_records(url, batch_records, number, controller, code, message,
+                                                 on_written)
+            if outcome == OUTCOME_ERROR:
+                logger.error(f"添加第 {number} 批记录失败: {message}")
+                return False
+            if attempt < controller.max_retries:
+                if self.metrics is not None:
+                    self.metrics.record_retry()
+                delay = controller.retry_delay(attempt)
+                logger.warning(f"第 {number} 批记录写入{'被限流' if outcome == OUTCOME_THROTTLED else '超时'}，{delay:.1f} 秒后重试")
+                time.sleep(delay)
+        
+        logger.error(f"添加第 {number} 批记录失败: 重试 {controller.max_retries} 次后仍{'被限流' if outcome == OUTCOME_THROTTLED else '超时'}")
+        return False
+    
+    def _isolate_bad_records(self, url: str, batch_records: List[Dict], number: int,
+                             controller, code: int, message: str,
+                             on_written: Optional[Callable[[List[Dict]], None]] = None) -> bool:
+        """批次因个别记录无效被拒绝：单条记录直接隔离，否则二分后分别写入（继续二分到定位出无效记录）"""
+        from quarantine import get_quarantine
+        
+        if len(batch_records) == 1:
+            self.quarantined_records += 1
+            logger.warning(f"第 {number} 批中的无效记录已隔离（{code} {message}）")
+            quarantine = get_quarantine()
+            if quarantine is not None:
+                try:
+                    quarantine.add(self.app_id, controller.name, batch_records[0], code, message)
+                except Exception as e:
+                    logger.warning(f"写入隔离表失败: {e}")
+            if on_written is not None:
+                on_written(batch_records)
+            return True
+        
+        middle = len(batch_records) // 2
+        logger.warning(f"第 {number} 批记录被拒绝（{code} {message}），拆分为 {middle} + {len(batch_records) - middle} 条定位无效记录")
+        left = self._write_batch(url, batch_records[:middle], number, controller, on_written)
+        right = self._write_batch(url, batch_records[middle:], number, controller, on_written)
+        return left and right
+    
+    def delete_bitable_records(self, app_token: str, table_id: str, record_ids: List[str]) -> bool:
+        """批量删除多维表格记录"""
+        url = f"{self.base_url}/bitable/v1/apps/{app_token}/tables/{table_id}/records/batch_delete"
         headers = self.get_headers()
         
         # 分批处理，每次最多500条记录
         batch_size = API_CONFIG["batch_size"]
-        total_records = len(records)
         
         try:
-            for i in range(0, total_records, batch_size):
-                batch_records = records[i:i + batch_size]
-                payload = {"records": batch_records}
-                
-                response = requests.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                data = response.json()
+            for i in range(0, len(record_ids), batch_size):
+                batch_ids = record_ids[i:i + batch_size]
+                data = self._request_json("bitable", "POST", url, headers=headers, json={"records": batch_ids})
                 
-                if data.get("code") == 0:
-                    logger.info(f"成功添加第 {i//batch_size + 1} 批记录 ({len(batch_records)} 条)")
-                else:
-                    logger.error(f"添加第 {i//batch_size + 1} 批记录失败: {data.get('msg', '未知错误')}")
+                if data.get("code") != 0:
+                    logger.error(f"删除第 {i//batch_size + 1} 批记录失败: {data.get('msg', '未知错误')}")
                     return False
                 
-                time.sleep(0.2)  # 避免请求过快
+                time.sleep(API_CONFIG.get("write_interval", 0.2))  # 避免请求过快
             
-            logger.info(f"所有记录添加完成，总计 {total_records} 条")
+            logger.info(f"所有记录删除完成，总计 {len(record_ids)} 条")
             return True
             
+        except CircuitOpenError:
+            raise
         except Exception as e:
-            logger.error(f"添加记录失败: {e}")
+            logger.error(f"删除记录失败: {e}")
             return False
+    
+    def list_bitable_tables(self, app_token: str) -> List[Dict]:
+        """获取多维表格中的所有数据表"""
+        url = f"{self.base_url}/bitable/v1/apps/{app_token}/tables"
+        headers = self.get_headers()
+        tables = []
+        page_token = None
+        
+        while True:
+            params = {"page_size": 100}
+            if page_token:
+                params["page_token"] = page_token
+            
+            data = self._request_json("bitable", "GET", url, headers=headers, params=params)
+            
+            if data.get("code") != 0:
+                raise Exception(f"获取数据表列表失败: {data.get('msg', '未知错误')}")
+            
+            tables.extend(data.get("data", {}).get("items") or [])
+            
+            if not data.get("data", {}).get("has_more"):
+                return tables
+            page_token = data.get("data", {}).get("page_token")
+    
+    def create_bitable_table(self, app_token: str, name: str, fields: List[Dict]) -> str:
+        """新建数据表，返回 table_id"""
+        url = f"{self.base_url}/bitable/v1/apps/{app_token}/tables"
+        headers = self.get_headers()
+        payload = {"table": {"name": name, "default_view_name": "表格", "fields": fields}}
+        
+        data = self._request_json("bitable", "POST", url, headers=headers, json=payload)
+        
+        if data.get("code") != 0:
+            raise Exception(f"创建数据表 {name} 失败: {data.get('msg', '未知错误')}")
+        
+        table_id = data.get("data", {}).get("table_id")
+        logger.info(f"已创建数据表 {name} ({table_id})")
+        return table_id
+
+def find_target_fields(fields: List[Dict]) -> Dict[str, Dict]:
+    """根据多维表格字段信息确定成员、群名称、租户等目标字段"""
+    # 查找各种类型的字段
+    person_fields = [f for f in fields if f.get("type") == 11]  # 11是人员字段类型
+    text_fields = [f for f in fields if f.get("type") == 1]     # 1是文本字段类型
+    multi_select_fields = [f for f in fields if f.get("type") == 4]  # 4是多选字段类型
+    
+    target_fields = {}
+    
+    # 人员字段（优先）
+    if person_fields:
+        target_fields["member"] = person_fields[0]
+        logger.info(f"找到人员字段: {target_fields['member'].get('field_name')}")
+    elif text_fields:
+        target_fields["member"] = text_fields[0]
+        logger.info(f"将使用文本字段存储成员: {target_fields['member'].get('field_name')}")
+    else:
+        return target_fields
+        
+    # 查找群名称字段
+    chat_name_fields = [f for f in text_fields if "群" in f.get("field_name", "") or "名称" in f.get("field_name", "")]
+    if chat_name_fields:
+        target_fields["chat_name"] = chat_name_fields[0]
+        logger.info(f"找到群名称字段: {target_fields['chat_name'].get('field_name')}")
+    elif len(text_fields) > 1:
+        target_fields["chat_name"] = text_fields[1]
+        logger.info(f"将使用文本字段存储群名称: {target_fields['chat_name'].get('field_name')}")
+        
+    # 查找租户字段
+    tenant_fields = [f for f in text_fields if "租户" in f.get("field_name", "") or "tenant" in f.get("field_name", "").lower()]
+    if tenant_fields:
+        target_fields["tenant"] = tenant_fields[0]
+        logger.info(f"找到租户字段: {target_fields['tenant'].get('field_name')}")
+    elif len(text_fields) > 2:
+        target_fields["tenant"] = text_fields[2]
+        logger.info(f"将使用文本字段存储租户信息: {target_fields['tenant'].get('field_name')}")
+    
+    # 查找所在群多选字段（聚合模式使用，未找到时退回群名称文本字段）
+    groups_fields = [f for f in multi_select_fields if "群" in f.get("field_name", "")]
+    if groups_fields:
+        target_fields["groups"] = groups_fields[0]
+        logger.info(f"找到所在群多选字段: {target_fields['groups'].get('field_name')}")
+    
+    return target_fields
+
+def _sync_member_union(api: FeishuAPI, app_token: str, table_id: str, chat_ids: List[str],
+                       target_fields: Dict) -> Dict:
+    """聚合模式：流式获取多个群的成员，按成员去重后每人写入一条记录"""
+    from member_union import MemberUnion, build_union_records
+    
+    union = MemberUnion()
+    for chat_id in chat_ids:
+        chat_info = api.get_chat_info(chat_id)
+        chat_idx = union.add_chat(chat_id, chat_info.get("name", chat_id))
+        
+        member_count = 0
+        for members in api.iter_chat_members(chat_id):
+            for member in members:
+                member_id = member.get("member_id")
+                if member_id:
+                    union.add_member(chat_idx, member_id, member.get("tenant_key", ""))
+                    member_count += 1
+        logger.info(f"群 {chat_id} 获取到 {member_count} 个成员，累计去重后 {len(union)} 人")
+    
+    if not len(union):
+        logger.warning("未获取到任何群成员")
+        return {"members": 0, "written": False}
+    
+    logger.info(
+        f"{len(chat_ids)} 个群共 {union.membership_count} 条成员关系，"
+        f"去重后 {len(union)} 人（重叠系数 {union.overlap_factor:.1f}）"
+    )
+    
+    records = build_union_records(union, target_fields)
+    logger.info(f"开始写入 {len(union)} 条记录到多维表格...")
+    written = api.add_bitable_records(app_token, table_id, records)
+    if written:
+        logger.info("✅ 群成员信息已成功写入多维表格！")
+    else:
+        logger.error("❌ 写入多维表格失败")
+    return {"members": len(union), "written": written}
+
+def _read_chat_ids() -> List[str]:
+    """从标准输入读取群ID，多个群ID以逗号或空白分隔"""
+    raw = input("请输入飞书群ID: ").strip()
+    return [c for c in re.split(r"[,\s]+", raw) if c]
+
+def _export_members(app_id: str, app_secret: str, args, profiler=None):
+    """将群成员流式导出到本地文件"""
+    if args.plan or args.union:
+        logger.error("--plan 和 --union 仅支持输出到多维表格")
+        return
+    
+    chat_ids = _read_chat_ids()
+    if not chat_ids:
+        logger.error("群ID不能为空")
+        return
+    
+    output = args.output or os.path.join(
+        API_CONFIG.get("export_dir", "exports"),
+        f"members_{time.strftime('%Y%m%d_%H%M%S')}.{args.sink}"
+    )
+    
+    try:
+        api = FeishuAPI(app_id, app_secret)
+        if profiler:
+            profiler.instrument(api)
+        summary = run_member_pipeline(api, chat_ids, create_file_sink(args.sink, output))
+        logger.info(f"✅ 已导出 {summary['chats']} 个群共 {summary['members']} 个成员到 {summary['path']}")
+    except Exception as e:
+        logger.error(f"导出群成员失败: {e}")
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """主函数"""
+    parser = argparse.ArgumentParser(description="飞书群成员同步到多维表格")
+    parser.add_argument("bitable_url", nargs="?", help="飞书多维表格URL（默认使用配置文件中的链接）")
+    parser.add_argument(
+        "--plan", action="store_true",
+        help="只计算同步计划（新增/更新/删除数、批次数、API调用次数和预计耗时），不写入多维表格"
+    )
+    parser.add_argument(
+        "--union", action="store_true",
+        help="聚合模式：输入多个群ID（逗号或空格分隔），按成员去重后每人写入一条记录"
+    )
+    parser.add_argument(
+        "--sink", choices=SINK_TYPES, default="bitable",
+        help="输出目标：bitable 写入多维表格（默认），csv/jsonl/parquet 流式导出到本地文件"
+    )
+    parser.add_argument("--output", help="导出文件路径（默认 exports/members_<时间>.<类型>）")
+    parser.add_argument(
+        "--profile", nargs="?", const="cprofile", choices=("cprofile", "sample"),
+        help="剖析本次同步（默认 cprofile，sample 为采样剖析），输出 pstats/speedscope 和每个请求的网络耗时"
+    )
+    parser.add_argument(
+        "--shards", type=int, default=0,
+        help="分片模式：把成员记录分散写入 N 个分片表（按需创建），只更新内容变化的分片"
+    )
+    parser.add_argument(
+        "--shard-by", choices=("hash", "tenant"), default="hash",
+        help="分片方式：hash 按成员ID哈希（默认），tenant 按租户"
+    )
+    parser.add_argument(
+        "--cleanup", action="store_true",
+        help="清理模式：删除表中的重复记录，以及输入的群中已退群成员的记录（不输入群ID时只去重）；与 --plan 同用时只统计不删除"
+    )
+    parser.add_argument(
+        "--record", metavar="CASSETTE",
+        help="录制本次同步的飞书请求/响应和耗时到磁带文件（.jsonl.gz，token 和个人信息已脱敏）"
+    )
+    parser.add_argument(
+        "--replay", metavar="CASSETTE",
+        help="回放磁带文件中录制的响应，不访问网络（用于离线重现和对比同步耗时）"
+    )
+    parser.add_argument(
+        "--replay-speed", type=float, default=None,
+        help="回放耗时倍数（默认 1 按录制耗时等待，0 不等待）"
+    )
+    parser.add_argument(
+        "--stats", nargs="?", const=7, type=float, metavar="DAYS",
+        help="输出最近 DAYS 天（默认 7）各群的同步耗时分位数、趋势和变慢的同步，不执行同步"
+    )
+    args = parser.parse_args(argv)
+    startup_timing.mark("参数解析")
+    
+    setup_logging(LOG_CONFIG["filename"])
+    startup_timing.mark("日志初始化")
+    
+    # 环境变量和覆盖文件中的调优参数；设置 RUNTIME_CONFIG_FILE 时同步期间修改文件即可生效
+    from runtime_config import get_runtime_config
+    get_runtime_config().start()
+    startup_timing.print_report()
+    
+    if args.stats is not None:
+        from sync_history import SyncHistory, format_stats
+        for line in format_stats(SyncHistory().stats(days=args.stats)):
+            print(line)
+        return
+    
+    if args.record or args.replay or args.replay_speed is not None:
+        import cassette
+        cassette.configure(record=args.record, replay=args.replay, speed=args.replay_speed)
+    
+    # 设置 MEMBERSHIP_DB 时同步获取的成员也写入反向索引（可与 API 服务共用同一个文件）
+    if os.getenv("MEMBERSHIP_DB"):
+        from membership_index import MembershipIndex
+        FeishuAPI.membership_index = MembershipIndex(os.environ["MEMBERSHIP_DB"])
+    
+    if args.profile:
+        from profiling import SyncProfiler
+        name = f"cli_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"
+        # 分片模式在线程池中写入，采样剖析覆盖所有线程
+        with SyncProfiler(name, args.profile, all_threads=True) as profiler:
+            _run_sync(args, profiler)
+        for line in profiler.format_summary():
+            logger.info(line)
+        return
+    
+    _run_sync(args)
+
+def _run_sync(args, profiler=None):
+    """按命令行参数执行同步"""
     # 从配置文件读取配置信息
     APP_ID = FEISHU_CONFIG["app_id"]
     APP_SECRET = FEISHU_CONFIG["app_secret"]
     
+    if args.shards and (args.sink != "bitable" or args.plan or args.union):
+        logger.error("--shards 不能与 --sink、--plan、--union 同时使用")
+        return
+    
+    if args.cleanup and (args.sink != "bitable" or args.union or args.shards):
+        logger.error("--cleanup 不能与 --sink、--union、--shards 同时使用")
+        return
+    
+    if args.sink != "bitable":
+        _export_members(APP_ID, APP_SECRET, args, profiler)
+        return
+    
     # 获取多维表格URL - 优先使用命令行参数，其次使用配置文件
     BITABLE_URL = None
-    if len(sys.argv) > 1:
-        BITABLE_URL = sys.argv[1].strip()
+    if args.bitable_url:
+        BITABLE_URL = args.bitable_url.strip()
     elif "bitable_url" in FEISHU_CONFIG:
         BITABLE_URL = FEISHU_CONFIG["bitable_url"]
     
@@ -234,15 +817,23 @@ def main():
         logger.error("未提供多维表格URL，请通过命令行参数或配置文件提供")
         return
     
-    # 获取群ID - 从标准输入读取
-    chat_id = input("请输入飞书群ID: ").strip()
-    if not chat_id:
+    # 获取群ID - 从标准输入读取（清理模式可以不输入，只去重）
+    chat_ids = _read_chat_ids()
+    if not chat_ids and not args.cleanup:
         logger.error("群ID不能为空")
         return
     
+    run = None
     try:
         # 初始化API客户端
         api = FeishuAPI(APP_ID, APP_SECRET)
+        if profiler:
+            profiler.instrument(api)
+        
+        if not (args.plan or args.cleanup):
+            # 记录本次同步的耗时、分页、批次等，写入同步历史
+            from sync_history import start_run
+            run = start_run(api, chat_ids, "cli", "union" if args.union else "shards" if args.shards else "bitable")
         
         # 解析多维表格URL
         app_token, table_id = api.parse_bitable_url(BITABLE_URL)
@@ -251,108 +842,62 @@ def main():
         # 获取多维表格字段信息
         fields = api.get_bitable_fields(app_token, table_id)
         
-        # 查找各种类型的字段
-        person_fields = [f for f in fields if f.get("type") == 11]  # 11是人员字段类型
-        text_fields = [f for f in fields if f.get("type") == 1]     # 1是文本字段类型
-        
         # 确定要使用的字段
-        target_fields = {}
-        
-        # 人员字段（优先）
-        if person_fields:
-            target_fields["member"] = person_fields[0]
-            logger.info(f"找到人员字段: {target_fields['member'].get('field_name')}")
-        elif text_fields:
-            target_fields["member"] = text_fields[0]
-            logger.info(f"将使用文本字段存储成员: {target_fields['member'].get('field_name')}")
-        else:
+        target_fields = find_target_fields(fields)
+        if "member" not in target_fields:
+            api.invalidate_bitable_fields(app_token, table_id)
             logger.error("未找到合适的字段来存储成员信息")
+            if run is not None:
+                run.finish(error="未找到合适的字段来存储成员信息")
             return
-            
-        # 查找群名称字段
-        chat_name_fields = [f for f in text_fields if "群" in f.get("field_name", "") or "名称" in f.get("field_name", "")]
-        if chat_name_fields:
-            target_fields["chat_name"] = chat_name_fields[0]
-            logger.info(f"找到群名称字段: {target_fields['chat_name'].get('field_name')}")
-        elif len(text_fields) > 1:
-            target_fields["chat_name"] = text_fields[1]
-            logger.info(f"将使用文本字段存储群名称: {target_fields['chat_name'].get('field_name')}")
-            
-        # 查找租户字段
-        tenant_fields = [f for f in text_fields if "租户" in f.get("field_name", "") or "tenant" in f.get("field_name", "").lower()]
-        if tenant_fields:
-            target_fields["tenant"] = tenant_fields[0]
-            logger.info(f"找到租户字段: {target_fields['tenant'].get('field_name')}")
-        elif len(text_fields) > 2:
-            target_fields["tenant"] = text_fields[2]
-            logger.info(f"将使用文本字段存储租户信息: {target_fields['tenant'].get('field_name')}")
-        
-        # 获取群聊信息
-        logger.info("开始获取群聊信息...")
-        chat_info = api.get_chat_info(chat_id)
-        chat_name = chat_info.get("name", "未知群聊")
-        # 从群聊信息中获取tenant_key
-        chat_tenant_key = chat_info.get("tenant_key", "")
-        logger.info(f"群聊信息: 名称={chat_name}, 租户ID={chat_tenant_key}")
         
-        # 获取群成员
-        logger.info("开始获取群成员信息...")
-        members = api.get_chat_members(chat_id)
+        if args.cleanup:
+            from table_cleanup import cleanup_table, format_cleanup
+            summary = cleanup_table(api, app_token, table_id, target_fields, chat_ids, dry_run=args.plan)
+            for line in format_cleanup(summary):
+                logger.info(line)
+            return
         
-        if not members:
-            logger.warning("未获取到任何群成员")
+        if args.plan:
+            from sync_planner import plan_sync, format_plan
+            for plan_chat_id in chat_ids:
+                plan = plan_sync(api, app_token, table_id, plan_chat_id, target_fields)
+                for line in format_plan(plan):
+                    logger.info(line)
+                print(json.dumps(plan, ensure_ascii=False, indent=2))
             return
         
-        # 准备写入多维表格的记录
-        records = []
-        for member in members:
-            member_id = member.get("member_id")
-            if not member_id:
-                continue
-                
-            # 从群成员API返回的数据中获取tenant_key
-            member_tenant_key = member.get("tenant_key", "")
-                
-            # 构建记录字段
-            fields_data = {}
-            
-            # 成员字段
-            member_field = target_fields.get("member")
-            if member_field:
-                if member_field.get("type") == 11:  # 人员字段
-                    fields_data[member_field.get("field_name")] = [{"id": member_id}]
-                else:  # 文本字段
-                    fields_data[member_field.get("field_name")] = member_id
-            
-            # 群名称字段
-            chat_name_field = target_fields.get("chat_name")
-            if chat_name_field:
-                fields_data[chat_name_field.get("field_name")] = chat_name
-                
-            # 租户字段 - 使用群成员API返回的tenant_key
-            tenant_field = target_fields.get("tenant")
-            if tenant_field and member_tenant_key:
-                fields_data[tenant_field.get("field_name")] = member_tenant_key
-            
-            record = {"fields": fields_data}
-            records.append(record)
-            time.sleep(API_CONFIG["request_interval"] / 2)  # 避免请求过快
+        if args.union:
+            summary = _sync_member_union(api, app_token, table_id, chat_ids, target_fields)
+            run.finish(summary["members"], error=None if summary["written"] else "写入多维表格失败")
+            return
         
-        if not records:
-            logger.warning("没有有效的记录可以写入")
+        if args.shards:
+            from sharding import sync_sharded
+            summary = sync_sharded(api, app_token, table_id, chat_ids, target_fields, args.shards, args.shard_by)
+            run.finish(summary["members"])
+            logger.info(
+                f"✅ {summary['members']} 条成员记录已同步到 {summary['shard_count']} 个分片表"
+                f"（同步 {summary['touched']} 个，未变化 {summary['skipped']} 个）"
+            )
             return
         
-        # 写入多维表格
-        logger.info(f"开始写入 {len(records)} 条记录到多维表格...")
-        success = api.add_bitable_records(app_token, table_id, records)
+        # 逐页获取群成员并写入多维表格
+        sink = BitableSink(api, app_token, table_id, target_fields)
+        summary = run_member_pipeline(api, chat_ids, sink)
         
-        if success:
-            logger.info("✅ 群成员信息已成功写入多维表格！")
+        if summary["members"]:
+            run.finish(summary["members"])
+            logger.info(f"✅ {summary['members']} 个群成员信息已成功写入多维表格！")
         else:
-            logger.error("❌ 写入多维表格失败")
+            run.finish(error="未获取到任何群成员")
+            logger.warning("未获取到任何群成员")
             
     except Exception as e:
+        if run is not None:
+            run.finish(error=str(e))
         logger.error(f"程序执行失败: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with log_context(sync_id=f"cli_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}"):
+        main()
\ No newline at end of file
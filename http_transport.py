@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+飞书接口的 HTTP/2 传输（可选，需要 pip install "httpx[http2]"）
+HTTP/1.1 每个连接同时只有一个请求，并发写入、多群分页会建立大量到 open.feishu.cn 的连接；
+HTTP/2 在少量连接上多路复用并发请求。连接数和每个连接的并发流数可配置，
+新请求分配到在途请求最少的连接。提供同步（FeishuAPI 使用）和异步（asyncio 调用方使用）两种会话，
+未启用或未安装 httpx 时 FeishuAPI 使用 requests 的 HTTP/1.1 连接池
+"""
+
+import os
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import fastjson
+from config import API_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 默认传输配置，可通过 API_CONFIG["http_transport"] 覆盖
+DEFAULT_TRANSPORT_CONFIG = {
+    # 启用 HTTP/2（环境变量 FEISHU_HTTP2=1 也可开启）
+    "http2": False,
+    # 连接数
+    "connections": 2,
+    # 每个连接同时在途的请求数（HTTP/2 流），超过时排队等待
+    "streams_per_connection": 50,
+    # 明文 http:// 地址直接以 HTTP/2 通信（h2c），只用于本地模拟服务；https 通过 ALPN 协商
+    "h2c": False,
+    # HTTP/1.1 时每个主机保留的连接数（会话在各任务之间共享，需容纳并发的调度任务和写入线程）
+    "pool_maxsize": 32
+}
+
+
+def transport_config() -> Dict:
+    config = dict(DEFAULT_TRANSPORT_CONFIG)
+    config.update(API_CONFIG.get("http_transport", {}))
+    if os.getenv("FEISHU_HTTP2"):
+        config["http2"] = os.getenv("FEISHU_HTTP2") not in ("0", "false", "")
+    return config
+
+
+def create_session():
+    """按配置创建 FeishuAPI 的 HTTP 会话：HTTP/2 会话或 requests.Session
+
+    设置了流量回放时返回不访问网络的回放会话，设置了流量录制时包装为录制会话（见 cassette）。
+    """
+    import requests
+    import cassette
+
+    if cassette.REPLAY_PATH:
+        return cassette.get_replay(cassette.REPLAY_PATH, cassette.REPLAY_SPEED)
+
+    session = None
+    config = transport_config()
+    if config["http2"]:
+        try:
+            session = Http2Session(config["connections"], config["streams_per_connection"], config["h2c"])
+        except ImportError:
+            logger.warning('未安装 httpx[http2]，使用 HTTP/1.1（pip install "httpx[http2]"）')
+    if session is None:
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=config["pool_maxsize"])
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+    if cassette.RECORD_PATH:
+        session = cassette.RecordingSession(session, cassette.get_writer(cassette.RECORD_PATH))
+    return session
+
+
+class Http2Response:
+    """与 requests.Response 接口一致的响应（FeishuAPI 用到的部分）"""
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.content = response.content
+        self.http_version = response.http_version
+        self.url = str(response.url)
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return fastjson.loads(self.content)
+
+    def raise_for_status(self):
+        import requests
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+def _raise_as_requests(e: Exception):
+    """httpx 的网络异常转换为对应的 requests 异常，调用方（熔断、重试、预检）按原有方式处理"""
+    import httpx
+    import requests
+    if isinstance(e, httpx.TimeoutException):
+        raise requests.Timeout(str(e)) from e
+    if isinstance(e, httpx.TransportError):
+        raise requests.ConnectionError(str(e)) from e
+    raise e
+
+
+def _client_options(h2c: bool) -> Dict:
+    import httpx
+    return {
+        "http2": True,
+        # h2c 时不允许 HTTP/1.1，直接发送 HTTP/2 连接前言
+        "http1": not h2c,
+        # 每个客户端只有一个连接，请求在这个连接上多路复用
+        "limits": httpx.Limits(max_connections=1, max_keepalive_connections=1),
+        "timeout": None
+    }
+
+
+def _request_options(params=None, data=None, headers=None, timeout=None) -> Dict:
+    import httpx
+    return {
+        "params": params,
+        "content": data,
+        "headers": headers,
+        "timeout": timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+    }
+
+
+class _Connection:
+    """一个 HTTP/2 连接（单连接的 httpx 客户端）及其在途请求数"""
+
+    def __init__(self, client, streams):
+        self.client = client
+        self.streams = streams
+        self.in_flight = 0
+        self.requests = 0
+        self.http_version: Optional[str] = None
+
+
+class _ConnectionGroup:
+    def __init__(self, connections: int, streams_per_connection: int):
+        self.streams_per_connection = streams_per_connection
+        self.connections: List[_Connection] = []
+        self._warned = False
+
+    def _pick(self) -> _Connection:
+        connection = min(self.connections, key=lambda c: c.in_flight)
+        connection.in_flight += 1
+        connection.requests += 1
+        return connection
+
+    def _note_version(self, connection: _Connection, http_version: str):
+        connection.http_version = http_version
+        if http_version != "HTTP/2" and not self._warned:
+            self._warned = True
+            logger.warning(f"服务端未使用 HTTP/2（{http_version}），每个连接同时只能处理一个请求")
+
+    def stats(self) -> List[Dict]:
+        return [
+            {"http_version": c.http_version, "in_flight": c.in_flight, "requests": c.requests}
+            for c in self.connections
+        ]
+
+
+class Http2Session(_ConnectionGroup):
+    """同步 HTTP/2 会话，可在多个线程中并发使用（接口与 requests.Session.request 一致）"""
+
+    def __init__(self, connections: int = 2, streams_per_connection: int = 50, h2c: bool = False):
+        import httpx
+        super().__init__(connections, streams_per_connection)
+        self._lock = threading.Lock()
+        self.connections = [
+            _Connection(httpx.Client(**_client_options(h2c)), threading.BoundedSemaphore(streams_per_connection))
+            for _ in range(max(connections, 1))
+        ]
+
+    def request(self, method: str, url: str, **kwargs) -> Http2Response:
+        with self._lock:
+            connection = self._pick()
+        try:
+            with connection.streams:
+                try:
+                    response = connection.client.request(method, url, **_request_options(**kwargs))
+                except Exception as e:
+                    _raise_as_requests(e)
+        finally:
+            with self._lock:
+                connection.in_flight -= 1
+        self._note_version(connection, response.http_version)
+        return Http2Response(response)
+
+    def close(self):
+        for connection in self.connections:
+            connection.client.close()
+
+
+class AsyncHttp2Session(_ConnectionGroup):
+    """异步 HTTP/2 会话，供 asyncio 调用方并发请求飞书接口（需在事件循环内创建）"""
+
+    def __init__(self, connections: int = 2, streams_per_connection: int = 50, h2c: bool = False):
+        import httpx
+        super().__init__(connections, streams_per_connection)
+        self.connections = [
+            _Connection(httpx.AsyncClient(**_client_options(h2c)), asyncio.Semaphore(streams_per_connection))
+            for _ in range(max(connections, 1))
+        ]
+
+    @classmethod
+    def from_config(cls) -> "AsyncHttp2Session":
+        config = transport_config()
+        return cls(config["connections"], config["streams_per_connection"], config["h2c"])
+
+    async def request(self, method: str, url: str, **kwargs) -> Http2Response:
+        # 单线程事件循环中选择连接不需要加锁
+        connection = self._pick()
+        try:
+            async with connection.streams:
+                try:
+                    response = await connection.client.request(method, url, **_request_options(**kwargs))
+                except Exception as e:
+                    _raise_as_requests(e)
+        finally:
+            connection.in_flight -= 1
+        self._note_version(connection, response.http_version)
+        return Http2Response(response)
+
+    async def request_json(self, method: str, url: str, **kwargs) -> Dict:
+        response = await self.request(method, url, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    async def aclose(self):
+        for connection in self.connections:
+            await connection.client.aclose()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+同步任务优先级调度
+任务按通道（interactive 交互、bulk 批量）排队，由固定数量的执行线程按优先级取出；
+排队时间越长优先级越高（老化），批量任务不会被一直饿死。
+飞书全局限流额度按通道权重公平分配，交互任务不会被批量任务的大量请求挤占
+"""
+
+import time
+import heapq
+import logging
+import itertools
+import threading
+import contextvars
+from typing import Callable, Dict, List, Optional
+
+from config import API_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 默认通道配置：priority 越小越先执行，weight 为分配限流额度的权重
+DEFAULT_LANES = {
+    "interactive": {"priority": 0, "weight": 4},
+    "bulk": {"priority": 1, "weight": 1}
+}
+
+# 当前线程所属的通道，由调度器在执行任务时设置，供限流额度分配使用
+_current_lane: contextvars.ContextVar = contextvars.ContextVar("lane", default="interactive")
+
+
+def scheduler_config() -> Dict:
+    """调度配置（config.py 未配置时使用默认值）"""
+    config = API_CONFIG.get("scheduler", {})
+    return {
+        "workers": config.get("workers", 4),
+        "aging_seconds": config.get("aging_seconds", 60),
+        "default_job_seconds": config.get("default_job_seconds", 30),
+        "queue_update_interval": config.get("queue_update_interval", 1),
+        "lanes": config.get("lanes", DEFAULT_LANES)
+    }
+
+
+class Job:
+    """排队中的同步任务"""
+
+    __slots__ = ("job_id", "lane", "func", "args", "kwargs", "submitted_at", "seq", "started_at")
+
+    def __init__(self, job_id: str, lane: str, func: Callable, args: tuple, kwargs: dict, seq: int):
+        self.job_id = job_id
+        self.lane = lane
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.submitted_at = time.time()
+        self.seq = seq
+        self.started_at = None
+
+
+class JobScheduler:
+    """带老化的多通道优先级调度器
+
+    有效优先级 = 通道优先级 - 排队秒数 / aging_seconds，取最小者执行；
+    bulk 任务排队 aging_seconds 秒后与新提交的 interactive 任务同级。
+    """
+
+    def __init__(self, workers: int = 4, lanes: Optional[Dict] = None, aging_seconds: float = 60,
+                 default_job_seconds: float = 30,
+                 on_queue_change: Optional[Callable[[Dict[str, Dict]], None]] = None,
+                 queue_update_interval: float = 1):
+        self.workers = workers
+        self.lanes = lanes or DEFAULT_LANES
+        self.aging_seconds = aging_seconds
+        # 队列位置变化时的回调（如写入任务状态），参数为 job_id -> 排队信息
+        self.on_queue_change = on_queue_change
+        # 全部排队任务的位置最多每 queue_update_interval 秒回调一次，避免批量提交时每次都重写整个队列
+        self.queue_update_interval = queue_update_interval
+        self._flush_timer: Optional[threading.Timer] = None
+        self._last_flush = 0.0
+        self._queue: List[Job] = []
+        self._running: Dict[str, Job] = {}
+        # 各通道任务耗时的滑动平均，用于估算等待时间
+        self._durations = {lane: float(default_job_seconds) for lane in self.lanes}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._stopped = False
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"sync-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def shutdown(self) -> List[str]:
+        """停止调度，返回未执行的任务ID（正在执行的任务会继续完成）"""
+        with self._cond:
+            self._stopped = True
+            pending = [job.job_id for job in self._queue]
+            self._queue.clear()
+            if self._flush_timer:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            self._cond.notify_all()
+        return pending
+
+    def submit(self, job_id: str, lane: str, func: Callable, *args, **kwargs) -> Dict:
+        """提交任务，返回排队信息"""
+        if lane not in self.lanes:
+            raise ValueError(f"不支持的任务通道: {lane}，可选: {', '.join(self.lanes)}")
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("调度器已停止")
+            self._queue.append(Job(job_id, lane, func, args, kwargs, next(self._seq)))
+            self._cond.notify()
+            info = self._snapshot().get(job_id, {})
+            # 新任务可能插到其他任务前面，其余任务的位置合并到下一次定时回调
+            self._schedule_flush()
+        self._notify({job_id: info})
+        return info
+
+    def queue_info(self, job_id: str) -> Optional[Dict]:
+        """任务的排队位置和预计开始时间，不在本调度器队列中时返回 None"""
+        with self._cond:
+            return self._snapshot().get(job_id)
+
+    def stats(self) -> Dict:
+        """各通道排队和执行中的任务数"""
+        with self._cond:
+            stats = {lane: {"queued": 0, "running": 0} for lane in self.lanes}
+            for job in self._queue:
+                stats[job.lane]["queued"] += 1
+            for job in self._running.values():
+                stats[job.lane]["running"] += 1
+            for lane, seconds in self._durations.items():
+                stats[lane]["avg_job_seconds"] = round(seconds, 1)
+            return stats
+
+    def _score(self, job: Job, now: float) -> tuple:
+        waited = now - job.submitted_at
+        return (self.lanes[job.lane]["priority"] - waited / self.aging_seconds, job.seq)
+
+    def _ordered(self, now: float) -> List[Job]:
+        return sorted(self._queue, key=lambda job: self._score(job, now))
+
+    def _snapshot(self) -> Dict[str, Dict]:
+        """按当前优先级计算每个排队任务的位置和预计等待时间（调用方持有锁）"""
+        now = time.time()
+        # 各执行线程空闲的预计时刻
+        free_at = [now] * max(self.workers - len(self._running), 0)
+        for job in self._running.values():
+            free_at.append(max(job.started_at + self._durations[job.lane], now))
+        heapq.heapify(free_at)
+
+        snapshot = {}
+        for position, job in enumerate(self._ordered(now), start=1):
+            start_at = heapq.heappop(free_at) if free_at else now
+            heapq.heappush(free_at, start_at + self._durations[job.lane])
+            snapshot[job.job_id] = {
+                "lane": job.lane,
+                "queue_position": position,
+                "queued_seconds": round(now - job.submitted_at, 1),
+                "eta_seconds": round(start_at - now, 1)
+            }
+        return snapshot
+
+    def _schedule_flush(self):
+        """安排一次全部排队任务的回调，距上次回调不足 queue_update_interval 秒时延后（调用方持有锁）"""
+        if not self.on_queue_change or self._flush_timer or self._stopped:
+            return
+        delay = max(self._last_flush + self.queue_update_interval - time.time(), 0)
+        self._flush_timer = threading.Timer(delay, self._flush)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _flush(self):
+        with self._cond:
+            self._flush_timer = None
+            if self._stopped:
+                return
+            self._last_flush = time.time()
+            snapshot = self._snapshot()
+        self._notify(snapshot)
+
+    def _notify(self, snapshot: Dict[str, Dict]):
+        if self.on_queue_change and snapshot:
+            try:
+                self.on_queue_change(snapshot)
+            except Exception as e:
+                logger.warning(f"更新排队信息失败: {e}")
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                job = min(self._queue, key=lambda queued: self._score(queued, time.time()))
+                self._queue.remove(job)
+                job.started_at = time.time()
+                self._running[job.job_id] = job
+                self._schedule_flush()
+
+            token = _current_lane.set(job.lane)
+            try:
+                job.func(*job.args, **job.kwargs)
+            except Exception as e:
+                logger.error(f"任务 {job.job_id} 执行异常: {e}")
+            finally:
+                _current_lane.reset(token)
+                with self._cond:
+                    self._running.pop(job.job_id, None)
+                    duration = time.time() - job.started_at
+                    self._durations[job.lane] = 0.8 * self._durations[job.lane] + 0.2 * duration
+
+
+class FairShareLimiter:
+    """按通道权重分配全局限流额度（加权公平排队）
+
+    每次取额度时按所属通道累加虚拟时间（1/权重），虚拟时间最小的请求先取得底层额度。
+    多个通道同时有请求时，各通道获得的请求速率与权重成正比；只有一个通道时不受影响。
+    """
+
+    def __init__(self, base, lanes: Optional[Dict] = None):
+        self.base = base
+        self.weights = {lane: config.get("weight", 1) for lane, config in (lanes or DEFAULT_LANES).items()}
+        self._virtual_time = {lane: 0.0 for lane in self.weights}
+        self._clock = 0.0
+        self._waiting: List[tuple] = []
+        self._seq = itertools.count()
+        self._busy = False
+        self._cond = threading.Condition()
+
+    def acquire(self, tokens: float = 1.0):
+        lane = _current_lane.get()
+        weight = self.weights.get(lane, 1)
+        with self._cond:
+            # 空闲通道不积攒额度：虚拟时间不落后于全局时钟
+            finish = max(self._virtual_time.get(lane, 0.0), self._clock) + tokens / weight
+            self._virtual_time[lane] = finish
+            ticket = (finish, next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+            while self._busy or self._waiting[0] != ticket:
+                self._cond.wait()
+            heapq.heappop(self._waiting)
+            self._busy = True
+        try:
+            self.base.acquire(tokens)
+        finally:
+            with self._cond:
+                self._busy = False
+                self._clock = finish
+                self._cond.notify_all()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+日志配置
+日志记录先进入内存队列，由后台线程写入按大小轮转的文件和控制台，
+调用方（分页、批量写入、事件循环）不再等待磁盘I/O
+"""
+
+import re
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+from config import LOG_CONFIG
+
+# 当前同步上下文（task_id、sync_id 等），随日志记录一起输出
+_log_context: contextvars.ContextVar = contextvars.ContextVar("log_context", default={})
+
+# 重复日志归一化：群ID、用户ID、数字等替换为占位符
+_NORMALIZE_PATTERN = re.compile(r"\b(?:o[cun]|cli|tbl|bas)_\w+|\d+")
+
+# 日志记录中的标准属性，JSON 输出时不重复输出
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+# logging.handlers 导入较慢（socket、pickle 等），在 setup_logging 中才加载
+_listener = None
+_queue_handler = None
+_setup_lock = threading.Lock()
+
+
+@contextmanager
+def log_context(**fields):
+    """在上下文内的日志中附加字段，如 task_id、sync_id"""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """把当前同步上下文写入日志记录（在调用方线程执行，进入队列前完成）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _log_context.get().items():
+            setattr(record, key, value)
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """限制相似警告的输出频率
+
+    同一类警告（去掉ID和数字后相同）在每个时间窗口内最多输出 burst 条，
+    其余被抑制，下一条放行的日志会注明被抑制的条数。
+    """
+
+    def __init__(self, interval: float = 60, burst: int = 5, level: int = logging.WARNING):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.level = level
+        self._lock = threading.Lock()
+        # 归一化消息 -> (窗口开始时间, 窗口内条数, 被抑制条数)
+        self._windows: Dict[Tuple[str, int, str], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != self.level:
+            return True
+
+        key = (record.name, record.levelno, _NORMALIZE_PATTERN.sub("#", str(record.msg)))
+        now = time.time()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if len(self._windows) > 10000:
+                    self._windows.clear()
+            elif window[1] < self.burst:
+                window[1] += 1
+                suppressed = 0
+            else:
+                window[2] += 1
+                return False
+
+        if suppressed:
+            record.suppressed = suppressed
+            record.msg = f"{record.msg}（此前 {suppressed} 条相似日志已被抑制）"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(filename: Optional[str] = None, level: Optional[str] = None, console: bool = True,
+                  per_process: bool = False):
+    """配置队列日志
+
+    根日志器只挂一个 QueueHandler，文件与控制台输出由后台线程完成。
+    重复调用会替换之前的配置（例如 API 服务改用自己的日志文件）。
+    per_process 为 True 时文件名带进程号（api_server.<pid>.log）：多个 worker 进程各自轮转自己的文件，
+    不会出现一个进程轮转（重命名）后其他进程继续写入旧文件的情况。
+    """
+    global _listener, _queue_handler
+    from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            logging.getLogger().removeHandler(_queue_handler)
+
+        handlers = []
+        filename = filename if filename is not None else LOG_CONFIG["filename"]
+        if filename and per_process:
+            root, ext = os.path.splitext(filename)
+            filename = f"{root}.{os.getpid()}{ext}"
+        if filename:
+            file_handler = RotatingFileHandler(
+                filename,
+                maxBytes=LOG_CONFIG.get("max_bytes", 10 * 1024 * 1024),
+                backupCount=LOG_CONFIG.get("backup_count", 5),
+                encoding="utf-8"
+            )
+            if LOG_CONFIG.get("json", True):
+                file_handler.setFormatter(JsonFormatter())
+            else:
+                file_handler.setFormatter(logging.Formatter(LOG_CONFIG["format"]))
+            handlers.append(file_handler)
+        if console:
+            stream_handler = logging.StreamHandler(sys.stderr)
+            stream_handler.setFormatter(logging.Formatter(LOG_CONFIG["format"]))
+            handlers.append(stream_handler)
+
+        rate_limit = LOG_CONFIG.get("rate_limit", {})
+        _queue_handler = QueueHandler(queue.SimpleQueue())
+        _queue_handler.addFilter(ContextFilter())
+        _queue_handler.addFilter(RateLimitFilter(
+            interval=rate_limit.get("interval", 60),
+            burst=rate_limit.get("burst", 5)
+        ))
+
+        root = logging.getLogger()
+        root.setLevel(getattr(logging, level or LOG_CONFIG["level"]))
+        root.addHandler(_queue_handler)
+
+        _listener = QueueListener(_queue_handler.queue, *handlers, respect_handler_level=True)
+        _listener.start()
+
+
+def shutdown_logging():
+    """停止后台写日志线程，写出队列中剩余的日志"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+群成员紧凑表示
+十万人级别的群同步时，不保留接口返回的原始字典，也不预先构造全部写入记录：
+成员用 __slots__ 对象保存，重复出现的租户、ID类型字符串驻留共享，写入记录按批次生成
+"""
+
+import sys
+from typing import Dict, Iterable, Iterator, Optional
+
+from sinks import build_member_fields
+
+
+class MemberRecord:
+    """单个群成员
+
+    兼容原始字典的 get() 访问，调用方无需区分两种表示。
+    """
+
+    __slots__ = ("member_id", "member_id_type", "name", "tenant_key")
+
+    def __init__(self, member_id: str, member_id_type: str = "", name: str = "", tenant_key: str = ""):
+        self.member_id = member_id
+        self.member_id_type = member_id_type
+        self.name = name
+        self.tenant_key = tenant_key
+
+    @classmethod
+    def from_item(cls, item: Dict) -> Optional["MemberRecord"]:
+        """由群成员接口返回的条目构造，没有成员ID时返回 None"""
+        member_id = item.get("member_id")
+        if not member_id:
+            return None
+        tenant_key = item.get("tenant_key", "")
+        return cls(
+            member_id,
+            sys.intern(item.get("member_id_type", "")),
+            item.get("name", ""),
+            sys.intern(tenant_key) if tenant_key else ""
+        )
+
+    def get(self, key: str, default=None):
+        if key in self.__slots__:
+            return getattr(self, key)
+        return default
+
+    def to_dict(self) -> Dict[str, str]:
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __repr__(self) -> str:
+        return f"MemberRecord({self.member_id!r}, tenant_key={self.tenant_key!r})"
+
+
+def iter_member_payloads(members: Iterable[MemberRecord], target_fields: Dict, chat_name: str) -> Iterator[Dict]:
+    """逐条生成多维表格记录，由 add_bitable_records 按批消费，同一时间只存在一批 payload"""
+    for member in members:
+        yield {"fields": build_member_fields(target_fields, member.member_id, chat_name, member.tenant_key)}
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跨群成员去重聚合
+将多个群的成员流式合并，按成员去重后每人只生成一条记录
+"""
+
+import sys
+from typing import Dict, Iterator, List, Tuple
+
+
+class MemberUnion:
+    """跨群成员并集
+
+    成员ID和群均驻留为整数下标，每个成员所属的群用一个整数位图表示，
+    内存占用只与去重后的成员数和群数相关。
+    """
+
+    def __init__(self):
+        self._member_index: Dict[str, int] = {}
+        self._member_ids: List[str] = []
+        self._tenant_keys: List[str] = []
+        self._chat_bits: List[int] = []
+        self._chat_index: Dict[str, int] = {}
+        self.chat_names: List[str] = []
+        # 累计的 (成员, 群) 关系数，用于计算重叠系数
+        self.membership_count = 0
+
+    def add_chat(self, chat_id: str, chat_name: str) -> int:
+        """登记一个群，返回群下标"""
+        chat_idx = self._chat_index.get(chat_id)
+        if chat_idx is None:
+            chat_idx = len(self.chat_names)
+            self._chat_index[chat_id] = chat_idx
+            self.chat_names.append(sys.intern(chat_name))
+        return chat_idx
+
+    def add_member(self, chat_idx: int, member_id: str, tenant_key: str = ""):
+        """记录成员属于某个群"""
+        member_idx = self._member_index.get(member_id)
+        if member_idx is None:
+            member_idx = len(self._member_ids)
+            self._member_index[member_id] = member_idx
+            self._member_ids.append(member_id)
+            self._tenant_keys.append(sys.intern(tenant_key) if tenant_key else "")
+            self._chat_bits.append(0)
+        elif tenant_key and not self._tenant_keys[member_idx]:
+            self._tenant_keys[member_idx] = sys.intern(tenant_key)
+
+        bit = 1 << chat_idx
+        if not self._chat_bits[member_idx] & bit:
+            self._chat_bits[member_idx] |= bit
+            self.membership_count += 1
+
+    def __len__(self) -> int:
+        return len(self._member_ids)
+
+    @property
+    def overlap_factor(self) -> float:
+        """每个成员平均所在的群数，即按群逐条写入时的记录放大倍数"""
+        if not self._member_ids:
+            return 0.0
+        return self.membership_count / len(self._member_ids)
+
+    def chat_names_of(self, bits: int) -> List[str]:
+        """将群位图还原为群名称列表（按登记顺序）"""
+        names = []
+        chat_idx = 0
+        while bits:
+            if bits & 1:
+                names.append(self.chat_names[chat_idx])
+            bits >>= 1
+            chat_idx += 1
+        return names
+
+    def iter_members(self) -> Iterator[Tuple[str, str, List[str]]]:
+        """逐个返回 (member_id, tenant_key, 所在群名称列表)"""
+        for member_id, tenant_key, bits in zip(self._member_ids, self._tenant_keys, self._chat_bits):
+            yield member_id, tenant_key, self.chat_names_of(bits)
+
+
+def build_union_records(union: MemberUnion, target_fields: Dict) -> Iterator[Dict]:
+    """按去重后的成员逐条生成多维表格记录，群字段写入该成员所在的全部群
+
+    记录按需生成，写入时每次只构造一批。
+    """
+    member_field = target_fields.get("member")
+    groups_field = target_fields.get("groups") or target_fields.get("chat_name")
+    tenant_field = target_fields.get("tenant")
+
+    for member_id, tenant_key, chat_names in union.iter_members():
+        fields_data = {}
+
+        if member_field:
+            if member_field.get("type") == 11:  # 人员字段
+                fields_data[member_field.get("field_name")] = [{"id": member_id}]
+            else:  # 文本字段
+                fields_data[member_field.get("field_name")] = member_id
+
+        if groups_field:
+            if groups_field.get("type") == 4:  # 多选字段
+                fields_data[groups_field.get("field_name")] = chat_names
+            else:  # 文本字段
+                fields_data[groups_field.get("field_name")] = "、".join(chat_names)
+
+        if tenant_field and tenant_key:
+            fields_data[tenant_field.get("field_name")] = tenant_key
+
+        yield {"fields": fields_data}
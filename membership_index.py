@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+群成员反向索引
+每次完整获取一个群的成员后更新本地索引，查询某个成员在哪些群、某个群有哪些成员时不再调用飞书接口。
+成员ID驻留为整数，每个群的成员保存为有序的 uint32 数组（posting list），持久化在 SQLite 中；
+每个进程在内存中维护 群 → 成员 和 成员 → 群 两个方向的有序数组，按版本号增量刷新
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional
+
+from coordination import CoordinationDB
+
+logger = logging.getLogger(__name__)
+
+# 索引数据库路径，多个 worker 和命令行同步共用
+MEMBERSHIP_DB = os.getenv("MEMBERSHIP_DB", "membership.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS members (
+    id INTEGER PRIMARY KEY,
+    member_id TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS chats (
+    id INTEGER PRIMARY KEY,
+    chat_id TEXT NOT NULL UNIQUE,
+    chat_name TEXT NOT NULL DEFAULT '',
+    members BLOB NOT NULL,
+    member_count INTEGER NOT NULL,
+    synced_at REAL NOT NULL,
+    version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chats_version ON chats (version);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def _posting(values: Iterable[int]) -> array:
+    """有序、去重的 uint32 数组"""
+    return array("I", sorted(set(values)))
+
+
+def _contains(posting: array, value: int) -> bool:
+    i = bisect_left(posting, value)
+    return i < len(posting) and posting[i] == value
+
+
+class MembershipIndex:
+    """成员 ↔ 群 倒排索引（线程安全，多进程通过 SQLite 共享）"""
+
+    def __init__(self, path: str = MEMBERSHIP_DB):
+        self.path = path
+        self.db = CoordinationDB(path, _SCHEMA)
+        self._lock = threading.RLock()
+
+        # 整数下标 <-> 成员ID
+        self._member_ids: List[str] = []
+        self._member_index: Dict[str, int] = {}
+        self._max_member = 0
+        # 群下标 -> (chat_id, 群名称, 同步时间)，chat_id -> 群下标
+        self._chats: Dict[int, tuple] = {}
+        self._chat_index: Dict[str, int] = {}
+        # 群下标 -> 有序成员下标；成员下标 -> 有序群下标
+        self._chat_members: Dict[int, array] = {}
+        self._member_chats: Dict[int, array] = {}
+        self._version = -1
+        # 获取群信息时记下的群名称，更新索引时写入
+        self._chat_names: Dict[str, str] = {}
+        self.refresh()
+
+    def connection(self) -> sqlite3.Connection:
+        return self.db.connection()
+
+    def _db_version(self, conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else 0
+
+    def _load_members(self, conn: sqlite3.Connection):
+        """加载其他进程新驻留的成员ID"""
+        for member, member_id in conn.execute(
+                "SELECT id, member_id FROM members WHERE id > ? ORDER BY id", (self._max_member,)):
+            # 下标从 1 开始，与 SQLite 的 rowid 一致
+            while len(self._member_ids) < member:
+                self._member_ids.append("")
+            self._member_ids[member - 1] = member_id
+            self._member_index[member_id] = member
+            self._max_member = member
+
+    def _apply_chat(self, chat: int, chat_id: str, chat_name: str, synced_at: float, members: array):
+        """用新的成员列表替换群的 posting list，并同步更新反向索引"""
+        old = self._chat_members.get(chat, array("I"))
+        old_set, new_set = set(old), set(members)
+        for member in old_set - new_set:
+            chats = self._member_chats[member]
+            del chats[bisect_left(chats, chat)]
+            if not chats:
+                del self._member_chats[member]
+        for member in new_set - old_set:
+            chats = self._member_chats.setdefault(member, array("I"))
+            chats.insert(bisect_left(chats, chat), chat)
+        self._chat_members[chat] = members
+        self._chats[chat] = (chat_id, chat_name, synced_at)
+        self._chat_index[chat_id] = chat
+
+    def refresh(self):
+        """加载其他进程写入的更新（版本号未变化时只需一次查询）"""
+        conn = self.connection()
+        with self._lock:
+            version = self._db_version(conn)
+            if version == self._version:
+                return
+            self._load_members(conn)
+            rows = conn.execute(
+                "SELECT id, chat_id, chat_name, synced_at, members FROM chats WHERE version > ?", (self._version,)
+            ).fetchall()
+            for chat, chat_id, chat_name, synced_at, blob in rows:
+                members = array("I")
+                members.frombytes(blob)
+                self._apply_chat(chat, chat_id, chat_name, synced_at, members)
+            self._version = version
+
+    def note_chat_name(self, chat_id: str, chat_name: str):
+        """记下群名称，下次更新该群时写入索引"""
+        self._chat_names[chat_id] = chat_name
+
+    def update_chat(self, chat_id: str, member_ids: Iterable[str], chat_name: Optional[str] = None):
+        """用一个群的完整成员列表更新索引"""
+        member_ids = list(member_ids)
+        chat_name = chat_name or self._chat_names.get(chat_id, "")
+        with self._lock:
+            with self.db.transaction() as conn:
+                self._load_members(conn)
+                new_ids = {member_id for member_id in member_ids if member_id not in self._member_index}
+                if new_ids:
+                    conn.executemany("INSERT INTO members (member_id) VALUES (?)", [(m,) for m in new_ids])
+                    self._load_members(conn)
+                members = _posting(self._member_index[member_id] for member_id in member_ids)
+                version = self._db_version(conn) + 1
+                now = time.time()
+                conn.execute(
+                    "INSERT INTO chats (chat_id, chat_name, members, member_count, synced_at, version) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(chat_id) DO UPDATE SET "
+                    "chat_name = CASE WHEN excluded.chat_name != '' THEN excluded.chat_name ELSE chat_name END, "
+                    "members = excluded.members, member_count = excluded.member_count, "
+                    "synced_at = excluded.synced_at, version = excluded.version",
+                    (chat_id, chat_name, members.tobytes(), len(members), now, version)
+                )
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (version,))
+            # 先应用其他进程的更新，再应用本次更新
+            self.refresh()
+        logger.info(f"成员索引已更新: 群 {chat_name or chat_id} {len(members)} 人")
+
+    def chats_of(self, member_id: str) -> List[Dict]:
+        """成员所在的群（只包含已同步过的群）"""
+        self.refresh()
+        with self._lock:
+            member = self._member_index.get(member_id)
+            chats = self._member_chats.get(member, ()) if member else ()
+            return [
+                {"chat_id": chat_id, "chat_name": chat_name, "synced_at": synced_at}
+                for chat_id, chat_name, synced_at in (self._chats[chat] for chat in chats)
+            ]
+
+    def members_of(self, chat_id: str, offset: int = 0, limit: Optional[int] = None) -> Optional[Dict]:
+        """群成员（按驻留顺序分页），群未同步过时返回 None"""
+        self.refresh()
+        with self._lock:
+            chat = self._chat_index.get(chat_id)
+            if chat is None:
+                return None
+            _, chat_name, synced_at = self._chats[chat]
+            members = self._chat_members[chat]
+            end = len(members) if limit is None else offset + limit
+            return {
+                "chat_id": chat_id,
+                "chat_name": chat_name,
+                "synced_at": synced_at,
+                "member_count": len(members),
+                "members": [self._member_ids[member - 1] for member in members[offset:end]]
+            }
+
+    def is_member(self, member_id: str, chat_id: str) -> bool:
+        self.refresh()
+        with self._lock:
+            member = self._member_index.get(member_id)
+            chat = self._chat_index.get(chat_id)
+            return bool(member and chat is not None and _contains(self._chat_members[chat], member))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "chats": len(self._chats),
+                "members": len(self._member_chats),
+                "memberships": sum(len(members) for members in self._chat_members.values()),
+                "version": self._version
+            }
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化写入队列（outbox）
+同步任务只把待写入的记录放入本地 SQLite 队列，由后台写入线程按 (app_token, table_id)
+攒满一批（500 条）再调用 batch_create；不满一批的记录排队超过 max_age_seconds 后也会写出。
+多个小群同步到同一张表时写入调用数降到最少，服务重启后未写出的记录继续写入
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import fastjson
+from config import API_CONFIG
+from circuit_breaker import CircuitOpenError
+from coordination import CoordinationDB
+from sinks import MemberSink, build_member_fields
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_id TEXT NOT NULL,
+    app_token TEXT NOT NULL,
+    table_id TEXT NOT NULL,
+    fields TEXT NOT NULL,
+    task_id TEXT,
+    enqueued_at REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    claimed_by TEXT,
+    claimed_until REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_target ON outbox (status, app_id, app_token, table_id, id);
+"""
+
+# 写入目标：(app_id, app_token, table_id)
+Target = Tuple[str, str, str]
+
+
+def outbox_config() -> Dict:
+    """写入队列配置（config.py 未配置时使用默认值）"""
+    config = API_CONFIG.get("outbox", {})
+    return {
+        "enabled": config.get("enabled", False),
+        "max_age_seconds": config.get("max_age_seconds", 5),
+        "poll_interval": config.get("poll_interval", 0.5),
+        "lease_seconds": config.get("lease_seconds", 120),
+        "max_attempts": config.get("max_attempts", 5),
+        "dead_retention_days": config.get("dead_retention_days", 7)
+    }
+
+
+class Outbox:
+    """SQLite 中的待写入记录队列，多个 worker 进程共享
+
+    取出的批次带租约（claimed_until），写入进程崩溃时租约到期后由其他写入线程重新取出。
+    超过最大尝试次数的 dead 记录保留 dead_retention_days 天供排查（GET /outbox 计数），之后在写入失败时顺带删除。
+    """
+
+    def __init__(self, db: CoordinationDB, lease_seconds: float = 120, max_attempts: int = 5,
+                 dead_retention_days: float = 7):
+        self.db = db
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.dead_retention_days = dead_retention_days
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.db.connection().executescript(_SCHEMA)
+
+    def enqueue(self, app_id: str, app_token: str, table_id: str, records: Iterable[Dict],
+                task_id: Optional[str] = None) -> int:
+        """加入待写入的记录（{"fields": ...}），返回加入的条数"""
+        now = time.time()
+        rows = [
+            (app_id, app_token, table_id, fastjson.dumps(record["fields"]).decode("utf-8"), task_id, now)
+            for record in records
+        ]
+        if rows:
+            with self.db.transaction() as conn:
+                conn.executemany(
+                    "INSERT INTO outbox (app_id, app_token, table_id, fields, task_id, enqueued_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+        return len(rows)
+
+    def claim(self, batch_size: int, max_age: float, app_ids: Iterable[str],
+              force: bool = False) -> Optional[Tuple[Target, List[int], List[Dict]]]:
+        """取出一批待写入的记录：优先攒满 batch_size 的目标，其次排队超过 max_age 的目标
+
+        force 为 True 时不满一批也取出。只取 app_ids 中有写入客户端的目标，没有可写入的批次时返回 None。
+        """
+        app_ids = list(app_ids)
+        if not app_ids:
+            return None
+        now = time.time()
+        placeholders = ",".join("?" * len(app_ids))
+        with self.db.transaction() as conn:
+            targets = conn.execute(
+                "SELECT app_id, app_token, table_id, COUNT(*), MIN(enqueued_at) FROM outbox "
+                f"WHERE status = 'pending' AND claimed_until < ? AND app_id IN ({placeholders}) "
+                "GROUP BY app_id, app_token, table_id ORDER BY COUNT(*) DESC",
+                (now, *app_ids)
+            ).fetchall()
+            target = next(
+                (row[:3] for row in targets if force or row[3] >= batch_size or row[4] <= now - max_age),
+                None
+            )
+            if target is None:
+                return None
+            rows = conn.execute(
+                "SELECT id, fields FROM outbox WHERE status = 'pending' AND claimed_until < ? "
+                "AND app_id = ? AND app_token = ? AND table_id = ? ORDER BY id LIMIT ?",
+                (now, *target, batch_size)
+            ).fetchall()
+            ids = [row[0] for row in rows]
+            conn.executemany(
+                "UPDATE outbox SET claimed_by = ?, claimed_until = ? WHERE id = ?",
+                [(self.owner, now + self.lease_seconds, row_id) for row_id in ids]
+            )
+        return target, ids, [{"fields": fastjson.loads(row[1])} for row in rows]
+
+    def ack(self, ids: List[int]):
+        """写入成功，删除记录"""
+        with self.db.transaction() as conn:
+            conn.executemany("DELETE FROM outbox WHERE id = ?", [(row_id,) for row_id in ids])
+
+    def release(self, ids: List[int], error: str, retry_after: Optional[float] = None, count_attempt: bool = True):
+        """写入失败，退避后重新排队；超过最大尝试次数的记录标记为 dead，不再写入"""
+        with self.db.transaction() as conn:
+            for row_id in ids:
+                row = conn.execute("SELECT attempts FROM outbox WHERE id = ?", (row_id,)).fetchone()
+                if row is None:
+                    continue
+                attempts = row[0] + (1 if count_attempt else 0)
+                status = "dead" if attempts >= self.max_attempts else "pending"
+                delay = retry_after if retry_after is not None else min(2 ** attempts, 300)
+                conn.execute(
+                    "UPDATE outbox SET status = ?, attempts = ?, last_error = ?, claimed_by = NULL, "
+                    "claimed_until = ? WHERE id = ?",
+                    (status, attempts, error[:500], time.time() + delay, row_id)
+                )
+            conn.execute("DELETE FROM outbox WHERE status = 'dead' AND enqueued_at < ?",
+                         (time.time() - self.dead_retention_days * 86400,))
+
+    def stats(self) -> List[Dict]:
+        """各写入目标的待写入和失败记录数"""
+        now = time.time()
+        rows = self.db.connection().execute(
+            "SELECT app_token, table_id, status, COUNT(*), MIN(enqueued_at) FROM outbox "
+            "GROUP BY app_token, table_id, status"
+        ).fetchall()
+        targets: Dict[Tuple[str, str], Dict] = {}
+        for app_token, table_id, status, count, oldest in rows:
+            entry = targets.setdefault(
+                (app_token, table_id),
+                {"app_token": app_token, "table_id": table_id, "pending": 0, "dead": 0, "oldest_seconds": 0}
+            )
+            entry[status] = count
+            if status == "pending":
+                entry["oldest_seconds"] = round(now - oldest, 1)
+        return list(targets.values())
+
+
+class OutboxWriter:
+    """后台写入线程：持续从队列取出批次写入多维表格
+
+    写入需要对应应用的客户端（token），由同步任务通过 register() 登记；
+    重启后在对应应用重新登记前，它的记录保留在队列中。
+    """
+
+    def __init__(self, outbox: Outbox, max_age: float = 5, poll_interval: float = 0.5,
+                 batch_size: Optional[int] = None):
+        self.outbox = outbox
+        self.max_age = max_age
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size or API_CONFIG["batch_size"]
+        self.clients: Dict[str, object] = {}
+        self.write_calls = 0
+        self.records_written = 0
+        self._stop = threading.Event()
+        self._flush = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, api):
+        """登记应用的写入客户端（FeishuAPI）"""
+        self.clients[api.app_id] = api
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="outbox-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30):
+        """停止写入线程（当前批次写完后退出），未写出的记录留在队列中"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def flush_now(self):
+        """下一轮把所有不满一批的记录也写出"""
+        self._flush.set()
+
+    def write_once(self, force: bool = False) -> int:
+        """取出并写入一批记录，返回写入的条数（没有可写入的批次时为 0）"""
+        claimed = self.outbox.claim(self.batch_size, self.max_age, self.clients, force)
+        if claimed is None:
+            return 0
+        (app_id, app_token, table_id), ids, records = claimed
+        api = self.clients[app_id]
+        # 一次取出的记录可能分多批写入（各批 client_token 不同），失败时只重新排队未写入的记录，
+        # 已写入（或已隔离）的批次立即确认，重试不会重复写入
+        row_ids = {id(record): row_id for record, row_id in zip(records, ids)}
+        written: List[int] = []
+        
+        def on_written(batch_records: List[Dict]):
+            written.extend(row_ids[id(record)] for record in batch_records)
+        
+        try:
+            success = api.add_bitable_records(app_token, table_id, records, on_written=on_written)
+        except CircuitOpenError as e:
+            # 熔断不计入尝试次数，熔断结束后重试
+            self.outbox.release(self._ack_written(ids, written), str(e), retry_after=e.retry_after,
+                                count_attempt=False)
+            return 0
+        except Exception as e:
+            remaining = self._ack_written(ids, written)
+            self.outbox.release(remaining, str(e))
+            logger.error(f"写入队列中 {len(remaining)} 条记录写入 {table_id} 失败: {e}")
+            return 0
+        if not success:
+            self.outbox.release(self._ack_written(ids, written), "写入多维表格失败")
+            return 0
+        # 全部成功（含按已知无效成员ID跳过的记录）
+        self.outbox.ack(ids)
+        self.write_calls += 1
+        self.records_written += len(ids)
+        logger.info(f"写入队列: {len(ids)} 条记录已写入 {app_token}/{table_id}")
+        return len(ids)
+
+    def _ack_written(self, ids: List[int], written: List[int]) -> List[int]:
+        """确认已写入的记录，返回需要重新排队的记录ID"""
+        if written:
+            self.outbox.ack(written)
+            self.records_written += len(written)
+            logger.info(f"写入队列: 部分写入，{len(written)} 条记录已写入，其余 {len(ids) - len(written)} 条重新排队")
+        done = set(written)
+        return [row_id for row_id in ids if row_id not in done]
+
+    def drain(self) -> int:
+        """写出所有可写入的记录（包括不满一批的），返回写入的条数"""
+        total = 0
+        while True:
+            written = self.write_once(force=True)
+            if not written:
+                return total
+            total += written
+
+    def _run(self):
+        while not self._stop.is_set():
+            force = self._flush.is_set()
+            try:
+                written = self.write_once(force)
+            except Exception as e:
+                logger.error(f"写入队列处理失败: {e}")
+                written = 0
+            if not written:
+                if force:
+                    self._flush.clear()
+                self._stop.wait(self.poll_interval)
+
+
+class OutboxSink(MemberSink):
+    """写入队列输出目标：成员记录放入 outbox，由后台写入线程攒批写入多维表格"""
+
+    def __init__(self, outbox: Outbox, app_id: str, app_token: str, table_id: str, target_fields: Dict,
+                 task_id: Optional[str] = None):
+        super().__init__()
+        self.outbox = outbox
+        self.app_id = app_id
+        self.app_token = app_token
+        self.table_id = table_id
+        self.target_fields = target_fields
+        self.task_id = task_id
+
+    def write_members(self, chat_id: str, chat_name: str, members: List[Dict]):
+        records = [
+            {"fields": build_member_fields(self.target_fields, member.get("member_id"), chat_name,
+                                           member.get("tenant_key", ""))}
+            for member in members if member.get("member_id")
+        ]
+        self.member_count += self.outbox.enqueue(self.app_id, self.app_token, self.table_id, records, self.task_id)
+
+    def close(self) -> Dict:
+        return {**super().close(), "queued": True}
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+部署前配置检查
+并发检查多组（应用、多维表格、群）目标的应用凭证、多维表格URL、字段访问权限和群聊权限。
+同一应用的检查共用一个 HTTP 会话和 token，多个目标中相同的检查只执行一次，
+每个请求都有超时，整体有总时限，结果为带每项检查耗时的报告（可直接序列化为 JSON）
+"""
+
+import time
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import FEISHU_CONFIG
+from feishu_group_members import FeishuAPI, find_target_fields
+
+logger = logging.getLogger(__name__)
+
+# 检查项，按报告中的顺序
+CHECKS = ("credentials", "bitable_url", "bitable_fields", "chat_list", "chat_members")
+
+# 检查项的中文名称
+CHECK_NAMES = {
+    "credentials": "应用凭证",
+    "bitable_url": "多维表格URL",
+    "bitable_fields": "多维表格权限",
+    "chat_list": "群聊权限",
+    "chat_members": "群成员权限"
+}
+
+# 检查失败时的排查建议
+CHECK_HINTS = {
+    "credentials": "检查App ID和App Secret是否正确",
+    "bitable_url": "检查多维表格URL格式是否正确",
+    "bitable_fields": "检查应用是否有多维表格访问权限，表中是否有人员或文本字段",
+    "chat_list": "检查应用是否有群聊访问权限",
+    "chat_members": "检查群ID是否正确、机器人是否在群内"
+}
+
+
+def default_target() -> Dict:
+    """config.py 中配置的检查目标"""
+    return {
+        "app_id": FEISHU_CONFIG.get("app_id"),
+        "app_secret": FEISHU_CONFIG.get("app_secret"),
+        "bitable_url": FEISHU_CONFIG.get("bitable_url")
+    }
+
+
+# 检查必须实际访问飞书：token 和字段信息都不使用进程内缓存（API 服务预热或其他任务留下的）
+def _check_credentials(api: FeishuAPI) -> Dict:
+    api.get_tenant_access_token(use_cache=False)
+    return {}
+
+
+def _check_bitable_url(api: FeishuAPI, bitable_url: str) -> Dict:
+    app_token, table_id = api.parse_bitable_url(bitable_url)
+    return {"app_token": app_token, "table_id": table_id}
+
+
+def _check_bitable_fields(api: FeishuAPI, app_token: str, table_id: str) -> Dict:
+    fields = api.get_bitable_fields(app_token, table_id, use_cache=False)
+    target_fields = find_target_fields(fields)
+    if "member" not in target_fields:
+        raise Exception(f"共有 {len(fields)} 个字段，未找到人员字段或文本字段")
+    return {
+        "fields": len(fields),
+        **{f"{key}_field": field.get("field_name") for key, field in target_fields.items()}
+    }
+
+
+def _check_chat_list(api: FeishuAPI) -> Dict:
+    return {"chats": len(api.list_chats(page_size=1))}
+
+
+def _check_chat_members(api: FeishuAPI, chat_id: str) -> Dict:
+    # 只取第一页，能读到成员即说明有权限
+    return {"first_page_members": len(next(api.iter_chat_members(chat_id), []))}
+
+
+class Preflight:
+    """一次配置检查
+
+    timeout 为单个请求的超时时间，deadline 为整次检查的总时限（秒），
+    超过总时限仍未完成的检查标记为 timeout。
+    """
+
+    def __init__(self, timeout: float = 5.0, deadline: float = 30.0, workers: int = 16):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.workers = workers
+        self._clients: Dict[Tuple[str, str], FeishuAPI] = {}
+        self._futures: Dict[tuple, Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _client(self, app_id: str, app_secret: str) -> FeishuAPI:
+        """同一应用共用一个客户端（HTTP 会话和 token 缓存）"""
+        key = (app_id, app_secret)
+        if key not in self._clients:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            api = FeishuAPI(app_id, app_secret)
+            api.timeout = self.timeout
+            # 连接池大小与并发数一致，并发检查不会因连接池满而重新建连
+            api.session = requests.Session()
+            api.session.mount("https://", HTTPAdapter(pool_maxsize=self.workers))
+            api.session.mount("http://", HTTPAdapter(pool_maxsize=self.workers))
+            self._clients[key] = api
+        return self._clients[key]
+
+    @staticmethod
+    def _run_check(func: Callable, args: tuple, depends: List[Future]) -> Dict:
+        """执行一项检查，依赖的检查全部通过后才开始计时"""
+        from requests import Timeout
+
+        for dependency in depends:
+            if dependency.result()["status"] != "ok":
+                return {"status": "skipped", "message": "依赖的检查未通过"}
+        start = time.perf_counter()
+        try:
+            result = {"status": "ok", "detail": func(*args)}
+        except Timeout as e:
+            result = {"status": "timeout", "message": str(e)}
+        except Exception as e:
+            result = {"status": "failed", "message": str(e)}
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+    def _submit(self, key: tuple, func: Callable, *args, depends: Optional[List[Future]] = None) -> Future:
+        """提交检查，相同的检查只执行一次"""
+        if key not in self._futures:
+            self._futures[key] = self._executor.submit(self._run_check, func, args, depends or [])
+        return self._futures[key]
+
+    def _run_inline(self, key: tuple, func: Callable, *args) -> Future:
+        """不需要网络的检查在当前线程执行，不在线程池中排在网络请求之后"""
+        if key not in self._futures:
+            future = Future()
+            future.set_result(self._run_check(func, args, []))
+            self._futures[key] = future
+        return self._futures[key]
+
+    def _plan_target(self, target: Dict) -> Dict[str, Future]:
+        """为一个目标提交所需的检查，返回 检查项 -> Future"""
+        app_id, app_secret = target["app_id"], target["app_secret"]
+        api = self._client(app_id, app_secret)
+        checks = {"credentials": self._submit(("credentials", app_id, app_secret), _check_credentials, api)}
+        depends = [checks["credentials"]]
+
+        bitable_url = target.get("bitable_url")
+        if bitable_url:
+            checks["bitable_url"] = self._run_inline(("bitable_url", bitable_url), _check_bitable_url, api, bitable_url)
+            parsed = checks["bitable_url"].result()
+            if parsed["status"] == "ok":
+                app_token, table_id = parsed["detail"]["app_token"], parsed["detail"]["table_id"]
+                checks["bitable_fields"] = self._submit(
+                    ("bitable_fields", app_id, app_token, table_id),
+                    _check_bitable_fields, api, app_token, table_id, depends=depends
+                )
+            else:
+                checks["bitable_fields"] = self._submit(
+                    ("bitable_fields", app_id, bitable_url), _check_bitable_fields, api, "", "",
+                    depends=[checks["bitable_url"]]
+                )
+
+        checks["chat_list"] = self._submit(("chat_list", app_id), _check_chat_list, api, depends=depends)
+        chat_id = target.get("chat_id")
+        if chat_id:
+            checks["chat_members"] = self._submit(
+                ("chat_members", app_id, chat_id), _check_chat_members, api, chat_id, depends=depends
+            )
+        return checks
+
+    def run(self, targets: List[Dict]) -> Dict:
+        """并发检查所有目标，返回检查报告"""
+        start = time.perf_counter()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="preflight")
+        try:
+            planned = [self._plan_target(target) for target in targets]
+            done, not_done = wait(self._futures.values(), timeout=self.deadline)
+        finally:
+            # 超过总时限的检查不再等待
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+        results = []
+        for target, checks in zip(targets, planned):
+            report = {
+                "app_id": target["app_id"],
+                "bitable_url": target.get("bitable_url"),
+                "chat_id": target.get("chat_id"),
+                "checks": {}
+            }
+            for name in CHECKS:
+                if name not in checks:
+                    continue
+                future = checks[name]
+                if future in not_done:
+                    report["checks"][name] = {"status": "timeout", "message": f"超过总时限 {self.deadline} 秒"}
+                else:
+                    report["checks"][name] = future.result()
+            report["ok"] = all(check["status"] == "ok" for check in report["checks"].values())
+            results.append(report)
+
+        return {
+            "ok": all(report["ok"] for report in results),
+            "seconds": round(time.perf_counter() - start, 3),
+            "checks": len(self._futures),
+            "targets": results
+        }
+
+
+def run_preflight(targets: Optional[List[Dict]] = None, timeout: float = 5.0, deadline: float = 30.0,
+                  workers: int = 16) -> Dict:
+    """检查给定目标（默认为 config.py 中的配置），目标为包含 app_id、app_secret、
+    bitable_url（可选）、chat_id（可选）的字典"""
+    return Preflight(timeout, deadline, workers).run(targets or [default_target()])
+
+
+def format_report(report: Dict) -> List[str]:
+    """将检查报告格式化为便于阅读的多行文本"""
+    lines = []
+    for target in report["targets"]:
+        title = f"App ID: {target['app_id']}"
+        if target.get("bitable_url"):
+            title += f"  多维表格: {target['bitable_url']}"
+        if target.get("chat_id"):
+            title += f"  群: {target['chat_id']}"
+        lines.append(title)
+        hints = []
+        for name, check in target["checks"].items():
+            icon = {"ok": "✅", "skipped": "⏭️ "}.get(check["status"], "❌")
+            latency = f" ({check['latency_ms']} ms)" if "latency_ms" in check else ""
+            message = f": {check['message']}" if check.get("message") else ""
+            lines.append(f"  {icon} {CHECK_NAMES[name]}{latency}{message}")
+            if check["status"] in ("failed", "timeout"):
+                hints.append(CHECK_HINTS[name])
+        for hint in hints:
+            lines.append(f"     - {hint}")
+    summary = "🎉 所有配置检查通过！" if report["ok"] else "⚠️  存在配置问题"
+    lines.append(f"{summary}（{len(report['targets'])} 个目标，{report['checks']} 项检查，耗时 {report['seconds']} 秒）")
+    return lines
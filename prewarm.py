@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+API 服务启动预热
+新进程的第一次同步要先获取 tenant_access_token、建立 TLS 连接、加载多维表格字段信息、
+打开本地 SQLite，比之后的同步慢得多。服务启动时在后台对已配置的应用和多维表格完成这些步骤，结果放入
+FeishuAPI 的进程内共享缓存（token、HTTP 会话连接池、字段信息），之后每个任务直接复用。
+预热完成（或超过 timeout 秒）前 /ready 返回 503，负载均衡和容器健康检查据此放行流量
+"""
+
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import API_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 默认配置，可通过 API_CONFIG["prewarm"] 覆盖
+DEFAULT_PREWARM_CONFIG = {
+    "enabled": True,
+    # 预先建立的连接数（HTTP/2 时至少为配置的连接数）
+    "connections": 4,
+    # 预热超时（秒），超时后不再阻塞就绪，未完成的步骤由第一次同步完成
+    "timeout": 30,
+    # 需要预热字段信息的多维表格URL
+    "bitable_urls": []
+}
+
+
+def prewarm_config() -> Dict:
+    config = dict(DEFAULT_PREWARM_CONFIG)
+    config.update(API_CONFIG.get("prewarm", {}))
+    # 环境变量 PREWARM_BITABLE_URLS（逗号分隔）追加到配置的表格列表
+    extra = [url.strip() for url in os.getenv("PREWARM_BITABLE_URLS", "").split(",") if url.strip()]
+    config["bitable_urls"] = list(config["bitable_urls"]) + extra
+    if os.getenv("PREWARM_ENABLED"):
+        config["enabled"] = os.getenv("PREWARM_ENABLED") not in ("0", "false", "")
+    return config
+
+
+def open_connections(session, base_url: str, count: int):
+    """并发发送 count 个 HEAD 请求，连接建立后留在会话的连接池中（响应状态无关紧要）"""
+    count = max(count, len(getattr(session, "connections", [])))
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        list(executor.map(lambda _: session.request("HEAD", base_url, timeout=10), range(count)))
+
+
+class Prewarmer:
+    """后台预热：打开本地存储，逐个应用获取 token、建立连接、加载字段信息"""
+
+    def __init__(self, apps: List[Tuple[str, str]], bitable_urls: List[str],
+                 connections: int = 4, timeout: float = 30):
+        self.apps = apps
+        self.bitable_urls = bitable_urls
+        self.connections = connections
+        self.timeout = timeout
+        self.steps: List[Dict] = []
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        if self._done.is_set():
+            return True
+        return self.started_at is not None and time.time() - self.started_at >= self.timeout
+
+    def start(self):
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="prewarm", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def _step(self, name: str, target: str, func: Callable):
+        start = time.time()
+        step = {"step": name, "target": target, "ok": True}
+        try:
+            func()
+        except Exception as e:
+            # 预热失败不影响服务，第一次同步时重新获取
+            step["ok"] = False
+            step["error"] = str(e)
+            logger.warning(f"预热失败（{name} {target}）: {e}")
+        step["seconds"] = round(time.time() - start, 3)
+        self.steps.append(step)
+
+    def _run(self):
+        import cassette
+        from feishu_group_members import FeishuAPI
+        from quarantine import get_quarantine
+        from sync_history import get_history
+
+        # 本地 SQLite（同步历史、隔离表）首次使用时建表
+        self._step("stores", "sqlite", lambda: (get_history(), get_quarantine()))
+        for app_id, app_secret in self.apps:
+            api = FeishuAPI(app_id, app_secret)
+            self._step("token", app_id, api.get_tenant_access_token)
+            # 回放流量时不访问网络，不需要建立连接
+            if self.connections and not cassette.REPLAY_PATH:
+                self._step("connections", app_id,
+                           lambda: open_connections(FeishuAPI.shared_session(), api.base_url, self.connections))
+            for url in self.bitable_urls:
+                self._step("schema", url, lambda: api.get_bitable_fields(*api.parse_bitable_url(url)))
+        self.finished_at = time.time()
+        self._done.set()
+        failed = sum(1 for step in self.steps if not step["ok"])
+        logger.info(f"预热完成: {len(self.steps)} 个步骤，失败 {failed} 个，"
+                    f"耗时 {self.finished_at - self.started_at:.2f} 秒")
+
+    def snapshot(self) -> Dict:
+        if self._done.is_set():
+            status = "ready"
+        elif self.ready:
+            status = "timed_out"
+        else:
+            status = "warming"
+        end = self.finished_at or time.time()
+        return {
+            "ready": self.ready,
+            "status": status,
+            "seconds": round(end - self.started_at, 3) if self.started_at else 0,
+            "steps": list(self.steps)
+        }
+
+
+def create_prewarmer() -> Optional[Prewarmer]:
+    """按配置创建预热（关闭时为 None）；应用凭证来自环境变量 FEISHU_APP_ID、FEISHU_APP_SECRET"""
+    config = prewarm_config()
+    if not config["enabled"]:
+        return None
+    apps = []
+    if os.getenv("FEISHU_APP_ID") and os.getenv("FEISHU_APP_SECRET"):
+        apps.append((os.getenv("FEISHU_APP_ID"), os.getenv("FEISHU_APP_SECRET")))
+    return Prewarmer(apps, config["bitable_urls"], config["connections"], config["timeout"])
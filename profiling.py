@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+同步性能剖析
+按需对一次同步做 cProfile 或采样剖析，并记录每个飞书请求的 DNS、建连、TLS、首字节耗时，
+输出 pstats、speedscope JSON 和网络耗时 JSON，用于区分本地 CPU 开销与飞书接口延迟
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import threading
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# 剖析结果目录
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+# 剖析方式：cprofile 确定性剖析，sample 定时采样调用栈（开销小）；all_threads=True 时两者都覆盖剖析期间新建的线程
+PROFILE_MODES = ("cprofile", "sample")
+
+# 剖析产物类型 -> 文件后缀
+PROFILE_ARTIFACTS = {
+    "pstats": ".pstats",
+    "speedscope": ".speedscope.json",
+    "network": ".network.json"
+}
+
+# 当前线程正在进行的请求的分阶段耗时，由连接对象写入
+_local = threading.local()
+
+
+def artifact_path(name: str, kind: str, output_dir: Optional[str] = None) -> str:
+    """剖析产物文件路径"""
+    return os.path.join(output_dir or PROFILE_DIR, f"{name}{PROFILE_ARTIFACTS[kind]}")
+
+
+def _phases() -> Optional[Dict]:
+    return getattr(_local, "phases", None)
+
+
+class _TimedConnectionMixin:
+    """记录 DNS、建连、TLS、发送与首字节耗时的连接"""
+
+    def _new_conn(self):
+        phases = _phases()
+        if phases is None:
+            return super()._new_conn()
+
+        host = self._dns_host
+        start = time.perf_counter()
+        try:
+            # 先单独解析域名以拆出 DNS 耗时，解析失败时交给 urllib3 按原逻辑报错
+            address = socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM)[0][4][0]
+        except OSError:
+            address = None
+        resolved = time.perf_counter()
+        if address:
+            self._dns_host = address
+        try:
+            sock = super()._new_conn()
+        finally:
+            self._dns_host = host
+        phases["dns"] = resolved - start
+        phases["connect"] = time.perf_counter() - resolved
+        phases["reused"] = False
+        return sock
+
+    def connect(self):
+        phases = _phases()
+        start = time.perf_counter()
+        super().connect()
+        if phases is not None and isinstance(self, HTTPSConnection):
+            # HTTPS 的 connect 包含建连和 TLS 握手
+            phases["tls"] = max(time.perf_counter() - start - phases["dns"] - phases["connect"], 0.0)
+
+    def request(self, *args, **kwargs):
+        phases = _phases()
+        start = time.perf_counter()
+        super().request(*args, **kwargs)
+        if phases is not None:
+            phases["send"] = time.perf_counter() - start
+
+    def getresponse(self, *args, **kwargs):
+        phases = _phases()
+        start = time.perf_counter()
+        response = super().getresponse(*args, **kwargs)
+        if phases is not None:
+            phases["ttfb"] = time.perf_counter() - start
+        return response
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class NetworkRecorder:
+    """收集每个请求的分阶段耗时"""
+
+    def __init__(self):
+        self.entries: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def record(self, entry: Dict):
+        with self._lock:
+            self.entries.append(entry)
+
+    def summary(self) -> Dict:
+        """汇总各阶段总耗时和请求耗时分布"""
+        with self._lock:
+            entries = list(self.entries)
+        totals = sorted(entry["total"] for entry in entries)
+        summary = {
+            "requests": len(entries),
+            "new_connections": sum(1 for entry in entries if not entry["reused"]),
+            "errors": sum(1 for entry in entries if entry["status"] is None or entry["status"] >= 400)
+        }
+        for phase in ("total", "dns", "connect", "tls", "send", "ttfb", "download"):
+            summary[f"{phase}_seconds"] = round(sum(entry[phase] for entry in entries), 4)
+        if totals:
+            summary["p50_seconds"] = round(totals[len(totals) // 2], 4)
+            summary["p95_seconds"] = round(totals[max(int(len(totals) * 0.95) - 1, 0)], 4)
+        return summary
+
+
+class TimingAdapter(HTTPAdapter):
+    """为每个请求记录分阶段耗时的 requests 适配器"""
+
+    def __init__(self, recorder: NetworkRecorder, **kwargs):
+        self.recorder = recorder
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool
+        }
+
+    def send(self, request, **kwargs):
+        phases = {"dns": 0.0, "connect": 0.0, "tls": 0.0, "send": 0.0, "ttfb": 0.0, "reused": True}
+        _local.phases = phases
+        status = None
+        start = time.perf_counter()
+        try:
+            response = super().send(request, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            total = time.perf_counter() - start
+            _local.phases = None
+            parsed = urlparse(request.url)
+            connection = phases["dns"] + phases["connect"] + phases["tls"]
+            self.recorder.record({
+                "method": request.method,
+                "host": parsed.netloc,
+                "path": parsed.path,
+                "status": status,
+                "start": start,
+                "total": total,
+                "dns": phases["dns"],
+                "connect": phases["connect"],
+                "tls": phases["tls"],
+                "send": phases["send"],
+                "ttfb": phases["ttfb"],
+                # 读取响应体及 requests 自身的处理
+                "download": max(total - connection - phases["send"] - phases["ttfb"], 0.0),
+                "reused": phases["reused"]
+            })
+
+
+class SyncProfiler:
+    """一次同步的剖析器，作为上下文管理器包住同步过程
+
+    默认只剖析进入上下文的线程；all_threads=True 时还剖析期间新建的线程（多维表格写入线程、并发写入批次的线程池、
+    分片模式的写入线程等），日志等已有的后台线程不剖析。cprofile 为每个新线程创建一个 cProfile.Profile，
+    退出时合并到同一个 pstats（Python 3.12+ 的 cProfile 本身覆盖所有线程）；退出时仍在运行的线程不计入。
+    网络耗时需要调用 instrument(api) 挂到 FeishuAPI 的会话上。
+    """
+
+    def __init__(self, name: str, mode: str = "cprofile", output_dir: Optional[str] = None,
+                 all_threads: bool = False, interval: float = 0.005):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"不支持的剖析方式: {mode}，可选: {', '.join(PROFILE_MODES)}")
+        self.name = name
+        self.mode = mode
+        self.output_dir = output_dir or PROFILE_DIR
+        self.all_threads = all_threads
+        self.interval = interval
+        self.network = NetworkRecorder()
+        self.artifacts: Dict[str, str] = {}
+        self._profile = None
+        self._stats = None
+        self._thread_profiles: List[tuple] = []
+        self._thread_lock = threading.Lock()
+        self._sampler = None
+        self._stop = threading.Event()
+        self._frames: Dict[tuple, int] = {}
+        self._samples: Dict[int, tuple] = {}
+        self._thread_names: Dict[int, str] = {}
+        self._summary: Dict = {}
+
+    def instrument(self, api):
+        """在 FeishuAPI 的会话上挂载计时适配器（HTTP/2 会话不支持，不记录网络耗时）"""
+        if api.session is None:
+            from http_transport import create_session
+            api.session = create_session()
+        if not hasattr(api.session, "mount"):
+            return
+        adapter = TimingAdapter(self.network)
+        api.session.mount("https://", adapter)
+        api.session.mount("http://", adapter)
+
+    def __enter__(self):
+        self._thread_id = threading.get_ident()
+        self._excluded = {thread.ident for thread in threading.enumerate()} - {self._thread_id}
+        if self.mode == "cprofile":
+            import cProfile
+            self._profile = cProfile.Profile()
+            try:
+                self._profile.enable()
+            except ValueError:
+                # 同一进程已有其他剖析在运行（Python 3.12+ 全局只允许一个），改用采样
+                logger.warning("已有其他 cProfile 剖析在运行，改用采样剖析")
+                self._profile = None
+                self.mode = "sample"
+            else:
+                if self.all_threads and sys.version_info < (3, 12):
+                    threading.setprofile(self._profile_thread)
+        if self.mode == "sample":
+            self._sampler = threading.Thread(target=self._sample, name="profile-sampler", daemon=True)
+            self._sampler.start()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.thread_time()
+        self._process_cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall_start
+        cpu = time.thread_time() - self._cpu_start
+        process_cpu = time.process_time() - self._process_cpu_start
+        if self._profile is not None:
+            self._profile.disable()
+            if self.all_threads and sys.version_info < (3, 12):
+                threading.setprofile(None)
+            self._stats = self._merge_profiles()
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        network = self.network.summary()
+        if self._profile is not None:
+            self.artifacts["pstats"] = artifact_path(self.name, "pstats", self.output_dir)
+            self._stats.dump_stats(self.artifacts["pstats"])
+            top_functions = self._top_cprofile()
+        else:
+            self.artifacts["speedscope"] = artifact_path(self.name, "speedscope", self.output_dir)
+            with open(self.artifacts["speedscope"], "w", encoding="utf-8") as f:
+                json.dump(self._speedscope(), f, ensure_ascii=False)
+            top_functions = self._top_samples()
+
+        self.artifacts["network"] = artifact_path(self.name, "network", self.output_dir)
+        with open(self.artifacts["network"], "w", encoding="utf-8") as f:
+            json.dump({"summary": network, "requests": self.network.entries}, f, ensure_ascii=False, indent=2)
+
+        self._summary = {
+            "mode": self.mode,
+            "wall_seconds": round(wall, 4),
+            # 剖析线程自身的 CPU 时间（本地解析、构造记录等）
+            "cpu_seconds": round(cpu, 4),
+            "process_cpu_seconds": round(process_cpu, 4),
+            # 等待飞书接口的时间
+            "network_seconds": network["total_seconds"],
+            # 其余为限流休眠、锁等待等
+            "idle_seconds": round(max(wall - cpu - network["total_seconds"], 0.0), 4),
+            "network": network,
+            "top_functions": top_functions,
+            "artifacts": dict(self.artifacts)
+        }
+        return False
+
+    def _profile_thread(self, frame, event, arg):
+        """threading.setprofile 钩子：新线程的第一个事件时换成该线程自己的 cProfile"""
+        import cProfile
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        with self._thread_lock:
+            self._thread_profiles.append((threading.current_thread(), profile))
+        try:
+            profile.enable()
+        except ValueError:
+            pass
+
+    def _merge_profiles(self):
+        """合并进入上下文的线程和已结束的新线程的剖析数据"""
+        import pstats
+        stats = pstats.Stats(self._profile)
+        with self._thread_lock:
+            thread_profiles, self._thread_profiles = self._thread_profiles, []
+        running = 0
+        for thread, profile in thread_profiles:
+            if thread.is_alive():
+                running += 1
+                continue
+            stats.add(profile)
+        if running:
+            logger.warning(f"剖析结束时仍有 {running} 个新建线程在运行，未计入 pstats")
+        return stats
+
+    def summary(self) -> Dict:
+        """剖析结果汇总（退出上下文后可用）"""
+        return self._summary
+
+    def format_summary(self) -> List[str]:
+        """剖析结果的可读摘要"""
+        s = self._summary
+        network = s["network"]
+        lines = [
+            f"剖析结果（{s['mode']}）: 总耗时 {s['wall_seconds']:.2f} 秒，本地 CPU {s['cpu_seconds']:.2f} 秒，"
+            f"网络 {s['network_seconds']:.2f} 秒，休眠/等待 {s['idle_seconds']:.2f} 秒",
+            f"  请求 {network['requests']} 次（新建连接 {network['new_connections']} 次）: "
+            f"DNS {network['dns_seconds']:.3f}s，建连 {network['connect_seconds']:.3f}s，"
+            f"TLS {network['tls_seconds']:.3f}s，首字节 {network['ttfb_seconds']:.3f}s，"
+            f"下载 {network['download_seconds']:.3f}s"
+        ]
+        for item in s["top_functions"][:5]:
+            lines.append(f"  {item['self_seconds']:8.3f}s  {item['function']}")
+        for kind, path in s["artifacts"].items():
+            lines.append(f"  {kind}: {path}")
+        return lines
+
+    def _top_cprofile(self, limit: int = 20) -> List[Dict]:
+        stats = self._stats.stats
+        top = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+        return [
+            {
+                "function": f"{func} ({os.path.basename(filename)}:{line})",
+                "calls": calls,
+                "self_seconds": round(self_time, 4),
+                "cumulative_seconds": round(cumulative, 4)
+            }
+            for (filename, line, func), (_, calls, self_time, cumulative, _) in top
+        ]
+
+    def _sample(self):
+        sampler_id = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight = now - last
+            last = now
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_id or thread_id in self._excluded:
+                    continue
+                if not self.all_threads and thread_id != self._thread_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    key = (code.co_name, code.co_filename, code.co_firstlineno)
+                    index = self._frames.get(key)
+                    if index is None:
+                        index = self._frames[key] = len(self._frames)
+                    stack.append(index)
+                    frame = frame.f_back
+                stack.reverse()
+                if thread_id not in self._thread_names:
+                    # 线程结束后无法再查到名称，首次采样时记录
+                    self._thread_names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                samples, weights = self._samples.setdefault(thread_id, ([], []))
+                samples.append(stack)
+                weights.append(weight)
+
+    def _speedscope(self) -> Dict:
+        frames = [None] * len(self._frames)
+        for (name, filename, line), index in self._frames.items():
+            frames[index] = {"name": name, "file": filename, "line": line}
+        profiles = []
+        for thread_id, (samples, weights) in self._samples.items():
+            profiles.append({
+                "type": "sampled",
+                "name": self._thread_names.get(thread_id, str(thread_id)),
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights
+            })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.name,
+            "exporter": "chat_to_base",
+            "shared": {"frames": frames},
+            "profiles": profiles
+        }
+
+    def _top_samples(self, limit: int = 20) -> List[Dict]:
+        names = {index: f"{name} ({os.path.basename(filename)}:{line})"
+                 for (name, filename, line), index in self._frames.items()}
+        self_time: Dict[int, float] = {}
+        for samples, weights in self._samples.values():
+            for stack, weight in zip(samples, weights):
+                if stack:
+                    self_time[stack[-1]] = self_time.get(stack[-1], 0.0) + weight
+        top = sorted(self_time.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [{"function": names[index], "self_seconds": round(seconds, 4)} for index, seconds in top]
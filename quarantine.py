@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+无效记录隔离
+batch_create 中只要有一条记录的字段值无效（如人员字段中的外部或跨租户成员ID，错误码 1254066），整批都会被拒绝。
+被拒绝的批次递归二分，定位出的无效记录写入隔离表（QUARANTINE_DB），其余记录照常写入，
+一批中 k 条无效记录约多 2k·log2(批大小) 次请求。人员字段中无效的成员ID记为已知无效，
+之后的同步写入前直接过滤，recheck_days 天后重新尝试（例如成员加入租户、应用开通权限之后）
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+import fastjson
+from config import API_CONFIG
+from coordination import CoordinationDB
+
+logger = logging.getLogger(__name__)
+
+# 隔离表路径，命令行和 API 服务共用
+QUARANTINE_DB = os.getenv("QUARANTINE_DB", "quarantine.db")
+
+# 默认配置，可通过 API_CONFIG["quarantine"] 覆盖
+DEFAULT_QUARANTINE_CONFIG = {
+    "enabled": True,
+    # 已知无效的成员ID多少天后重新尝试写入
+    "recheck_days": 7,
+    # 隔离记录保留天数
+    "retention_days": 30
+}
+
+# 字段值转换失败（文本、数字、单选、多选、日期、复选框、人员、关联、超链接、附件），整批被拒绝，二分后可定位到具体记录
+RECORD_ERROR_CODES = frozenset(range(1254060, 1254070))
+# 人员字段转换失败：成员ID不属于本租户或应用不可见
+USER_FIELD_ERROR = 1254066
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS quarantined_records (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_id TEXT NOT NULL,
+    table_id TEXT NOT NULL,
+    member_ids TEXT NOT NULL,
+    code INTEGER NOT NULL,
+    msg TEXT,
+    fields TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quarantined_records_table ON quarantined_records (table_id, id);
+CREATE TABLE IF NOT EXISTS bad_member_ids (
+    app_id TEXT NOT NULL,
+    member_id TEXT NOT NULL,
+    code INTEGER NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (app_id, member_id)
+);
+"""
+
+
+def quarantine_config() -> Dict:
+    config = dict(DEFAULT_QUARANTINE_CONFIG)
+    config.update(API_CONFIG.get("quarantine", {}))
+    return config
+
+
+def person_ids(fields: Dict) -> List[str]:
+    """记录中人员字段（[{"id": ...}]）的成员ID"""
+    ids = []
+    for value in fields.values():
+        if isinstance(value, list):
+            ids.extend(item["id"] for item in value if isinstance(item, dict) and item.get("id"))
+    return ids
+
+
+class Quarantine:
+    """隔离的无效记录与已知无效的成员ID（多个线程、进程通过 SQLite 共享）"""
+
+    def __init__(self, path: str = QUARANTINE_DB, config: Optional[Dict] = None):
+        self.path = path
+        self.config = config or quarantine_config()
+        self.db = CoordinationDB(path, _SCHEMA, row_factory=sqlite3.Row)
+
+    def connection(self) -> sqlite3.Connection:
+        return self.db.connection()
+
+    def add(self, app_id: str, table_id: str, record: Dict, code: int, msg: str):
+        """隔离一条被拒绝的记录；人员字段错误时其中的成员ID记为已知无效"""
+        now = time.time()
+        fields = record.get("fields", {})
+        member_ids = person_ids(fields)
+        conn = self.connection()
+        conn.execute(
+            "INSERT INTO quarantined_records (app_id, table_id, member_ids, code, msg, fields, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (app_id, table_id, ",".join(member_ids), code, msg, fastjson.dumps(fields).decode("utf-8"), now)
+        )
+        if code == USER_FIELD_ERROR:
+            conn.executemany(
+                "INSERT INTO bad_member_ids (app_id, member_id, code, first_seen, last_seen) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (app_id, member_id) DO UPDATE SET last_seen = excluded.last_seen",
+                [(app_id, member_id, code, now, now) for member_id in member_ids]
+            )
+        conn.execute("DELETE FROM quarantined_records WHERE created_at < ?",
+                     (now - self.config["retention_days"] * 86400,))
+
+    def known_bad(self, app_id: str) -> Set[str]:
+        """最近 recheck_days 天内确认无效的成员ID"""
+        since = time.time() - self.config["recheck_days"] * 86400
+        rows = self.connection().execute(
+            "SELECT member_id FROM bad_member_ids WHERE app_id = ? AND last_seen >= ?", (app_id, since)
+        )
+        return {row[0] for row in rows}
+
+    def note_skipped(self, app_id: str, member_ids: Iterable[str]):
+        """记录写入前被过滤的次数（不延长重新尝试的时间）"""
+        self.connection().executemany(
+            "UPDATE bad_member_ids SET skipped = skipped + 1 WHERE app_id = ? AND member_id = ?",
+            [(app_id, member_id) for member_id in member_ids]
+        )
+
+    def entries(self, table_id: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """最近隔离的记录（新的在前）"""
+        sql = "SELECT * FROM quarantined_records"
+        params: list = []
+        if table_id:
+            sql += " WHERE table_id = ?"
+            params.append(table_id)
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        entries = []
+        for row in self.connection().execute(sql, params):
+            entry = dict(row)
+            entry["member_ids"] = entry["member_ids"].split(",") if entry["member_ids"] else []
+            entry["fields"] = fastjson.loads(entry["fields"])
+            entries.append(entry)
+        return entries
+
+    def stats(self) -> Dict:
+        conn = self.connection()
+        since = time.time() - self.config["recheck_days"] * 86400
+        return {
+            "quarantined_records": conn.execute("SELECT COUNT(*) FROM quarantined_records").fetchone()[0],
+            "known_bad_ids": conn.execute("SELECT COUNT(*) FROM bad_member_ids WHERE last_seen >= ?",
+                                          (since,)).fetchone()[0],
+            "skipped": conn.execute("SELECT COALESCE(SUM(skipped), 0) FROM bad_member_ids").fetchone()[0],
+            "recheck_days": self.config["recheck_days"]
+        }
+
+
+_quarantine: Optional[Quarantine] = None
+_quarantine_lock = threading.Lock()
+
+
+def get_quarantine() -> Optional[Quarantine]:
+    """进程内共享的隔离表（配置关闭时为 None）"""
+    global _quarantine
+    if not quarantine_config()["enabled"]:
+        return None
+    with _quarantine_lock:
+        if _quarantine is None:
+            _quarantine = Quarantine()
+        return _quarantine
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+运行时配置
+限流、批大小、并发、超时和缓存有效期等调优参数不重启即可修改。来源按优先级从低到高：
+config.py 中的值 < 环境变量 FEISHU_<参数名>（如 FEISHU_BATCH_SIZE、FEISHU_ADAPTIVE_WRITES__MAX_CONCURRENCY）
+< 覆盖文件 RUNTIME_CONFIG_FILE（JSON，修改后自动重新加载）< API 服务的管理接口（写入覆盖文件，所有 worker 生效）。
+新值整体校验通过后才写入共享的 API_CONFIG / LOG_CONFIG，进行中的同步在下一次读取配置时使用新值
+（下一页、下一批），已创建的写入控制器、全局限流额度等由监听函数同步更新
+"""
+
+import os
+import sys
+import json
+import logging
+import tempfile
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from config import API_CONFIG, LOG_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# 覆盖文件路径和检查间隔（秒）
+CONFIG_FILE = os.getenv("RUNTIME_CONFIG_FILE")
+POLL_INTERVAL = float(os.getenv("RUNTIME_CONFIG_POLL_INTERVAL", 2))
+
+ENV_PREFIX = "FEISHU_"
+LOG_LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR")
+
+
+class Knob(NamedTuple):
+    """可调参数：类型、取值范围，以及 config.py 中没有该项时代码使用的默认值"""
+    type: type
+    minimum: Optional[float] = None
+    maximum: Optional[float] = None
+    default: object = None
+
+
+# 参数名中的 . 表示 API_CONFIG 中的分组（如 adaptive_writes.max_concurrency）
+KNOBS: Dict[str, Knob] = {
+    # 限流
+    "request_interval": Knob(float, 0, 10),
+    "write_interval": Knob(float, 0, 10, 0.2),
+    "global_rate_limit": Knob(float, 0, 1000, 50),
+    # 批大小（飞书单次批量写入和分页上限为 500）
+    "batch_size": Knob(int, 1, 500),
+    "adaptive_writes.min_batch_size": Knob(int, 1, 500),
+    "adaptive_writes.batch_step": Knob(int, 1, 500),
+    # 并发
+    "adaptive_writes.max_concurrency": Knob(int, 1, 32),
+    "shard_workers": Knob(int, 1, 32, 4),
+    "cleanup_workers": Knob(int, 1, 32, 4),
+    "diff_workers": Knob(int, 1, 32, 1),
+    # 超时与重试（request_timeout 为 0 时不限制）
+    "request_timeout": Knob(float, 0, 600, 0),
+    "adaptive_writes.write_timeout": Knob(float, 1, 600),
+    "adaptive_writes.latency_target": Knob(float, 0.1, 60),
+    "adaptive_writes.max_retries": Knob(int, 0, 10),
+    # 缓存有效期：token 提前刷新时间、多维表格字段信息缓存时间（0 表示不缓存）、写入队列攒批时间
+    "token_refresh_advance": Knob(int, 0, 3600),
+    "schema_cache_ttl": Knob(int, 0, 86400, 300),
+    "outbox.max_age_seconds": Knob(float, 0, 300),
+    "outbox.poll_interval": Knob(float, 0.05, 60),
+    # 日志级别（LOG_CONFIG["level"]）
+    "log_level": Knob(str)
+}
+
+
+def _section_defaults(section: str) -> Dict:
+    # 分组的完整配置（含模块默认值），config.py 由流水线生成时可能不含这些分组
+    if section == "adaptive_writes":
+        from adaptive import adaptive_config
+        return adaptive_config()
+    if section == "outbox":
+        from outbox import outbox_config
+        return outbox_config()
+    return dict(API_CONFIG.get(section, {}))
+
+
+def current_value(name: str):
+    """参数当前生效的值（config.py 中没有该项时为代码使用的默认值）"""
+    if name == "log_level":
+        return LOG_CONFIG.get("level", "INFO")
+    if "." in name:
+        section, key = name.split(".", 1)
+        return _section_defaults(section).get(key)
+    return API_CONFIG.get(name, KNOBS[name].default)
+
+
+# config.py 中没有该项
+_MISSING = object()
+
+
+def _raw_value(name: str):
+    # 配置字典中的原始值，不解析模块默认值（不导入 adaptive、outbox）
+    if name == "log_level":
+        return LOG_CONFIG.get("level", _MISSING)
+    if "." in name:
+        section, key = name.split(".", 1)
+        return API_CONFIG.get(section, {}).get(key, _MISSING)
+    return API_CONFIG.get(name, _MISSING)
+
+
+def _set_value(name: str, value):
+    # value 为 _MISSING 时删除该项，恢复为代码默认值
+    if name == "log_level":
+        if value is _MISSING:
+            LOG_CONFIG.pop("level", None)
+        else:
+            LOG_CONFIG["level"] = value
+        logging.getLogger().setLevel(getattr(logging, current_value(name)))
+    elif "." in name:
+        # 分组整体替换，读取方拿到的要么是旧分组要么是新分组
+        section, key = name.split(".", 1)
+        updated = {k: v for k, v in API_CONFIG.get(section, {}).items() if k != key}
+        if value is not _MISSING:
+            updated[key] = value
+        API_CONFIG[section] = updated
+    elif value is _MISSING:
+        API_CONFIG.pop(name, None)
+    else:
+        API_CONFIG[name] = value
+
+
+def flatten(overrides: Dict) -> Dict:
+    """{"adaptive_writes": {"max_concurrency": 2}} 展开为 {"adaptive_writes.max_concurrency": 2}"""
+    result = {}
+    for key, value in overrides.items():
+        if isinstance(value, dict):
+            result.update({f"{key}.{k}": v for k, v in flatten(value).items()})
+        else:
+            result[key] = value
+    return result
+
+
+def validate(overrides: Dict) -> Dict:
+    """校验并转换参数值，有任何一项无效时抛出 ValueError（列出所有问题），不做部分修改"""
+    result, errors = {}, []
+    for name, value in flatten(overrides).items():
+        knob = KNOBS.get(name)
+        if knob is None:
+            errors.append(f"未知参数: {name}")
+            continue
+        if name == "log_level":
+            if str(value).upper() not in LOG_LEVELS:
+                errors.append(f"log_level 可选: {', '.join(LOG_LEVELS)}")
+            else:
+                result[name] = str(value).upper()
+            continue
+        try:
+            if isinstance(value, bool):
+                raise ValueError
+            converted = knob.type(value)
+            if knob.type is int and isinstance(value, float) and value != converted:
+                raise ValueError
+        except (TypeError, ValueError):
+            errors.append(f"{name} 必须是{'整数' if knob.type is int else '数字'}: {value!r}")
+            continue
+        if (knob.minimum is not None and converted < knob.minimum) or \
+                (knob.maximum is not None and converted > knob.maximum):
+            errors.append(f"{name} 必须在 {knob.minimum} 到 {knob.maximum} 之间: {value!r}")
+            continue
+        result[name] = converted
+    if errors:
+        raise ValueError("；".join(errors))
+    return result
+
+
+def env_name(name: str) -> str:
+    return ENV_PREFIX + name.upper().replace(".", "__")
+
+
+class RuntimeConfig:
+    """运行时配置的各个来源与生效值（线程安全）"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.version = 0
+        self._lock = threading.RLock()
+        self._listeners: List[Callable[[Dict[str, Tuple]], None]] = []
+        # config.py 中的值（覆盖项删除后恢复为该值）
+        self._baseline = {name: _raw_value(name) for name in KNOBS}
+        self._layers: Dict[str, Dict] = {"env": {}, "file": {}, "admin": {}}
+        self._file_stamp = None
+        self._last_changes: Dict[str, Tuple] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_listener(self, callback: Callable[[Dict[str, Tuple]], None]):
+        """参数变化时调用 callback({参数名: (旧值, 新值)})"""
+        self._listeners.append(callback)
+
+    def load_env(self):
+        """读取环境变量中的参数，无效的值记录错误后忽略"""
+        values = {}
+        for name in KNOBS:
+            raw = os.getenv(env_name(name))
+            if raw is None:
+                continue
+            try:
+                values.update(validate({name: raw}))
+            except ValueError as e:
+                logger.error(f"环境变量 {env_name(name)} 无效，已忽略: {e}")
+        with self._lock:
+            self._layers["env"] = values
+            self._apply()
+
+    def _read_file(self) -> Dict:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            text = f.read()
+        data = json.loads(text) if text.strip() else {}
+        if not isinstance(data, dict):
+            raise ValueError("覆盖文件内容必须是 JSON 对象")
+        return data
+
+    def reload_file(self, force: bool = False) -> bool:
+        """覆盖文件变化时重新加载；文件无效时保留之前的值。返回是否重新加载"""
+        if not self.path:
+            return False
+        try:
+            stat = os.stat(self.path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+        with self._lock:
+            if stamp == self._file_stamp and not force:
+                return False
+            self._file_stamp = stamp
+            try:
+                values = validate(self._read_file())
+            except ValueError as e:
+                logger.error(f"运行时配置文件无效，保持当前配置: {self.path}: {e}")
+                return False
+            self._layers["file"] = values
+            self._apply()
+            return True
+
+    def update(self, overrides: Dict) -> Dict:
+        """管理接口修改参数（值为 None 时删除覆盖项，恢复为低优先级来源的值），返回变化的参数
+
+        配置了覆盖文件时写入文件（所有 worker 在下一次检查时生效），否则只修改本进程。
+        """
+        overrides = flatten(overrides)
+        removed = [name for name, value in overrides.items() if value is None]
+        unknown = [name for name in removed if name not in KNOBS]
+        if unknown:
+            raise ValueError(f"未知参数: {', '.join(unknown)}")
+        values = validate({name: value for name, value in overrides.items() if value is not None})
+
+        with self._lock:
+            if self.path:
+                with _file_lock(self.path):
+                    merged = validate(self._read_file())
+                    merged.update(values)
+                    for name in removed:
+                        merged.pop(name, None)
+                    _write_json(self.path, merged)
+                self.reload_file(force=True)
+                return self._last_changes
+
+            layer = {**self._layers["admin"], **values}
+            for name in removed:
+                layer.pop(name, None)
+            self._layers["admin"] = layer
+            return self._apply()
+
+    def _effective(self) -> Dict[str, Tuple]:
+        # 参数名 -> (值, 来源)
+        result = {name: (value, "config") for name, value in self._baseline.items()}
+        for source in ("env", "file", "admin"):
+            for name, value in self._layers[source].items():
+                result[name] = (value, source)
+        return result
+
+    def _apply(self) -> Dict[str, Tuple]:
+        changed = {}
+        for name, (value, source) in self._effective().items():
+            if value == _raw_value(name):
+                continue
+            old = current_value(name)
+            _set_value(name, value)
+            new = current_value(name)
+            if new == old:
+                continue
+            changed[name] = (old, new)
+            logger.info(f"运行时配置 {name}: {old} -> {new}（来源 {source}）")
+        self._last_changes = changed
+        if not changed:
+            return changed
+        self.version += 1
+        # 已创建的写入控制器按新参数调整（进行中的批次不受影响）
+        if "adaptive" in sys.modules and any(
+                name in ("batch_size", "write_interval") or name.startswith("adaptive_writes.") for name in changed):
+            sys.modules["adaptive"].reconfigure_controllers()
+        for callback in list(self._listeners):
+            try:
+                callback(changed)
+            except Exception as e:
+                logger.warning(f"运行时配置监听函数执行失败: {e}")
+        return changed
+
+    def snapshot(self) -> Dict:
+        """各参数的生效值、来源和取值范围"""
+        with self._lock:
+            effective = self._effective()
+            return {
+                "file": self.path,
+                "version": self.version,
+                "knobs": {
+                    name: {
+                        "value": current_value(name),
+                        "source": effective[name][1],
+                        "minimum": knob.minimum,
+                        "maximum": knob.maximum,
+                        "env": env_name(name)
+                    }
+                    for name, knob in KNOBS.items()
+                }
+            }
+
+    def start(self, watch: bool = True):
+        """读取环境变量和覆盖文件，配置了覆盖文件时启动后台检查线程"""
+        self.load_env()
+        self.reload_file(force=True)
+        if watch and self.path and self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="runtime-config", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _watch(self):
+        while not self._stop.wait(POLL_INTERVAL):
+            try:
+                self.reload_file()
+            except Exception as e:
+                logger.warning(f"检查运行时配置文件失败: {e}")
+
+
+class _file_lock:
+    """覆盖文件的跨进程写锁（多个 worker 同时修改时不丢失更新）；不支持 fcntl 的平台只有进程内互斥"""
+
+    def __init__(self, path: str):
+        self.path = path + ".lock"
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            import fcntl
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        except ImportError:
+            pass
+        return self
+
+    def __exit__(self, *exc):
+        os.close(self._fd)
+
+
+def _write_json(path: str, data: Dict):
+    # 先写临时文件再替换，检查线程不会读到写了一半的文件
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix=".runtime_config_", dir=directory)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+_runtime_config: Optional[RuntimeConfig] = None
+_runtime_config_lock = threading.Lock()
+
+
+def get_runtime_config() -> RuntimeConfig:
+    """进程内共享的运行时配置"""
+    global _runtime_config
+    with _runtime_config_lock:
+        if _runtime_config is None:
+            _runtime_config = RuntimeConfig(CONFIG_FILE)
+        return _runtime_config
+
+
+def add_listener(callback: Callable[[Dict[str, Tuple]], None]):
+    get_runtime_config().add_listener(callback)
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大群分片同步
+按成员ID的稳定哈希或租户把成员记录分散到多个数据表，按需创建分片表，
+用本地路由索引记录每个分片的数据表和内容摘要，增量同步时只处理内容变化的分片
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import hashlib
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+
+from config import API_CONFIG
+from sinks import build_member_fields
+from sync_planner import cell_text
+
+logger = logging.getLogger(__name__)
+
+# 分片方式：hash 按成员ID哈希，tenant 按租户哈希（同一租户的成员在同一分片）
+SHARD_STRATEGIES = ("hash", "tenant")
+
+# 路由索引目录
+SHARD_INDEX_DIR = os.getenv("SHARD_INDEX_DIR", "shard_index")
+
+# 一条成员记录：(成员ID, 群名称, 租户)
+MemberKey = Tuple[str, str, str]
+
+
+def shard_of(member_id: str, tenant_key: str, strategy: str, shard_count: int) -> int:
+    """计算成员所属分片（crc32 在不同进程和版本间保持稳定）"""
+    key = tenant_key if strategy == "tenant" else member_id
+    return zlib.crc32(key.encode("utf-8")) % shard_count
+
+
+def shard_table_name(source_name: str, shard: int) -> str:
+    """分片表名称"""
+    return f"{source_name}_分片{shard + 1:02d}"
+
+
+def shard_digest(keys: Set[MemberKey]) -> str:
+    """分片内容摘要，与记录顺序无关"""
+    digest = hashlib.sha1()
+    for key in sorted(keys):
+        digest.update("\t".join(key).encode("utf-8"))
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def chat_set_key(chat_ids: List[str]) -> str:
+    """一组群在路由索引中的键：同一张表可以分别同步多组群，各组的摘要和记录互不影响"""
+    return ",".join(sorted(set(chat_ids)))
+
+
+def index_path(app_token: str, table_id: str, directory: Optional[str] = None) -> str:
+    """路由索引文件路径"""
+    return os.path.join(directory or SHARD_INDEX_DIR, f"{app_token}_{table_id}.json")
+
+
+def load_shard_index(app_token: str, table_id: str, directory: Optional[str] = None) -> Dict:
+    """读取路由索引，不存在时返回空索引"""
+    path = index_path(app_token, table_id, directory)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    return {"app_token": app_token, "source_table_id": table_id, "chat_sets": {}, "shards": {}}
+
+
+def save_shard_index(index: Dict, directory: Optional[str] = None):
+    """写入路由索引（先写临时文件再替换，避免写到一半的索引）"""
+    path = index_path(index["app_token"], index["source_table_id"], directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def shard_table_fields(target_fields: Dict) -> List[Dict]:
+    """分片表的字段定义，与源表的目标字段一致
+
+    文本字段排在前面，作为新表的索引列（人员字段不能作为索引列）。
+    """
+    fields = [target_fields[key] for key in ("member", "chat_name", "tenant") if key in target_fields]
+    fields.sort(key=lambda f: f.get("type") != 1)
+    return [{"field_name": f.get("field_name"), "type": f.get("type")} for f in fields]
+
+
+def collect_shard_members(api, chat_ids: List[str], strategy: str,
+                          shard_count: int) -> Tuple[List[Set[MemberKey]], List[str]]:
+    """逐页获取所有群成员并分配到各个分片"""
+    shards: List[Set[MemberKey]] = [set() for _ in range(shard_count)]
+    chat_names = []
+    for chat_id in chat_ids:
+        chat_info = api.get_chat_info(chat_id)
+        chat_name = chat_info.get("name", "未知群聊")
+        chat_names.append(chat_name)
+        logger.info(f"开始获取群成员: {chat_name} ({chat_id})")
+
+        member_count = 0
+        for members in api.iter_chat_members(chat_id):
+            for member in members:
+                member_id = member.get("member_id")
+                if not member_id:
+                    continue
+                tenant_key = sys.intern(member.get("tenant_key", ""))
+                shards[shard_of(member_id, tenant_key, strategy, shard_count)].add((member_id, chat_name, tenant_key))
+                member_count += 1
+        logger.info(f"群 {chat_name} 共 {member_count} 个成员")
+    return shards, chat_names
+
+
+def sync_shard(api, app_token: str, table_id: str, target_fields: Dict, desired: Set[MemberKey],
+               chat_names: Set[str]) -> Dict:
+    """同步单个分片表：新增缺少的记录，删除多余和重复的记录，其余记录不动
+
+    只处理群名称属于 chat_names 的记录，同一分片表中其他群的记录保持不变
+    （没有群名称字段时无法区分，分片表中的所有记录都按本次的群处理）。
+    """
+    member_field = target_fields["member"]
+    chat_name_field = target_fields.get("chat_name")
+    tenant_field = target_fields.get("tenant")
+    field_names = [f.get("field_name") for f in (member_field, chat_name_field, tenant_field) if f]
+    # 表中没有群名称或租户字段时，这一列不参与比对
+    wanted: Dict[MemberKey, MemberKey] = {}
+    for member_id, chat_name, tenant_key in desired:
+        compared = (member_id, chat_name if chat_name_field else "", tenant_key if tenant_field else "")
+        wanted[compared] = (member_id, chat_name, tenant_key)
+
+    existing: Set[MemberKey] = set()
+    stale_ids = []
+    for records in api.iter_bitable_records(app_token, table_id, field_names):
+        for record in records:
+            fields = record.get("fields", {})
+            key = (
+                cell_text(fields.get(member_field.get("field_name"))),
+                cell_text(fields.get(chat_name_field.get("field_name"))) if chat_name_field else "",
+                cell_text(fields.get(tenant_field.get("field_name"))) if tenant_field else ""
+            )
+            if chat_name_field and key[1] not in chat_names:
+                continue
+            if key in existing or key not in wanted:
+                stale_ids.append(record["record_id"])
+            else:
+                existing.add(key)
+
+    additions = [
+        {"fields": build_member_fields(target_fields, member_id, chat_name, tenant_key)}
+        for member_id, chat_name, tenant_key in sorted(wanted[key] for key in wanted.keys() - existing)
+    ]
+    if stale_ids and not api.delete_bitable_records(app_token, table_id, stale_ids):
+        raise Exception(f"删除分片表 {table_id} 的记录失败")
+    if additions and not api.add_bitable_records(app_token, table_id, additions):
+        raise Exception(f"写入分片表 {table_id} 失败")
+    return {"added": len(additions), "deleted": len(stale_ids), "unchanged": len(existing)}
+
+
+def sync_sharded(api, app_token: str, table_id: str, chat_ids: List[str], target_fields: Dict,
+                 shard_count: int, strategy: str = "hash", index_dir: Optional[str] = None) -> Dict:
+    """分片同步群成员，返回每个分片的处理结果
+
+    源表只用作字段模板，成员记录写入同一多维表格中的分片表（按需创建）。
+    内容摘要与路由索引一致的分片直接跳过；分片数或分片方式变化时所有分片重新比对，
+    多出来的旧分片中本组群的记录会被清空。摘要按群组（chat_ids）分别记录，
+    同一张表先后同步不同的群时只比对、增删本组群的记录。
+    """
+    if strategy not in SHARD_STRATEGIES:
+        raise ValueError(f"不支持的分片方式: {strategy}，可选: {', '.join(SHARD_STRATEGIES)}")
+    if shard_count < 1:
+        raise ValueError("分片数必须大于 0")
+
+    # 预先获取 token，避免并发写入时重复请求
+    api.get_tenant_access_token()
+    tables = {table.get("name"): table.get("table_id") for table in api.list_bitable_tables(app_token)}
+    source_name = next((name for name, tid in tables.items() if tid == table_id), table_id)
+
+    index = load_shard_index(app_token, table_id, index_dir)
+    layout_changed = index.get("strategy") != strategy or index.get("shard_count") != shard_count
+    old_shards = index.get("shards", {})
+    set_key = chat_set_key(chat_ids)
+    chat_sets = index.get("chat_sets", {})
+
+    shard_members, chat_names = collect_shard_members(api, chat_ids, strategy, shard_count)
+    # 本组群的记录按群名称识别；包括上次同步时的群名称，群改名后旧名称的记录也会被删除
+    owned_names = set(chat_names) | set(chat_sets.get(set_key, {}).get("chat_names", []))
+    # 缩减分片数时，多出来的旧分片按空分片处理
+    old_count = max((int(shard) + 1 for shard in old_shards), default=0)
+    shard_members.extend(set() for _ in range(shard_count, old_count))
+
+    jobs = []
+    results = []
+    for shard, desired in enumerate(shard_members):
+        digest = shard_digest(desired)
+        entry = old_shards.get(str(shard), {})
+        name = shard_table_name(source_name, shard)
+        shard_table_id = tables.get(name) or entry.get("table_id")
+        if shard_table_id and not layout_changed and entry.get("digests", {}).get(set_key) == digest:
+            results.append({"shard": shard, "table_id": shard_table_id, "records": len(desired), "skipped": True})
+            continue
+        if not shard_table_id:
+            if not desired:
+                continue
+            # 建表是结构变更，逐个执行
+            shard_table_id = api.create_bitable_table(app_token, name, shard_table_fields(target_fields))
+        jobs.append((shard, name, shard_table_id, desired, digest))
+
+    logger.info(f"共 {len(shard_members)} 个分片，{len(jobs)} 个需要同步，{len(results)} 个未变化")
+
+    def run(job):
+        shard, name, shard_table_id, desired, digest = job
+        counts = sync_shard(api, app_token, shard_table_id, target_fields, desired, owned_names)
+        logger.info(
+            f"分片 {name}: 新增 {counts['added']} 条，删除 {counts['deleted']} 条，"
+            f"未变 {counts['unchanged']} 条"
+        )
+        return counts
+
+    errors = []
+    # 分片方式变化后其他群组的摘要不再有效，下次同步时重新比对（旧版索引只有一个摘要，同样重新比对）
+    new_shards = {}
+    for shard, entry in old_shards.items():
+        if int(shard) >= shard_count:
+            continue
+        records = entry.get("records")
+        new_shards[shard] = {
+            "table_id": entry.get("table_id"),
+            "table_name": entry.get("table_name"),
+            "digests": {} if layout_changed else dict(entry.get("digests", {})),
+            "records": dict(records) if isinstance(records, dict) and not layout_changed else {},
+            "synced_at": entry.get("synced_at")
+        }
+    max_workers = min(API_CONFIG.get("shard_workers", 4), len(jobs)) or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # 写入线程沿用当前上下文（日志的 task_id、调度通道等）
+        futures = [(job, executor.submit(contextvars.copy_context().run, run, job)) for job in jobs]
+        for (shard, name, shard_table_id, desired, digest), future in futures:
+            try:
+                counts = future.result()
+            except Exception as e:
+                logger.error(f"分片 {name} 同步失败: {e}")
+                errors.append(f"{name}: {e}")
+                # 失败的分片不记录本组群的摘要，下次同步时重新比对
+                if str(shard) in new_shards:
+                    new_shards[str(shard)]["digests"].pop(set_key, None)
+                continue
+            results.append({"shard": shard, "table_id": shard_table_id, "records": len(desired),
+                            "skipped": False, **counts})
+            if shard < shard_count:
+                entry = new_shards.get(str(shard), {})
+                new_shards[str(shard)] = {
+                    "table_id": shard_table_id,
+                    "table_name": name,
+                    "digests": {**entry.get("digests", {}), set_key: digest},
+                    "records": {**entry.get("records", {}), set_key: len(desired)},
+                    "synced_at": time.strftime("%Y-%m-%d %H:%M:%S")
+                }
+
+    chat_sets[set_key] = {"chat_ids": sorted(set(chat_ids)), "chat_names": chat_names}
+    index.pop("chat_ids", None)
+    index.update({
+        "strategy": strategy,
+        "shard_count": shard_count,
+        "chat_sets": chat_sets,
+        "shards": dict(sorted(new_shards.items(), key=lambda item: int(item[0])))
+    })
+    save_shard_index(index, index_dir)
+
+    if errors:
+        raise Exception(f"{len(errors)} 个分片同步失败: {'; '.join(errors)}")
+
+    results.sort(key=lambda result: result["shard"])
+    return {
+        "chat_names": chat_names,
+        "members": sum(len(members) for members in shard_members[:shard_count]),
+        "shard_count": shard_count,
+        "strategy": strategy,
+        "touched": len(jobs),
+        "skipped": sum(1 for result in results if result["skipped"]),
+        "shards": results
+    }
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+群成员输出目标
+群成员按页流式写入输出目标：多维表格、CSV、JSONL 或 Parquet 文件
+"""
+
+import os
+import abc
+import csv
+import queue
+import logging
+import threading
+import contextvars
+from typing import Callable, Dict, Iterator, List, Optional
+
+import fastjson
+
+logger = logging.getLogger(__name__)
+
+# 导出文件的列
+EXPORT_COLUMNS = ["chat_id", "chat_name", "member_id", "member_id_type", "name", "tenant_key"]
+
+# 支持的输出目标
+SINK_TYPES = ("bitable", "csv", "jsonl", "parquet")
+
+# 文件输出目标每批缓存的行数
+EXPORT_BATCH_ROWS = 5000
+
+
+def build_member_fields(target_fields: Dict, member_id: str, chat_name: str, tenant_key: str) -> Dict:
+    """按目标字段构造一条成员记录的 fields"""
+    fields_data = {}
+
+    # 成员字段
+    member_field = target_fields.get("member")
+    if member_field:
+        if member_field.get("type") == 11:  # 人员字段
+            fields_data[member_field.get("field_name")] = [{"id": member_id}]
+        else:  # 文本字段
+            fields_data[member_field.get("field_name")] = member_id
+
+    # 群名称字段
+    chat_name_field = target_fields.get("chat_name")
+    if chat_name_field:
+        fields_data[chat_name_field.get("field_name")] = chat_name
+
+    # 租户字段 - 使用群成员API返回的tenant_key
+    tenant_field = target_fields.get("tenant")
+    if tenant_field and tenant_key:
+        fields_data[tenant_field.get("field_name")] = tenant_key
+
+    return fields_data
+
+
+class MemberSink(abc.ABC):
+    """成员输出目标基类"""
+
+    def __init__(self):
+        self.chat_names: List[str] = []
+        self.member_count = 0
+
+    def begin_chat(self, chat_id: str, chat_name: str):
+        """开始写入一个群的成员"""
+        self.chat_names.append(chat_name)
+
+    @abc.abstractmethod
+    def write_members(self, chat_id: str, chat_name: str, members: List[Dict]):
+        """写入一页群成员"""
+
+    def close(self) -> Dict:
+        """写入剩余数据并返回汇总信息"""
+        return {"chats": len(self.chat_names), "chat_names": self.chat_names, "members": self.member_count}
+
+    def abort(self):
+        """出错时释放资源，不再写出缓存的数据"""
+
+
+class BitableSink(MemberSink):
+    """多维表格输出目标
+
+    所有成员记录作为一个流交给一次 add_bitable_records 调用（在后台写入线程中），
+    由该表的自适应控制器决定批大小和并发写入数，获取下一页成员的同时前面的批次在并发写入。
+    每页成员放入有界队列，写入跟不上时阻塞获取，内存占用与群大小无关。
+    """
+
+    # 队列中最多缓存的成员页数
+    max_pending_pages = 4
+
+    def __init__(self, api, app_token: str, table_id: str, target_fields: Dict):
+        super().__init__()
+        self.api = api
+        self.app_token = app_token
+        self.table_id = table_id
+        self.target_fields = target_fields
+        self._queue: "queue.Queue[Optional[List[Dict]]]" = queue.Queue(maxsize=self.max_pending_pages)
+        self._thread: Optional[threading.Thread] = None
+        self._aborted = threading.Event()
+        self._success: Optional[bool] = None
+        self._error: Optional[BaseException] = None
+
+    def _build_record(self, member: Dict, chat_name: str) -> Optional[Dict]:
+        member_id = member.get("member_id")
+        if not member_id:
+            return None
+        return {"fields": build_member_fields(self.target_fields, member_id, chat_name, member.get("tenant_key", ""))}
+
+    def _iter_records(self) -> Iterator[Dict]:
+        while not self._aborted.is_set():
+            records = self._queue.get()
+            if records is None:
+                return
+            yield from records
+
+    def _run_writer(self):
+        try:
+            self._success = self.api.add_bitable_records(self.app_token, self.table_id, self._iter_records())
+        except BaseException as e:
+            self._error = e
+
+    def _check_writer(self):
+        """写入线程提前结束（写入失败）时抛出异常，不再继续获取成员"""
+        if self._error is not None:
+            raise self._error
+        if self._thread is not None and not self._thread.is_alive() and not self._success:
+            raise Exception("写入多维表格失败")
+
+    def write_members(self, chat_id: str, chat_name: str, members: List[Dict]):
+        records = []
+        for member in members:
+            record = self._build_record(member, chat_name)
+            if record:
+                records.append(record)
+        if not records:
+            return
+        self.member_count += len(records)
+        if self._thread is None:
+            # 写入线程沿用当前上下文（日志的 task_id、调度通道等）
+            self._thread = threading.Thread(target=contextvars.copy_context().run, args=(self._run_writer,),
+                                            name="bitable-sink", daemon=True)
+            self._thread.start()
+        while True:
+            self._check_writer()
+            try:
+                self._queue.put(records, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def close(self) -> Dict:
+        if self._thread is not None:
+            while self._thread.is_alive():
+                try:
+                    self._queue.put(None, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+            self._thread.join()
+            self._check_writer()
+        return super().close()
+
+    def abort(self):
+        # 写入线程写完在途的批次后结束，不再取出队列中的记录
+        self._aborted.set()
+        if self._thread is not None:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+            self._thread.join()
+
+
+class FileSink(MemberSink):
+    """文件输出目标基类，按列缓存一批成员后整体写出，内存占用与群大小无关"""
+
+    extension = ""
+
+    def __init__(self, path: str, batch_rows: int = EXPORT_BATCH_ROWS):
+        super().__init__()
+        self.path = path
+        self.batch_rows = batch_rows
+        self._columns: Dict[str, List[str]] = {name: [] for name in EXPORT_COLUMNS}
+        self._buffered = 0
+        self.batch_count = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write_members(self, chat_id: str, chat_name: str, members: List[Dict]):
+        columns = self._columns
+        for member in members:
+            member_id = member.get("member_id")
+            if not member_id:
+                continue
+            columns["chat_id"].append(chat_id)
+            columns["chat_name"].append(chat_name)
+            columns["member_id"].append(member_id)
+            columns["member_id_type"].append(member.get("member_id_type", ""))
+            columns["name"].append(member.get("name", ""))
+            columns["tenant_key"].append(member.get("tenant_key", ""))
+            self._buffered += 1
+            self.member_count += 1
+        if self._buffered >= self.batch_rows:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffered:
+            return
+        self._write_batch(self._columns)
+        self.batch_count += 1
+        self._columns = {name: [] for name in EXPORT_COLUMNS}
+        self._buffered = 0
+
+    @abc.abstractmethod
+    def _write_batch(self, columns: Dict[str, List[str]]):
+        """写出一批按列缓存的成员"""
+
+    def close(self) -> Dict:
+        self._flush()
+        summary = super().close()
+        summary["path"] = self.path
+        summary["batches"] = self.batch_count
+        return summary
+
+
+class CsvSink(FileSink):
+    """CSV 文件输出目标"""
+
+    extension = "csv"
+
+    def __init__(self, path: str, batch_rows: int = EXPORT_BATCH_ROWS):
+        super().__init__(path, batch_rows)
+        # utf-8-sig 便于 Excel 正确识别中文
+        self._file = open(path, "w", encoding="utf-8-sig", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(EXPORT_COLUMNS)
+
+    def _write_batch(self, columns: Dict[str, List[str]]):
+        self._writer.writerows(zip(*(columns[name] for name in EXPORT_COLUMNS)))
+        self._file.flush()
+
+    def close(self) -> Dict:
+        summary = super().close()
+        self._file.close()
+        return summary
+
+    def abort(self):
+        self._file.close()
+
+
+class JsonlSink(FileSink):
+    """JSONL 文件输出目标，每行一个成员"""
+
+    extension = "jsonl"
+
+    def __init__(self, path: str, batch_rows: int = EXPORT_BATCH_ROWS):
+        super().__init__(path, batch_rows)
+        self._file = open(path, "wb")
+
+    def _write_batch(self, columns: Dict[str, List[str]]):
+        lines = [
+            fastjson.dumps(dict(zip(EXPORT_COLUMNS, row)))
+            for row in zip(*(columns[name] for name in EXPORT_COLUMNS))
+        ]
+        self._file.write(b"\n".join(lines) + b"\n")
+        self._file.flush()
+
+    def close(self) -> Dict:
+        summary = super().close()
+        self._file.close()
+        return summary
+
+    def abort(self):
+        self._file.close()
+
+
+class ParquetSink(FileSink):
+    """Parquet 文件输出目标，每批写入一个 row group（需要安装 pyarrow）"""
+
+    extension = "parquet"
+
+    def __init__(self, path: str, batch_rows: int = EXPORT_BATCH_ROWS):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise Exception("导出 Parquet 需要安装 pyarrow: pip install pyarrow")
+        super().__init__(path, batch_rows)
+        self._pa = pyarrow
+        self._schema = pyarrow.schema([(name, pyarrow.string()) for name in EXPORT_COLUMNS])
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+
+    def _write_batch(self, columns: Dict[str, List[str]]):
+        table = self._pa.table(columns, schema=self._schema)
+        self._writer.write_table(table)
+
+    def close(self) -> Dict:
+        summary = super().close()
+        self._writer.close()
+        return summary
+
+    def abort(self):
+        self._writer.close()
+
+
+FILE_SINKS = {
+    "csv": CsvSink,
+    "jsonl": JsonlSink,
+    "parquet": ParquetSink
+}
+
+
+def create_file_sink(sink_type: str, path: str) -> FileSink:
+    """按类型创建文件输出目标"""
+    sink_class = FILE_SINKS.get(sink_type)
+    if sink_class is None:
+        raise ValueError(f"不支持的输出类型: {sink_type}，可选: {', '.join(SINK_TYPES)}")
+    return sink_class(path)
+
+
+def run_member_pipeline(api, chat_ids: List[str], sink: MemberSink,
+                        on_page: Optional[Callable[[MemberSink], None]] = None) -> Dict:
+    """逐个群、逐页获取成员并写入输出目标，返回汇总信息
+
+    on_page 在每页成员写入后调用，可用于更新任务进度。
+    """
+    try:
+        for chat_id in chat_ids:
+            chat_info = api.get_chat_info(chat_id)
+            chat_name = chat_info.get("name", "未知群聊")
+            sink.begin_chat(chat_id, chat_name)
+            logger.info(f"开始获取群成员: {chat_name} ({chat_id})")
+
+            before = sink.member_count
+            for members in api.iter_chat_members(chat_id):
+                sink.write_members(chat_id, chat_name, members)
+                if on_page:
+                    on_page(sink)
+                logger.info(f"已获取 {sink.member_count - before} 个群成员")
+            logger.info(f"群 {chat_name} 共 {sink.member_count - before} 个成员")
+    except Exception:
+        sink.abort()
+        raise
+    return sink.close()
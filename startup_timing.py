@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动耗时统计
+在启动过程中打点，设置环境变量 FEISHU_STARTUP_REPORT=1 时输出各阶段耗时
+"""
+
+import os
+import sys
+import time
+
+# 本模块应最先导入，以其导入时刻作为起点
+_START = time.perf_counter()
+_marks = []
+
+
+def mark(name: str):
+    """记录一个启动阶段完成的时刻"""
+    _marks.append((name, time.perf_counter()))
+
+
+def enabled() -> bool:
+    """是否开启启动耗时报告"""
+    return os.getenv("FEISHU_STARTUP_REPORT", "").lower() in ("1", "true", "yes")
+
+
+def report() -> str:
+    """生成启动耗时报告：各阶段耗时及累计耗时（毫秒）"""
+    lines = ["启动耗时报告:"]
+    previous = _START
+    for name, timestamp in _marks:
+        lines.append(f"  {name:<24} +{(timestamp - previous) * 1000:7.1f} ms  累计 {(timestamp - _START) * 1000:7.1f} ms")
+        previous = timestamp
+    lines.append(f"  已加载模块数: {len(sys.modules)}")
+    return "\n".join(lines)
+
+
+def print_report():
+    """开启报告时输出到标准错误"""
+    if enabled():
+        print(report(), file=sys.stderr)
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+同步历史与耗时回退检测
+命令行、/sync 和 /sync/immediate 的每次同步写入本地 SQLite（SYNC_HISTORY_DB）一条记录：
+群ID、成员数、分页数、写入批次、各阶段请求耗时、重试次数和收发字节数。
+同一群、同一模式最近 baseline_runs 次成功同步耗时的中位数作为基线，
+超过基线 regression_threshold 倍的同步标记为变慢；/stats 和命令行 --stats 输出分位数和趋势
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from config import API_CONFIG
+from coordination import CoordinationDB
+
+logger = logging.getLogger(__name__)
+
+# 历史数据库路径，命令行和 API 服务共用
+SYNC_HISTORY_DB = os.getenv("SYNC_HISTORY_DB", "sync_history.db")
+
+# 默认配置，可通过 API_CONFIG["sync_history"] 覆盖
+DEFAULT_HISTORY_CONFIG = {
+    "enabled": True,
+    # 基线取最近多少次成功同步
+    "baseline_runs": 20,
+    # 至少有多少次成功同步才开始检测
+    "min_baseline_runs": 3,
+    # 耗时超过基线多少倍标记为变慢
+    "regression_threshold": 1.5,
+    # 历史记录保留天数
+    "retention_days": 90
+}
+
+# 各阶段：准备（token、字段、群信息等）、获取成员、写入
+PHASES = ("setup", "fetch", "write")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    source TEXT NOT NULL,
+    task_id TEXT,
+    started_at REAL NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    total_seconds REAL NOT NULL,
+    members INTEGER NOT NULL,
+    pages INTEGER NOT NULL,
+    batches INTEGER NOT NULL,
+    requests INTEGER NOT NULL,
+    retries INTEGER NOT NULL,
+    bytes_sent INTEGER NOT NULL,
+    bytes_received INTEGER NOT NULL,
+    setup_seconds REAL NOT NULL,
+    fetch_seconds REAL NOT NULL,
+    write_seconds REAL NOT NULL,
+    baseline_seconds REAL,
+    slow INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS sync_runs_chat ON sync_runs (chat_id, mode, status, id);
+CREATE INDEX IF NOT EXISTS sync_runs_started ON sync_runs (started_at);
+"""
+
+
+def history_config() -> Dict:
+    config = dict(DEFAULT_HISTORY_CONFIG)
+    config.update(API_CONFIG.get("sync_history", {}))
+    return config
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+class RunMetrics:
+    """一次同步中 FeishuAPI 发出的请求的计量（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.pages = 0
+        self.batches = 0
+        self.retries = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.seconds = {phase: 0.0 for phase in PHASES}
+
+    def record_request(self, url: str, seconds: float, sent: int, received: int):
+        if "/im/" in url and url.split("?")[0].endswith("/members"):
+            phase = "fetch"
+        elif "/records/batch_" in url:
+            phase = "write"
+        else:
+            phase = "setup"
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += sent
+            self.bytes_received += received
+            self.seconds[phase] += seconds
+            if phase == "fetch":
+                self.pages += 1
+            elif url.split("?")[0].endswith("/batch_create"):
+                self.batches += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+
+class SyncHistory:
+    """同步历史表（多个线程、进程通过 SQLite 共享）"""
+
+    def __init__(self, path: str = SYNC_HISTORY_DB, config: Optional[Dict] = None):
+        self.path = path
+        self.config = config or history_config()
+        self.db = CoordinationDB(path, _SCHEMA, row_factory=sqlite3.Row)
+
+    def connection(self) -> sqlite3.Connection:
+        return self.db.connection()
+
+    def baseline(self, chat_id: str, mode: str) -> Optional[float]:
+        """最近成功同步耗时的中位数，次数不足时返回 None"""
+        rows = self.connection().execute(
+            "SELECT total_seconds FROM sync_runs WHERE chat_id = ? AND mode = ? AND status = 'ok' "
+            "ORDER BY id DESC LIMIT ?",
+            (chat_id, mode, self.config["baseline_runs"])
+        ).fetchall()
+        if len(rows) < self.config["min_baseline_runs"]:
+            return None
+        return percentile([row[0] for row in rows], 50)
+
+    def add_run(self, run: Dict) -> Dict:
+        """写入一次同步，与基线比较并标记是否变慢"""
+        run = dict(run)
+        baseline = self.baseline(run["chat_id"], run["mode"])
+        run["baseline_seconds"] = round(baseline, 3) if baseline is not None else None
+        run["slow"] = int(
+            run["status"] == "ok" and baseline is not None
+            and run["total_seconds"] > baseline * self.config["regression_threshold"]
+        )
+        columns = ", ".join(run)
+        conn = self.connection()
+        conn.execute(f"INSERT INTO sync_runs ({columns}) VALUES ({', '.join('?' * len(run))})", tuple(run.values()))
+        conn.execute("DELETE FROM sync_runs WHERE started_at < ?",
+                     (time.time() - self.config["retention_days"] * 86400,))
+        if run["slow"]:
+            logger.warning(
+                f"同步变慢: 群 {run['chat_id']}（{run['mode']}）耗时 {run['total_seconds']:.1f} 秒，"
+                f"基线 {baseline:.1f} 秒（阈值 {self.config['regression_threshold']} 倍）"
+            )
+        return run
+
+    def runs(self, chat_id: Optional[str] = None, since: float = 0, slow_only: bool = False,
+             limit: int = 100) -> List[Dict]:
+        """最近的同步记录（新的在前）"""
+        sql = "SELECT * FROM sync_runs WHERE started_at >= ?"
+        params: list = [since]
+        if chat_id:
+            sql += " AND chat_id = ?"
+            params.append(chat_id)
+        if slow_only:
+            sql += " AND slow = 1"
+        sql += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in self.connection().execute(sql, params)]
+
+    def stats(self, chat_id: Optional[str] = None, days: float = 7) -> Dict:
+        """按群和模式统计最近 days 天的耗时分位数，并与前一个同样长的时间段比较"""
+        now = time.time()
+        window = days * 86400
+        sql = "SELECT * FROM sync_runs WHERE started_at >= ?"
+        params: list = [now - 2 * window]
+        if chat_id:
+            sql += " AND chat_id = ?"
+            params.append(chat_id)
+        groups: Dict[tuple, Dict[str, List[Dict]]] = {}
+        for row in self.connection().execute(sql + " ORDER BY id", params):
+            period = "current" if row["started_at"] >= now - window else "previous"
+            groups.setdefault((row["chat_id"], row["mode"]), {"current": [], "previous": []})[period].append(dict(row))
+
+        result = []
+        for (group_chat_id, mode), periods in sorted(groups.items()):
+            runs = periods["current"]
+            if not runs:
+                continue
+            ok = [run for run in runs if run["status"] == "ok"]
+            seconds = [run["total_seconds"] for run in ok]
+            previous = [run["total_seconds"] for run in periods["previous"] if run["status"] == "ok"]
+            p50, previous_p50 = percentile(seconds, 50), percentile(previous, 50)
+            result.append({
+                "chat_id": group_chat_id,
+                "mode": mode,
+                "runs": len(runs),
+                "failed": len(runs) - len(ok),
+                "slow": sum(run["slow"] for run in runs),
+                "p50_seconds": p50,
+                "p95_seconds": percentile(seconds, 95),
+                "previous_p50_seconds": previous_p50,
+                # 与上一时间段相比中位耗时的变化
+                "trend_pct": round((p50 / previous_p50 - 1) * 100, 1) if p50 and previous_p50 else None,
+                "members": runs[-1]["members"],
+                "avg_pages": round(sum(run["pages"] for run in ok) / len(ok), 1) if ok else None,
+                "avg_batches": round(sum(run["batches"] for run in ok) / len(ok), 1) if ok else None,
+                "retries": sum(run["retries"] for run in runs),
+                "phase_p50_seconds": {
+                    phase: percentile([run[f"{phase}_seconds"] for run in ok], 50) for phase in PHASES
+                },
+                "last_run": runs[-1]["started_at"],
+                "last_slow": bool(runs[-1]["slow"])
+            })
+        return {
+            "days": days,
+            "regression_threshold": self.config["regression_threshold"],
+            "groups": result,
+            "slow_runs": self.runs(chat_id, since=now - window, slow_only=True, limit=20)
+        }
+
+
+class SyncRun:
+    """记录一次同步：开始时在 FeishuAPI 上挂载计量，finish() 写入历史"""
+
+    def __init__(self, history: Optional[SyncHistory], api, chat_ids: List[str], source: str, mode: str,
+                 task_id: Optional[str] = None):
+        self.history = history
+        self.api = api
+        # 多群同步按排序后的群ID组合统计
+        self.chat_id = ",".join(sorted(chat_ids))
+        self.source = source
+        self.mode = mode
+        self.task_id = task_id
+        self.metrics = RunMetrics()
+        self.finished = False
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        api.metrics = self.metrics
+
+    def finish(self, members: int = 0, error: Optional[str] = None) -> Optional[Dict]:
+        """结束计量并写入历史（只写入一次；历史写入失败不影响同步结果）"""
+        if self.finished:
+            return None
+        self.finished = True
+        self.api.metrics = None
+        if self.history is None:
+            return None
+        metrics = self.metrics
+        run = {
+            "chat_id": self.chat_id,
+            "mode": self.mode,
+            "source": self.source,
+            "task_id": self.task_id,
+            "started_at": self.started_at,
+            "status": "failed" if error else "ok",
+            "error": error[:500] if error else None,
+            "total_seconds": round(time.perf_counter() - self._start, 3),
+            "members": members,
+            "pages": metrics.pages,
+            "batches": metrics.batches,
+            "requests": metrics.requests,
+            "retries": metrics.retries,
+            "bytes_sent": metrics.bytes_sent,
+            "bytes_received": metrics.bytes_received,
+            **{f"{phase}_seconds": round(metrics.seconds[phase], 3) for phase in PHASES}
+        }
+        try:
+            return self.history.add_run(run)
+        except Exception as e:
+            logger.warning(f"写入同步历史失败: {e}")
+            return None
+
+
+_history: Optional[SyncHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_history() -> Optional[SyncHistory]:
+    """进程内共享的同步历史（配置关闭时为 None）"""
+    global _history
+    if not history_config()["enabled"]:
+        return None
+    with _history_lock:
+        if _history is None:
+            _history = SyncHistory()
+        return _history
+
+
+def start_run(api, chat_ids: List[str], source: str, mode: str, task_id: Optional[str] = None) -> SyncRun:
+    return SyncRun(get_history(), api, chat_ids, source, mode, task_id)
+
+
+def format_stats(stats: Dict) -> List[str]:
+    """命令行输出的统计报告"""
+    lines = [f"最近 {stats['days']:g} 天同步统计（耗时超过基线 {stats['regression_threshold']} 倍标记为变慢）:"]
+    if not stats["groups"]:
+        return lines + ["  暂无同步记录"]
+    for group in stats["groups"]:
+        trend = f"{group['trend_pct']:+.1f}%" if group["trend_pct"] is not None else "-"
+        p50 = f"{group['p50_seconds']:.1f}s" if group["p50_seconds"] is not None else "-"
+        p95 = f"{group['p95_seconds']:.1f}s" if group["p95_seconds"] is not None else "-"
+        phases = " ".join(
+            f"{phase} {seconds:.1f}s" for phase, seconds in group["phase_p50_seconds"].items() if seconds is not None
+        )
+        lines.append(
+            f"  {group['chat_id']} [{group['mode']}] {group['runs']} 次（失败 {group['failed']}，变慢 {group['slow']}）"
+            f" p50 {p50} p95 {p95} 趋势 {trend} 成员 {group['members']} 分页 {group['avg_pages']}"
+            f" 批次 {group['avg_batches']} 重试 {group['retries']} | {phases}"
+        )
+    for run in stats["slow_runs"]:
+        lines.append(
+            f"  变慢: {time.strftime('%Y-%m-%d %H:%M', time.localtime(run['started_at']))} {run['chat_id']}"
+            f" [{run['mode']}] {run['total_seconds']:.1f}s（基线 {run['baseline_seconds']:.1f}s）"
+        )
+    return lines
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+同步计划（dry run）
+只读取群成员和多维表格现有记录，计算同步将产生的写入量、API调用次数和预计耗时，不做任何写入
+"""
+
+import math
+import time
+from typing import Dict, List, Optional
+
+from config import API_CONFIG
+from diff_engine import KeyColumns, reconcile
+
+
+def cell_text(value) -> str:
+    """将多维表格单元格的值转换为文本（兼容文本分段、人员、数字等格式）"""
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        parts = []
+        for item in value:
+            if isinstance(item, dict):
+                parts.append(str(item.get("id") or item.get("text") or item.get("name") or ""))
+            else:
+                parts.append(str(item))
+        return "".join(parts)
+    if isinstance(value, dict):
+        return str(value.get("id") or value.get("text") or "")
+    return str(value)
+
+
+def estimate_seconds(api_calls: int, write_batches: int, member_pages: int,
+                     latency: Optional[float] = None) -> float:
+    """按配置的请求间隔和平均请求耗时估算同步耗时"""
+    if latency is None:
+        latency = API_CONFIG.get("estimated_latency", 0.3)
+    interval = API_CONFIG["request_interval"]
+    sleeps = max(member_pages - 1, 0) * interval
+    sleeps += write_batches * API_CONFIG.get("write_interval", 0.2)
+    return api_calls * latency + sleeps
+
+
+def plan_sync(api, app_token: str, table_id: str, chat_id: str, target_fields: Dict) -> Dict:
+    """计算单个群同步到多维表格的写入计划
+
+    对比群成员与表中该群已有的记录，得出需要新增、更新（租户变化）、删除（已退群或重复）的记录数。
+    当前同步为追加写入，会为每个成员写入一条记录，计划中的批次数和调用次数按实际写入路径计算。
+    """
+    start_time = time.time()
+    requests_before = api.request_count
+    seconds_before = api.request_seconds
+
+    member_field = target_fields["member"]
+    chat_name_field = target_fields.get("chat_name")
+    tenant_field = target_fields.get("tenant")
+
+    chat_info = api.get_chat_info(chat_id)
+    chat_name = chat_info.get("name", "未知群聊")
+
+    # 期望状态：(成员ID, 群名称) 的键哈希，值为租户哈希（表中没有租户列时不比较）
+    desired = KeyColumns()
+    member_pages = 0
+    for members in api.iter_chat_members(chat_id):
+        member_pages += 1
+        for member in members:
+            member_id = member.get("member_id")
+            if member_id:
+                desired.add((member_id, chat_name), member.get("tenant_key", "") if tenant_field else "")
+
+    # 现有状态：只拉取成员、群名称、租户三列，只对比该群的记录
+    field_names = [f.get("field_name") for f in (member_field, chat_name_field, tenant_field) if f]
+    existing = KeyColumns()
+    existing_records = 0
+    for records in api.iter_bitable_records(app_token, table_id, field_names):
+        for record in records:
+            existing_records += 1
+            fields = record.get("fields", {})
+            if chat_name_field and cell_text(fields.get(chat_name_field.get("field_name"))) != chat_name:
+                continue
+            member_id = cell_text(fields.get(member_field.get("field_name")))
+            tenant_key = cell_text(fields.get(tenant_field.get("field_name"))) if tenant_field else ""
+            existing.add((member_id, chat_name), tenant_key)
+
+    # 新增、删除（重复记录或已退群成员）、更新（租户变化）
+    diff = reconcile(desired, existing, workers=API_CONFIG.get("diff_workers", 1))
+    add, delete, update, unchanged = len(diff["add"]), len(diff["delete"]), len(diff["update"]), diff["unchanged"]
+    member_count = add + update + unchanged
+
+    batch_size = API_CONFIG["batch_size"]
+    write_records = member_count
+    write_batches = math.ceil(write_records / batch_size)
+    api_calls = {
+        "auth": 1,
+        "im": 1 + member_pages,
+        "bitable": 1 + write_batches
+    }
+    api_calls["total"] = sum(api_calls.values())
+
+    observed_requests = api.request_count - requests_before
+    observed_latency = None
+    if observed_requests:
+        observed_latency = (api.request_seconds - seconds_before) / observed_requests
+
+    plan = {
+        "chat_id": chat_id,
+        "chat_name": chat_name,
+        "member_count": member_count,
+        "existing_records": existing_records,
+        "add": add,
+        "update": update,
+        "delete": delete,
+        "unchanged": unchanged,
+        "write_records": write_records,
+        "batches": write_batches,
+        "api_calls": api_calls,
+        "estimated_seconds": round(estimate_seconds(
+            api_calls["total"], write_batches, member_pages, observed_latency), 1),
+        "planning_seconds": round(time.time() - start_time, 1)
+    }
+    if observed_latency is not None:
+        plan["observed_latency"] = round(observed_latency, 3)
+    return plan
+
+
+def format_plan(plan: Dict) -> List[str]:
+    """将同步计划格式化为便于阅读的多行文本"""
+    return [
+        f"群聊: {plan['chat_name']} ({plan['chat_id']})，成员 {plan['member_count']} 人，表中现有 {plan['existing_records']} 条记录",
+        f"对账结果: 新增 {plan['add']}，更新 {plan['update']}，删除 {plan['delete']}，不变 {plan['unchanged']}",
+        f"写入计划: {plan['write_records']} 条记录，{plan['batches']} 批",
+        f"API调用: 共 {plan['api_calls']['total']} 次（auth {plan['api_calls']['auth']}，"
+        f"im {plan['api_calls']['im']}，bitable {plan['api_calls']['bitable']}）",
+        f"预计耗时: {plan['estimated_seconds']} 秒",
+    ]
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多维表格记录清理
+同步只追加写入，表中会累积重复记录和已退群成员的记录。
+逐页拉取表中记录（只取成员、群名称、租户三列），用哈希索引识别重复和退群记录，
+待删除的记录ID暂存到临时文件，扫描结束后并行调用 batch_delete 删除；
+内存占用只与去重索引的条目数有关，二十万行的表也不会一次性载入
+"""
+
+import time
+import logging
+import tempfile
+import itertools
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from config import API_CONFIG
+from sync_planner import cell_text
+from diff_engine import key_hash
+
+logger = logging.getLogger(__name__)
+
+# 进度回调：参数为当前阶段和累计计数
+ProgressCallback = Callable[[Dict], None]
+
+
+class RecordIdSpool:
+    """待删除记录ID的临时文件，按批读回"""
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile(mode="w+", encoding="utf-8")
+        self.count = 0
+
+    def append(self, record_id: str):
+        self._file.write(record_id)
+        self._file.write("\n")
+        self.count += 1
+
+    def batches(self, size: int) -> Iterator[List[str]]:
+        self._file.flush()
+        self._file.seek(0)
+        lines = (line.rstrip("\n") for line in self._file)
+        while True:
+            batch = list(itertools.islice(lines, size))
+            if not batch:
+                return
+            yield batch
+
+    def close(self):
+        self._file.close()
+
+
+def collect_current_members(api, chat_ids: List[str]) -> Dict[str, Set[int]]:
+    """获取各群当前成员：群名称 -> 成员ID哈希集合"""
+    current: Dict[str, Set[int]] = {}
+    for chat_id in chat_ids:
+        chat_name = api.get_chat_info(chat_id).get("name", "未知群聊")
+        members = current.setdefault(chat_name, set())
+        for page in api.iter_chat_members(chat_id):
+            for member in page:
+                if member.get("member_id"):
+                    members.add(key_hash(member["member_id"]))
+        logger.info(f"群 {chat_name} ({chat_id}) 当前 {len(members)} 个成员")
+    return current
+
+
+def scan_stale_records(api, app_token: str, table_id: str, target_fields: Dict,
+                       current: Optional[Dict[str, Set[int]]] = None,
+                       on_progress: Optional[ProgressCallback] = None) -> Dict:
+    """逐页扫描表中记录，找出重复记录和已退群成员的记录
+
+    成员、群名称、租户都相同的记录只保留第一条；current 中列出的群，成员已不在群内的记录删除，
+    其他群的记录只做去重。返回计数和待删除记录ID的 spool。
+    """
+    member_field = target_fields["member"]
+    chat_name_field = target_fields.get("chat_name")
+    tenant_field = target_fields.get("tenant")
+    field_names = [f.get("field_name") for f in (member_field, chat_name_field, tenant_field) if f]
+    current = current or {}
+
+    seen: Set[int] = set()
+    spool = RecordIdSpool()
+    counts = {"scanned": 0, "duplicates": 0, "departed": 0, "kept": 0}
+    try:
+        for records in api.iter_bitable_records(app_token, table_id, field_names):
+            for record in records:
+                counts["scanned"] += 1
+                fields = record.get("fields", {})
+                member_id = cell_text(fields.get(member_field.get("field_name")))
+                if not member_id:
+                    # 没有成员的记录不是同步写入的，保留
+                    counts["kept"] += 1
+                    continue
+                chat_name = cell_text(fields.get(chat_name_field.get("field_name"))) if chat_name_field else ""
+                tenant_key = cell_text(fields.get(tenant_field.get("field_name"))) if tenant_field else ""
+
+                members = current.get(chat_name)
+                if members is not None and key_hash(member_id) not in members:
+                    counts["departed"] += 1
+                    spool.append(record["record_id"])
+                    continue
+                key = key_hash(member_id, chat_name, tenant_key)
+                if key in seen:
+                    counts["duplicates"] += 1
+                    spool.append(record["record_id"])
+                else:
+                    seen.add(key)
+                    counts["kept"] += 1
+
+            logger.info(
+                f"已扫描 {counts['scanned']} 条记录，重复 {counts['duplicates']} 条，退群 {counts['departed']} 条"
+            )
+            if on_progress:
+                on_progress({"phase": "scan", **counts})
+    except Exception:
+        spool.close()
+        raise
+
+    return {**counts, "spool": spool}
+
+
+def delete_spooled_records(api, app_token: str, table_id: str, spool: RecordIdSpool,
+                           workers: Optional[int] = None,
+                           on_progress: Optional[ProgressCallback] = None) -> Dict:
+    """并行分批删除 spool 中的记录，同时在途的批次不超过 2 倍线程数"""
+    batch_size = API_CONFIG["batch_size"]
+    workers = workers or API_CONFIG.get("cleanup_workers", 4)
+    counts = {"deleted": 0, "failed": 0, "batches": 0}
+
+    def delete(batch: List[str]) -> bool:
+        return api.delete_bitable_records(app_token, table_id, batch)
+
+    def collect(done):
+        for future, batch in done:
+            counts["batches"] += 1
+            if future.result():
+                counts["deleted"] += len(batch)
+            else:
+                counts["failed"] += len(batch)
+        logger.info(f"已删除 {counts['deleted']}/{spool.count} 条记录")
+        if on_progress:
+            on_progress({"phase": "delete", "total": spool.count, **counts})
+
+    # 预先获取 token，避免并发删除时重复请求
+    api.get_tenant_access_token()
+    pending = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch in spool.batches(batch_size):
+            # 删除线程沿用当前上下文（日志的 task_id、调度通道等）
+            future = executor.submit(contextvars.copy_context().run, delete, batch)
+            pending[future] = batch
+            if len(pending) >= workers * 2:
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect([(future, pending.pop(future)) for future in finished])
+        if pending:
+            finished, _ = wait(pending)
+            collect([(future, pending.pop(future)) for future in finished])
+    return counts
+
+
+def cleanup_table(api, app_token: str, table_id: str, target_fields: Dict,
+                  chat_ids: Optional[List[str]] = None, dry_run: bool = False,
+                  workers: Optional[int] = None, on_progress: Optional[ProgressCallback] = None) -> Dict:
+    """清理多维表格中的重复记录和已退群成员的记录
+
+    提供 chat_ids 时同时删除这些群中已退群成员的记录，否则只去重。
+    先扫描完整张表再删除，删除不会影响分页游标；dry_run 只统计不删除。
+    """
+    start_time = time.time()
+    current = collect_current_members(api, chat_ids) if chat_ids else {}
+    scan = scan_stale_records(api, app_token, table_id, target_fields, current, on_progress)
+    spool = scan.pop("spool")
+    try:
+        summary = {
+            **scan,
+            "stale": spool.count,
+            "chats": list(current),
+            "dry_run": dry_run,
+            "deleted": 0,
+            "failed": 0
+        }
+        if spool.count and not dry_run:
+            logger.info(f"开始删除 {spool.count} 条记录...")
+            counts = delete_spooled_records(api, app_token, table_id, spool, workers, on_progress)
+            summary.update(deleted=counts["deleted"], failed=counts["failed"], batches=counts["batches"])
+    finally:
+        spool.close()
+
+    summary["seconds"] = round(time.time() - start_time, 1)
+    return summary
+
+
+def format_cleanup(summary: Dict) -> List[str]:
+    """将清理结果格式化为便于阅读的多行文本"""
+    lines = [
+        f"扫描 {summary['scanned']} 条记录：重复 {summary['duplicates']} 条，退群 {summary['departed']} 条，"
+        f"保留 {summary['kept']} 条"
+    ]
+    if summary["dry_run"]:
+        lines.append(f"预览模式，未删除记录（待删除 {summary['stale']} 条）")
+    else:
+        lines.append(f"已删除 {summary['deleted']} 条，失败 {summary['failed']} 条，耗时 {summary['seconds']} 秒")
+    return lines
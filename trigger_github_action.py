@@ -4,11 +4,44 @@ GitHub Actions 触发脚本
 用于通过API触发飞书群成员同步工作流
 """
 
-import requests
-import json
+import os
 import sys
+import json
+import time
+import uuid
+import argparse
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+REPO_API = "https://api.github.com/repos/k190513120/chat_to_base"
+WORKFLOW_API = f"{REPO_API}/actions/workflows/sync-feishu-members.yml"
+
+# workflow_dispatch 输入总长度上限约 65535 字符，预留余量
+MAX_INPUT_CHARS = 60000
+
+# 单个工作流运行的 matrix 最多 256 个作业
+MAX_JOBS_PER_DISPATCH = 256
+
+# 默认每个 matrix 作业同步的群数（同一多维表格的群合并到一个作业）
+DEFAULT_CHATS_PER_JOB = 10
 
-def trigger_github_action(bitable_url, chat_id, github_token="YOUR_GITHUB_TOKEN"):
+# 复用连接，避免每次请求重新建立 TLS 连接
+_session = requests.Session()
+
+def get_github_token(github_token=None):
+    """获取GitHub访问令牌，优先使用参数，其次使用环境变量 GITHUB_TOKEN"""
+    return github_token or os.getenv("GITHUB_TOKEN") or "YOUR_GITHUB_TOKEN"
+
+def github_headers(github_token):
+    """GitHub API 请求头"""
+    return {
+        "Authorization": f"token {github_token}",
+        "Accept": "application/vnd.github.v3+json",
+        "Content-Type": "application/json"
+    }
+
+def trigger_github_action(bitable_url, chat_id, github_token="YOUR_GITHUB_TOKEN", dispatch_id=None):
     """
     触发GitHub Action工作流
     
@@ -16,17 +49,12 @@ def trigger_github_action(bitable_url, chat_id, github_token="YOUR_GITHUB_TOKEN"
         bitable_url: 飞书多维表格URL
         chat_id: 飞书群ID
         github_token: GitHub访问令牌
+        dispatch_id: 触发标识，写入运行名称，用于 --wait 跟踪本次触发的运行
     
     Returns:
         bool: 是否成功触发
     """
-    url = "https://api.github.com/repos/k190513120/chat_to_base/actions/workflows/sync-feishu-members.yml/dispatches"
-    
-    headers = {
-        "Authorization": f"token {github_token}",
-        "Accept": "application/vnd.github.v3+json",
-        "Content-Type": "application/json"
-    }
+    url = f"{WORKFLOW_API}/dispatches"
     
     data = {
         "ref": "main",
@@ -35,9 +63,11 @@ def trigger_github_action(bitable_url, chat_id, github_token="YOUR_GITHUB_TOKEN"
             "chat_id": chat_id
         }
     }
+    if dispatch_id:
+        data["inputs"]["dispatch_id"] = dispatch_id
     
     try:
-        response = requests.post(url, headers=headers, json=data)
+        response = _session.post(url, headers=github_headers(github_token), json=data)
         
         if response.status_code == 204:
             print("✅ GitHub Action 触发成功！")
@@ -65,19 +95,14 @@ def get_workflow_runs(github_token="YOUR_GITHUB_TOKEN", limit=5):
     Returns:
         list: 工作流运行记录
     """
-    url = "https://api.github.com/repos/k190513120/chat_to_base/actions/workflows/sync-feishu-members.yml/runs"
-    
-    headers = {
-        "Authorization": f"token {github_token}",
-        "Accept": "application/vnd.github.v3+json"
-    }
+    url = f"{WORKFLOW_API}/runs"
     
     params = {
         "per_page": limit
     }
     
     try:
-        response = requests.get(url, headers=headers, params=params)
+        response = _session.get(url, headers=github_headers(github_token), params=params)
         
         if response.status_code == 200:
             data = response.json()
@@ -119,12 +144,199 @@ def get_workflow_runs(github_token="YOUR_GITHUB_TOKEN", limit=5):
         print(f"❌ 请求异常: {str(e)}")
         return []
 
+def load_targets(path):
+    """
+    读取批量触发的目标文件
+    
+    支持两种格式：
+    - JSON 列表：[{"bitable_url": "...", "chat_id": "oc_..."}, ...]
+    - 文本：每行 "bitable_url,chat_id"（逗号或空白分隔），# 开头为注释
+    
+    Returns:
+        list: [{"bitable_url": ..., "chat_id": ...}, ...]
+    """
+    with open(path, encoding="utf-8") as f:
+        content = f.read()
+    
+    if content.lstrip().startswith("["):
+        targets = json.loads(content)
+    else:
+        targets = []
+        for line in content.splitlines():
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            parts = line.replace(",", " ").split()
+            if len(parts) != 2:
+                raise ValueError(f"无法解析目标行: {line}")
+            targets.append({"bitable_url": parts[0], "chat_id": parts[1]})
+    
+    for target in targets:
+        if not target.get("bitable_url", "").startswith("https://"):
+            raise ValueError(f"多维表格URL格式错误: {target.get('bitable_url')}")
+        if not target.get("chat_id", "").startswith("oc_"):
+            raise ValueError(f"群聊ID格式错误: {target.get('chat_id')}")
+    return targets
+
+def pack_targets(targets, chats_per_job=DEFAULT_CHATS_PER_JOB):
+    """
+    将目标打包为尽量少的工作流触发
+    
+    同一多维表格的群合并到一个 matrix 作业（群ID以逗号分隔，同步脚本逐个处理），
+    每次触发的作业数和输入长度不超过 GitHub 限制。
+    
+    Returns:
+        list: 每个元素是一次触发的作业列表
+    """
+    jobs = []
+    by_table = {}
+    for target in targets:
+        by_table.setdefault(target["bitable_url"], []).append(target["chat_id"])
+    for bitable_url, chat_ids in by_table.items():
+        for i in range(0, len(chat_ids), chats_per_job):
+            jobs.append({"bitable_url": bitable_url, "chat_id": ",".join(chat_ids[i:i + chats_per_job])})
+    
+    dispatches = []
+    current = []
+    current_chars = 2
+    for job in jobs:
+        job_chars = len(json.dumps(job, ensure_ascii=False)) + 1
+        if current and (len(current) >= MAX_JOBS_PER_DISPATCH or current_chars + job_chars > MAX_INPUT_CHARS):
+            dispatches.append(current)
+            current = []
+            current_chars = 2
+        current.append(job)
+        current_chars += job_chars
+    if current:
+        dispatches.append(current)
+    return dispatches
+
+def trigger_bulk(targets, github_token="YOUR_GITHUB_TOKEN", chats_per_job=DEFAULT_CHATS_PER_JOB):
+    """
+    批量触发工作流
+    
+    Returns:
+        list: 成功触发的 dispatch_id 列表
+    """
+    url = f"{WORKFLOW_API}/dispatches"
+    dispatches = pack_targets(targets, chats_per_job)
+    print(f"📦 {len(targets)} 个群打包为 {sum(len(d) for d in dispatches)} 个作业，共 {len(dispatches)} 次触发")
+    
+    dispatch_ids = []
+    for i, jobs in enumerate(dispatches, 1):
+        dispatch_id = uuid.uuid4().hex[:12]
+        data = {
+            "ref": "main",
+            "inputs": {
+                "targets": json.dumps(jobs, ensure_ascii=False, separators=(",", ":")),
+                "dispatch_id": dispatch_id
+            }
+        }
+        try:
+            response = _session.post(url, headers=github_headers(github_token), json=data)
+            if response.status_code == 204:
+                print(f"✅ 第 {i} 次触发成功（{len(jobs)} 个作业，dispatch_id: {dispatch_id}）")
+                dispatch_ids.append(dispatch_id)
+            else:
+                print(f"❌ 第 {i} 次触发失败，状态码: {response.status_code}")
+                print(f"错误信息: {response.text}")
+        except Exception as e:
+            print(f"❌ 第 {i} 次触发请求异常: {str(e)}")
+    
+    return dispatch_ids
+
+def wait_for_runs(dispatch_ids, github_token="YOUR_GITHUB_TOKEN", since=None, timeout=3600,
+                  min_interval=5, max_interval=60):
+    """
+    等待指定触发的工作流运行结束
+    
+    只跟踪运行名称中带有 dispatch_id 的运行。轮询使用 ETag 条件请求，
+    结果未变化时 GitHub 返回 304 且不计入速率限制，同时逐步拉长轮询间隔；
+    运行状态有变化时恢复为最短间隔。
+    
+    Returns:
+        dict: dispatch_id -> 运行信息（未找到的为 None）
+    """
+    url = f"{WORKFLOW_API}/runs"
+    since = since or datetime.now(timezone.utc) - timedelta(minutes=1)
+    params = {
+        "event": "workflow_dispatch",
+        "created": f">={since.strftime('%Y-%m-%dT%H:%M:%SZ')}",
+        "per_page": 100
+    }
+    headers = github_headers(github_token)
+    
+    runs = {dispatch_id: None for dispatch_id in dispatch_ids}
+    etag = None
+    interval = min_interval
+    deadline = time.time() + timeout
+    
+    print(f"⏳ 等待 {len(dispatch_ids)} 个工作流运行完成...")
+    while time.time() < deadline:
+        request_headers = dict(headers)
+        if etag:
+            request_headers["If-None-Match"] = etag
+        
+        try:
+            response = _session.get(url, headers=request_headers, params=params)
+        except Exception as e:
+            print(f"⚠️  查询运行状态异常: {str(e)}")
+            response = None
+        
+        changed = False
+        rate_limit_wait = 0
+        if response is not None and response.status_code == 200:
+            etag = response.headers.get("ETag")
+            for run in response.json().get("workflow_runs", []):
+                title = run.get("display_title") or run.get("name") or ""
+                for dispatch_id in runs:
+                    if dispatch_id in title:
+                        previous = runs[dispatch_id]
+                        if previous is None or previous.get("status") != run.get("status"):
+                            changed = True
+                            print(f"🔄 {dispatch_id}: {run.get('status')} {run.get('conclusion') or ''} {run.get('html_url')}")
+                        runs[dispatch_id] = run
+        elif response is not None and response.status_code != 304:
+            print(f"⚠️  查询运行状态失败，状态码: {response.status_code}")
+            rate_limited = (response.status_code == 429 or response.headers.get("X-RateLimit-Remaining") == "0"
+                            or "Retry-After" in response.headers)
+            if response.status_code in (403, 429) and rate_limited:
+                # 被限流时等到额度重置（不受 max_interval 限制），退避间隔照常增长
+                if "Retry-After" in response.headers:
+                    rate_limit_wait = max(float(response.headers["Retry-After"]), min_interval)
+                else:
+                    reset = int(response.headers.get("X-RateLimit-Reset", 0))
+                    rate_limit_wait = max(reset - time.time(), max_interval)
+            elif response.status_code in (401, 403):
+                # token 无效或缺少 actions:read 权限，继续轮询也不会成功
+                try:
+                    message = response.json().get("message", "")
+                except ValueError:
+                    message = response.text[:200]
+                print(f"❌ 无权查询工作流运行: {message}（检查 GitHub token 是否有效、是否有 actions:read 权限）")
+                break
+        
+        if all(run and run.get("status") == "completed" for run in runs.values()):
+            break
+        
+        interval = min_interval if changed else min(interval * 1.5, max_interval)
+        time.sleep(min(max(rate_limit_wait, interval), max(deadline - time.time(), 0)))
+    else:
+        print("⚠️  等待超时")
+    
+    succeeded = sum(1 for run in runs.values() if run and run.get("conclusion") == "success")
+    print(f"📋 完成: {succeeded}/{len(runs)} 次触发的运行成功")
+    return runs
+
 def main():
     """主函数"""
     if len(sys.argv) == 1:
         print("📖 使用说明:")
         print("触发工作流:")
-        print("  python trigger_github_action.py <bitable_url> <chat_id>")
+        print("  python trigger_github_action.py <bitable_url> <chat_id> [--wait]")
+        print()
+        print("批量触发（文件每行 \"bitable_url,chat_id\"，或 JSON 列表）:")
+        print("  python trigger_github_action.py --bulk targets.csv [--wait]")
         print()
         print("查看运行状态:")
         print("  python trigger_github_action.py --status")
@@ -133,19 +345,46 @@ def main():
         print("  python trigger_github_action.py \"https://bytedance.feishu.cn/base/base_id?table=table_id\" \"oc_chat_id\"")
         return
     
-    if len(sys.argv) == 2 and sys.argv[1] == "--status":
+    parser = argparse.ArgumentParser(description="触发飞书群成员同步工作流")
+    parser.add_argument("bitable_url", nargs="?", help="飞书多维表格URL")
+    parser.add_argument("chat_id", nargs="?", help="飞书群ID")
+    parser.add_argument("--status", action="store_true", help="查看最近的工作流运行记录")
+    parser.add_argument("--bulk", metavar="FILE", help="批量触发：目标文件路径")
+    parser.add_argument("--chats-per-job", type=int, default=DEFAULT_CHATS_PER_JOB,
+                        help=f"批量触发时每个作业同步的群数（默认 {DEFAULT_CHATS_PER_JOB}）")
+    parser.add_argument("--wait", action="store_true", help="等待本次触发的运行结束")
+    parser.add_argument("--timeout", type=int, default=3600, help="--wait 最长等待时间（秒）")
+    args = parser.parse_args()
+    
+    github_token = get_github_token()
+    
+    if args.status:
         # 查看工作流状态
-        get_workflow_runs()
+        get_workflow_runs(github_token)
+        return
+    
+    since = datetime.now(timezone.utc) - timedelta(seconds=30)
+    
+    if args.bulk:
+        try:
+            targets = load_targets(args.bulk)
+        except Exception as e:
+            print(f"❌ 读取目标文件失败: {str(e)}")
+            return
+        dispatch_ids = trigger_bulk(targets, github_token, args.chats_per_job)
+        if dispatch_ids and args.wait:
+            wait_for_runs(dispatch_ids, github_token, since, args.timeout)
         return
     
-    if len(sys.argv) != 3:
+    if not args.bitable_url or not args.chat_id:
         print("❌ 参数错误！")
         print("使用方法: python trigger_github_action.py <bitable_url> <chat_id>")
+        print("或者: python trigger_github_action.py --bulk <targets_file>")
         print("或者: python trigger_github_action.py --status")
         return
     
-    bitable_url = sys.argv[1]
-    chat_id = sys.argv[2]
+    bitable_url = args.bitable_url
+    chat_id = args.chat_id
     
     # 验证参数
     if not bitable_url.startswith("https://"):
@@ -157,9 +396,12 @@ def main():
         return
     
     # 触发工作流
-    success = trigger_github_action(bitable_url, chat_id)
+    dispatch_id = uuid.uuid4().hex[:12]
+    success = trigger_github_action(bitable_url, chat_id, github_token, dispatch_id)
     
-    if success:
+    if success and args.wait:
+        wait_for_runs([dispatch_id], github_token, since, args.timeout)
+    elif success:
         print("\n⏳ 工作流已开始执行，请稍等片刻后查看状态...")
         print("💡 提示：可以使用 'python trigger_github_action.py --status' 查看执行状态")
 